@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Shared asyncio executor for batches of external-tool jobs (mafft, pal2nal, KaKs, ...).
+
+  - at most `concurrency` jobs in flight; jobs are pulled lazily from the input iterable
+  - per-job timeout; a hung tool is killed, not waited on forever
+  - bounded retries with exponential backoff for tool failures (ToolError)
+  - a failure never aborts the batch: it comes back as a Result with ok=False,
+    the reason and the captured stderr tail
+  - results are streamed to the caller as jobs finish
+
+Library use:
+  from async_runner import stream, ToolError
+
+  async def job(run, item):
+      await run(["mafft", "--auto", item.fa], stdout=item.aln)
+      return item.aln
+
+  for res in stream(items, job, key=lambda it: it.name, concurrency=8, timeout=600, retries=2):
+      ...   # res.key res.ok res.value res.error res.stderr res.attempts res.elapsed
+"""
+import asyncio
+import os
+import queue
+import random
+import signal
+import threading
+import time
+from typing import NamedTuple
+
+STDERR_TAIL = 2000
+
+
+class ToolError(Exception):
+    """External command failed (non-zero exit, timeout or could not start); retryable."""
+
+    def __init__(self, cmd, returncode=None, stderr="", timed_out=False):
+        self.cmd = list(cmd)
+        self.returncode = returncode
+        self.stderr = stderr
+        self.timed_out = timed_out
+        if timed_out:
+            why = "timed out"
+        elif returncode is None:
+            why = "could not start"
+        else:
+            why = f"exit {returncode}"
+        super().__init__(f"{self.cmd[0]} {why}")
+
+
+class Result(NamedTuple):
+    key: object
+    ok: bool
+    value: object
+    error: str
+    stderr: str
+    attempts: int
+    elapsed: float
+
+
+def one_line(s, limit=STDERR_TAIL):
+    """stderr tail flattened for a TSV cell."""
+    s = (s or "").strip()
+    if len(s) > limit:
+        s = "..." + s[-limit:]
+    return s.replace("\t", " ").replace("\r", " ").replace("\n", " | ")
+
+
+async def run(cmd, stdout=None, cwd=None):
+    """
+    Run one command; stdout goes to the file `stdout` (path) or is returned as bytes.
+    Raises ToolError on failure. Cancelling the calling task kills the process.
+    """
+    out_fh = open(stdout, "wb") if stdout else None
+    try:
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *map(str, cmd),
+                stdout=out_fh if out_fh else asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=cwd,
+                start_new_session=True,   # own process group: wrappers like mafft spawn children
+            )
+        except OSError as e:
+            raise ToolError(cmd, None, str(e)) from e
+        try:
+            out, err = await proc.communicate()
+        except asyncio.CancelledError:
+            if proc.returncode is None:
+                try:
+                    os.killpg(proc.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                await proc.wait()
+            raise
+    finally:
+        if out_fh:
+            out_fh.close()
+    err = err.decode(errors="replace") if err else ""
+    if proc.returncode != 0:
+        raise ToolError(cmd, proc.returncode, err)
+    return out
+
+
+async def _attempts(item, job, timeout, retries, backoff):
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            if timeout and timeout > 0:
+                value = await asyncio.wait_for(job(run, item), timeout)
+            else:
+                value = await job(run, item)
+            return True, value, "", "", attempt
+        except asyncio.TimeoutError:
+            err = ToolError(["job"], timed_out=True)
+            reason = f"timeout after {timeout:g}s"
+        except ToolError as e:
+            err = e
+            reason = f"{e}: {' '.join(e.cmd)}"
+        except Exception as e:  # data problems: not retried
+            return False, None, f"{type(e).__name__}: {e}", "", attempt
+        if attempt > retries:
+            return False, None, reason, err.stderr, attempt
+        await asyncio.sleep(backoff * (2 ** (attempt - 1)) * (0.5 + random.random()))
+
+
+async def _run_all(items, job, key, concurrency, timeout, retries, backoff, emit):
+    it = iter(items)
+    lock = asyncio.Lock()
+
+    async def worker():
+        while True:
+            async with lock:
+                try:
+                    item = next(it)
+                except StopIteration:
+                    return
+            t0 = time.monotonic()
+            ok, value, error, stderr, n = await _attempts(item, job, timeout, retries, backoff)
+            emit(Result(key(item), ok, value, error, stderr, n, time.monotonic() - t0))
+
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+
+
+_DONE = object()
+
+
+def stream(items, job, key=lambda x: x, concurrency=4, timeout=0, retries=2, backoff=2.0):
+    """
+    Run `await job(run, item)` for every item and yield Result objects as they finish.
+    The event loop lives on a helper thread, so the caller consumes results with a
+    plain for-loop (writing rows, updating counters) while the next jobs run.
+    Results go through an unbounded queue, so a slow consumer never stalls the loop
+    (and with it the timeouts and retries of jobs in flight); the queue holds at most
+    the finished-but-unread Results. Closing the generator early (break, exception)
+    cancels the loop, which kills the running tools.
+    """
+    q = queue.Queue()
+    failure = []
+    stop = threading.Event()
+    ctl = {}
+
+    async def main():
+        ctl["loop"], ctl["task"] = asyncio.get_running_loop(), asyncio.current_task()
+        if not stop.is_set():
+            await _run_all(items, job, key, concurrency, timeout, retries, backoff, q.put)
+
+    def target():
+        try:
+            asyncio.run(main())
+        except BaseException as e:  # surface loop errors in the consumer thread
+            failure.append(e)
+        finally:
+            q.put(_DONE)
+
+    th = threading.Thread(target=target, name="async_runner", daemon=True)
+    th.start()
+    try:
+        while True:
+            res = q.get()
+            if res is _DONE:
+                break
+            yield res
+    finally:
+        if th.is_alive():
+            stop.set()
+            if "task" in ctl:
+                try:
+                    ctl["loop"].call_soon_threadsafe(ctl["task"].cancel)
+                except RuntimeError:  # loop already closed
+                    pass
+        th.join()
+    if failure:
+        raise failure[0]
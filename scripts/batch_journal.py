@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Checkpoint journal for resumable pair batches (kaks_make_axt_batch.py, kaks_run_batch.py).
+
+The journal is an append-only TSV in the batch work directory:
+  key  input_hash  result_path
+one line per finished job, flushed as soon as the job is done. On restart a job
+is skipped when its last journal line carries the same input hash and the result
+file still exists; anything missing or stale is run again.
+
+Work directories live outside Snakemake directory() outputs (those are wiped on
+rerun); finished results are published into the declared output with
+publish()/atomic_write() at the end.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+JOURNAL = "journal.tsv"
+
+
+def content_hash(*parts):
+    h = hashlib.sha1()
+    for p in parts:
+        if isinstance(p, str):
+            p = p.encode()
+        h.update(p)
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def file_hash(fp):
+    h = hashlib.sha1()
+    with open(fp, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class Journal:
+    def __init__(self, workdir):
+        os.makedirs(workdir, exist_ok=True)
+        self.path = os.path.join(workdir, JOURNAL)
+        self.entries = {}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                for line in f:
+                    a = line.rstrip("\n").split("\t")
+                    if len(a) == 3:           # a torn last line is simply ignored
+                        self.entries[a[0]] = (a[1], a[2])
+        self._w = open(self.path, "a")
+
+    def done(self, key, input_hash):
+        """result path if `key` finished with the same inputs and its result is still there."""
+        e = self.entries.get(key)
+        if e and e[0] == input_hash and os.path.exists(e[1]) and os.path.getsize(e[1]) > 0:
+            return e[1]
+        return None
+
+    def record(self, key, input_hash, result):
+        self.entries[key] = (input_hash, result)
+        self._w.write(f"{key}\t{input_hash}\t{result}\n")
+        self._w.flush()
+
+    def close(self):
+        self._w.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def publish(src, dst):
+    """Put a finished result into the output directory: hard link, copy across filesystems."""
+    tmp = dst + ".tmp"
+    if os.path.lexists(tmp):
+        os.remove(tmp)
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copy2(src, tmp)
+    os.replace(tmp, dst)
+
+
+@contextmanager
+def atomic_write(path, mode="w"):
+    """Write to a temp file next to `path` and rename over it only on success."""
+    d = os.path.dirname(os.path.abspath(path))
+    os.makedirs(d, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=d, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode) as w:
+            yield w
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Per-bin genome background tracks for the chromosome map (plot_chr_map.R --tracks).
+
+  chr  start  end  genes  gc  n_frac  masked_frac
+
+  genes        genes starting in the bin (gene rows of gene_dict.py), np.histogram
+               over the sorted starts of each chromosome
+  gc           G+C / (bin length - N); NA for an all-N bin
+  n_frac       fraction of N (assembly gaps)
+  masked_frac  fraction of soft-masked (lowercase) bases, a repeat proxy
+
+GC and N come straight from the packed .2bit (genome_2bit.py): each worker
+memory-maps the file and reads the 2-bit codes of a run of bins (C=1, G=3 are
+the odd codes; N is stored as T), so no FASTA pass and no ASCII unpacking.
+Chromosomes are cut into chunks of whole bins spread over a process pool.
+"""
+import argparse
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from gene_dict import GeneDict
+from genome_2bit import TwoBit, region_mask
+import profiling
+
+# packed byte -> 4 codes, low bit set for C / G
+GC_BIT = np.array([[(b >> s) & 1 for s in (6, 4, 2, 0)] for b in range(256)], dtype=np.uint8)
+CHUNK_BP = 16 << 20
+
+_TB = {}
+
+
+def scan_chunk(job):
+    """(chrom, first bin, gc, n, masked) counts for bins [b0, b1) of one chromosome."""
+    twobit, chrom, b0, b1, width = job
+    tb = _TB.get(twobit)
+    if tb is None:
+        tb = _TB[twobit] = TwoBit(twobit)
+    size, n_starts, n_sizes, m_starts, m_sizes, dna = tb.record(chrom)
+    start, end = b0 * width, min(size, b1 * width)
+    n = end - start
+    offs = np.arange(0, n, width)
+    packed = tb.mm[dna + start // 4: dna + (end + 3) // 4]
+    first = start % 4
+    gc = np.add.reduceat(GC_BIT[packed].ravel()[first:first + n], offs, dtype=np.int64)
+    counts = []
+    for starts, sizes in ((n_starts, n_sizes), (m_starts, m_sizes)):
+        mask = region_mask(n, start, starts, sizes)
+        counts.append(np.zeros(offs.size, dtype=np.int64) if mask is None
+                      else np.add.reduceat(mask, offs, dtype=np.int64))
+    return chrom, b0, gc, counts[0], counts[1]
+
+
+def gene_starts(dict_fp):
+    gd = GeneDict.load(dict_fp)
+    out = {}
+    for chrom in np.unique(gd.chrom[gd.is_gene]).tolist():
+        sel = gd.is_gene & (gd.chrom == chrom)
+        out[chrom] = np.sort(gd.start[sel] - 1)
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--twobit", required=True, help="genome .2bit (genome_2bit.py build)")
+    ap.add_argument("--dict", required=True, help="gene dictionary (gene_dict.py build)")
+    ap.add_argument("--bin", type=int, default=1000000, help="bin size in bp")
+    ap.add_argument("--threads", type=int, default=1)
+    ap.add_argument("--out", required=True)
+    args = ap.parse_args()
+    if args.bin < 1:
+        raise SystemExit("[ERROR] --bin must be >= 1")
+
+    tb = TwoBit(args.twobit)
+    sizes = tb.sizes()
+    with profiling.phase("genes") as ph:
+        starts = gene_starts(args.dict)
+        ph.records = sum(len(s) for s in starts.values())
+    missing = set(starts) - set(tb.offsets)
+    if missing:
+        print(f"[WARN] {len(missing)} gene chromosomes not in {args.twobit}, e.g. {sorted(missing)[0]}",
+              file=sys.stderr)
+
+    per_chunk = max(1, CHUNK_BP // args.bin)
+    jobs = []
+    for chrom, size in sizes:
+        nb = -(-size // args.bin)
+        jobs += [(args.twobit, chrom, b, min(nb, b + per_chunk), args.bin) for b in range(0, nb, per_chunk)]
+    with profiling.phase("scan", records=sum(s for _c, s in sizes)):
+        if args.threads > 1 and len(jobs) > 1:
+            with ProcessPoolExecutor(max_workers=args.threads) as ex:
+                results = list(ex.map(scan_chunk, jobs))
+        else:
+            results = list(map(scan_chunk, jobs))
+    by_chrom = {}
+    for chrom, b0, gc, nn, mk in results:
+        by_chrom.setdefault(chrom, []).append((b0, gc, nn, mk))
+
+    n_bins = 0
+    with profiling.phase("write"), open(args.out, "w") as w:
+        w.write("chr\tstart\tend\tgenes\tgc\tn_frac\tmasked_frac\n")
+        for chrom, size in sizes:
+            if size == 0:
+                continue
+            parts = sorted(by_chrom.get(chrom, []), key=lambda p: p[0])
+            gc = np.concatenate([p[1] for p in parts])
+            nn = np.concatenate([p[2] for p in parts])
+            mk = np.concatenate([p[3] for p in parts])
+            edges = np.append(np.arange(0, size, args.bin), size)
+            genes = np.histogram(starts.get(chrom, np.zeros(0, dtype=np.int64)), bins=edges)[0]
+            length = np.diff(edges)
+            acgt = length - nn
+            for i in range(length.size):
+                g = f"{gc[i] / acgt[i]:.4f}" if acgt[i] > 0 else "NA"
+                w.write(f"{chrom}\t{edges[i]}\t{edges[i + 1]}\t{genes[i]}\t{g}\t"
+                        f"{nn[i] / length[i]:.4f}\t{mk[i] / length[i]:.4f}\n")
+            n_bins += length.size
+    print(f"[INFO] {len(sizes)} sequences, {n_bins} bins of {args.bin} bp", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    profiling.run(main)
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 import argparse
 import pandas as pd
+from compress_io import xopen
+import profiling
 
 def main():
     ap=argparse.ArgumentParser()
@@ -8,7 +10,7 @@ def main():
     ap.add_argument("--out", required=True)
     args=ap.parse_args()
 
-    df = pd.read_csv(args.fimo, sep="\t", comment="#")
+    df = pd.read_csv(xopen(args.fimo), sep="\t", comment="#")
     if df.shape[0] == 0:
         pd.DataFrame({"motif_id":[], "count":[]}).to_csv(args.out, sep="\t", index=False)
         return
@@ -16,4 +18,4 @@ def main():
     s.to_csv(args.out, sep="\t", index=False)
 
 if __name__=="__main__":
-    main()
+    profiling.run(main)
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Codon usage bias of family members against the genome background.
+
+All CDS are encoded once into codon-index arrays (0..63, 64 = ambiguous/partial),
+per-gene codon counts come from a single bincount, and every index is a matrix
+operation over the gene x codon count table (synonymous families from
+CODON_TABLE in kaks_make_axt_batch.py):
+
+  GC      G+C of the whole CDS
+  GC3s    G+C at synonymous third positions (Met, Trp and stops excluded)
+  ENC     effective number of codons (Wright 1990; F3 from F2/F4 when Ile is absent)
+  CAI     codon adaptation index (Sharp & Li 1987) against --ref genes;
+          without --ref the whole CDS set is the reference
+  RSCU    per codon, pooled over the family and over the genome (--out_rscu)
+
+Outputs:
+  --out_family  gene n_codons GC GC3s ENC CAI            (family members)
+  --out_genome  same columns for every CDS (background)
+  --out_rscu    codon aa family_count family_RSCU genome_count genome_RSCU [ref_w]
+"""
+import argparse
+import sys
+import warnings
+
+import numpy as np
+
+from compress_io import xopen
+from kaks_make_axt_batch import CODON_TABLE
+import profiling
+
+BASES = "TCAG"
+NT = np.full(256, 4, dtype=np.uint8)
+for _i, _c in enumerate(BASES):
+    NT[ord(_c)] = _i
+    NT[ord(_c.lower())] = _i
+NT[ord("U")] = NT[ord("u")] = 0
+BAD = 64
+
+CODONS = [a + b + c for a in BASES for b in BASES for c in BASES]   # index = 16*b1 + 4*b2 + b3
+AMINO = [CODON_TABLE[c] for c in CODONS]
+AA_LIST = sorted({a for a in AMINO if a != "*"})
+# codon -> amino acid one-hot (stops get no column)
+FAM = np.zeros((64, len(AA_LIST)))
+for _i, _a in enumerate(AMINO):
+    if _a != "*":
+        FAM[_i, AA_LIST.index(_a)] = 1.0
+DEG = FAM.sum(axis=0)                                   # synonymous codons per amino acid
+SENSE = np.array([a != "*" for a in AMINO])
+SYN = SENSE & (FAM @ DEG > 1)                           # codons of degenerate amino acids
+GC3 = np.array([c[2] in "GC" for c in CODONS])
+GC_PER_CODON = np.array([sum(x in "GC" for x in c) for c in CODONS], dtype=np.float64)
+CAI_FLOOR = 0.01                                        # w of codons absent from the reference
+
+
+def read_fasta(fp):
+    recs = []
+    name, buf = None, []
+    with xopen(fp) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith(">"):
+                if name is not None:
+                    recs.append((name, "".join(buf)))
+                name, buf = line[1:].split()[0], []
+            else:
+                buf.append(line)
+    if name is not None:
+        recs.append((name, "".join(buf)))
+    return recs
+
+
+def read_ids(fp):
+    s = set()
+    with xopen(fp) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                s.add(line.split()[0])
+    return s
+
+
+def codon_counts(seqs):
+    """gene x 64 codon count matrix (partial/ambiguous codons dropped)."""
+    n_cod = np.array([len(s) // 3 for s in seqs], dtype=np.int64)
+    joined = "".join(s[:3 * n] for s, n in zip(seqs, n_cod))
+    nt = NT[np.frombuffer(joined.encode("ascii", "replace"), dtype=np.uint8)].reshape(-1, 3)
+    idx = nt[:, 0].astype(np.int64) * 16 + nt[:, 1] * 4 + nt[:, 2]
+    idx[(nt == 4).any(axis=1)] = BAD
+    owner = np.repeat(np.arange(len(seqs), dtype=np.int64), n_cod)
+    counts = np.bincount(owner * 65 + idx, minlength=len(seqs) * 65).reshape(len(seqs), 65)
+    return counts[:, :64].astype(np.float64)
+
+
+def rscu(counts):
+    """RSCU = observed / (family total / family size); NaN when the amino acid is absent."""
+    totals = counts @ FAM                              # gene x aa
+    expected = (totals / DEG) @ FAM.T                  # gene x codon
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out = np.where(expected > 0, counts / expected, np.nan)
+    out[..., ~SENSE] = np.nan
+    return out
+
+
+def enc(counts):
+    """Wright's effective number of codons, per gene."""
+    totals = counts @ FAM
+    expand = totals @ FAM.T
+    with np.errstate(invalid="ignore", divide="ignore"):
+        p = np.where(expand > 0, counts / expand, 0.0)
+        hom = (p * p) @ FAM                             # sum p^2 per amino acid
+        F = np.where(totals > 1, (totals * hom - 1.0) / (totals - 1.0), np.nan)
+    fk = {}
+    for k in np.unique(DEG[DEG > 1]).astype(int):
+        cols = DEG == k
+        with np.errstate(invalid="ignore"), warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)      # 某类氨基酸全缺失 -> NaN
+            fk[k] = np.nanmean(np.where(F[:, cols] > 0, F[:, cols], np.nan), axis=1)
+    if 3 in fk and 2 in fk and 4 in fk:
+        # Ile 缺失时按 Wright 的做法取 F2/F4 的平均
+        fk[3] = np.where(np.isnan(fk[3]), (fk[2] + fk[4]) / 2.0, fk[3])
+    nc = np.full(counts.shape[0], float((DEG == 1).sum()))
+    for k, f in fk.items():
+        nc = nc + (DEG == k).sum() / f
+    return np.minimum(nc, 61.0)
+
+
+def cai_weights(ref_counts):
+    """relative adaptiveness w per codon from pooled reference counts."""
+    r = rscu(ref_counts.sum(axis=0))
+    r = np.nan_to_num(r, nan=0.0)
+    best = (r[:, None] * FAM).max(axis=0) @ FAM.T
+    with np.errstate(invalid="ignore", divide="ignore"):
+        w = np.where(best > 0, r / best, np.nan)
+    w = np.where(SYN & ~(w > 0), CAI_FLOOR, w)
+    w[~SYN] = np.nan
+    return w
+
+
+def cai(counts, w):
+    logw = np.where(SYN, np.log(np.nan_to_num(w, nan=1.0)), 0.0)
+    n = counts[:, SYN].sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(n > 0, np.exp((counts @ logw) / n), np.nan)
+
+
+def gene_metrics(counts, w):
+    n = counts.sum(axis=1)
+    syn_n = counts[:, SYN].sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        gc = np.where(n > 0, (counts @ GC_PER_CODON) / (3 * n), np.nan)
+        gc3s = np.where(syn_n > 0, counts[:, SYN & GC3].sum(axis=1) / syn_n, np.nan)
+    return n, gc, gc3s, enc(counts), cai(counts, w)
+
+
+def fmt(v, nd=4):
+    return "NA" if not np.isfinite(v) else f"{v:.{nd}f}"
+
+
+def write_metrics(out, ids, rows, sel):
+    n, gc, gc3s, nc, ca = rows
+    with open(out, "w") as w:
+        w.write("gene\tn_codons\tGC\tGC3s\tENC\tCAI\n")
+        for i in sel:
+            w.write(f"{ids[i]}\t{int(n[i])}\t{fmt(gc[i])}\t{fmt(gc3s[i])}\t{fmt(nc[i], 2)}\t{fmt(ca[i])}\n")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cds", required=True, help="target.cds.longest.fa")
+    ap.add_argument("--genes", required=True, help="family members (final_family_members.list)")
+    ap.add_argument("--ref", default="", help="CAI reference genes (e.g. highly expressed); empty = all CDS")
+    ap.add_argument("--out_family", required=True)
+    ap.add_argument("--out_genome", default="")
+    ap.add_argument("--out_rscu", default="")
+    args = ap.parse_args()
+
+    recs = read_fasta(args.cds)
+    if not recs:
+        raise SystemExit(f"[ERROR] no sequences in {args.cds}")
+    ids = [r[0] for r in recs]
+    pos = {g: i for i, g in enumerate(ids)}
+    counts = codon_counts([r[1].upper() for r in recs])
+
+    fam = read_ids(args.genes)
+    fam_idx = [pos[g] for g in sorted(fam) if g in pos]
+    if len(fam_idx) < len(fam):
+        print(f"[WARN] {len(fam) - len(fam_idx)} family genes have no CDS in {args.cds}", file=sys.stderr)
+
+    if args.ref:
+        ref = read_ids(args.ref)
+        ref_idx = [pos[g] for g in ref if g in pos]
+        if not ref_idx:
+            raise SystemExit(f"[ERROR] none of the --ref genes are in {args.cds}")
+    else:
+        ref_idx = list(range(len(ids)))
+    w = cai_weights(counts[ref_idx])
+
+    metrics = gene_metrics(counts, w)
+    write_metrics(args.out_family, ids, metrics, fam_idx)
+    if args.out_genome:
+        write_metrics(args.out_genome, ids, metrics, range(len(ids)))
+
+    if args.out_rscu:
+        fam_c = counts[fam_idx].sum(axis=0)
+        gen_c = counts.sum(axis=0)
+        fam_r, gen_r = rscu(fam_c), rscu(gen_c)
+        with open(args.out_rscu, "w") as out:
+            out.write("codon\taa\tfamily_count\tfamily_RSCU\tgenome_count\tgenome_RSCU\tref_w\n")
+            for i, c in enumerate(CODONS):
+                out.write(f"{c}\t{AMINO[i]}\t{int(fam_c[i])}\t{fmt(fam_r[i], 3)}\t"
+                          f"{int(gen_c[i])}\t{fmt(gen_r[i], 3)}\t{fmt(w[i], 3)}\n")
+
+    fam_enc = np.nanmedian(metrics[3][fam_idx]) if fam_idx else np.nan
+    print(f"[INFO] {len(ids)} CDS, {len(fam_idx)} family members; median ENC family={fmt(fam_enc, 1)} "
+          f"genome={fmt(np.nanmedian(metrics[3]), 1)}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    profiling.run(main)
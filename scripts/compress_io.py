@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Transparent (de)compression for pipeline inputs and intermediates.
+
+  xopen(path, mode)   open plain / gzip / BGZF files by content (magic bytes),
+                      not by extension; "-" means stdin/stdout.
+    reading  BGZF   -> blocks inflated in parallel in-process (zlib releases the GIL)
+             gzip   -> `pigz -dc` when available, else the gzip module
+    writing  *.gz   -> `pigz -p N` when available, else the gzip module
+
+Threads default to $PFA_IO_THREADS (4).
+
+CLI:
+  compress_io.py cat --in FILE|- [--out FILE|-]
+      copy FILE to --out, decompressing the input by content and compressing the
+      output when its name ends with .gz (so it serves as zcat, gzip and plain cp)
+
+Random access into genomes goes through the 2-bit store (genome_2bit.py), which
+is built by streaming through xopen, so compressed genomes never need to be
+inflated on disk.
+"""
+import argparse
+import gzip
+import io
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import profiling
+
+GZIP_MAGIC = b"\x1f\x8b"
+BGZF_BATCH = 64
+
+
+def io_threads(threads=None):
+    if threads:
+        return max(1, int(threads))
+    try:
+        return max(1, int(os.environ.get("PFA_IO_THREADS", "4")))
+    except ValueError:
+        return 4
+
+
+def sniff(path):
+    """'plain' | 'gzip' | 'bgzf'"""
+    with open(path, "rb") as f:
+        head = f.read(18)
+    if head[:2] != GZIP_MAGIC:
+        return "plain"
+    # BGZF: FEXTRA set and a 'BC' subfield in the extra field
+    if len(head) >= 18 and head[3] & 4 and head[12:14] == b"BC":
+        return "bgzf"
+    return "gzip"
+
+
+class _BgzfRaw(io.RawIOBase):
+    """Sequential BGZF reader that inflates batches of blocks on a thread pool."""
+
+    def __init__(self, path, threads):
+        self._f = open(path, "rb")
+        self._ex = ThreadPoolExecutor(max_workers=threads)
+        self._buf = b""
+        self._pos = 0
+        self._eof = False
+
+    def readable(self):
+        return True
+
+    def _read_block(self):
+        head = self._f.read(12)
+        if len(head) < 12:
+            return None
+        if head[:2] != GZIP_MAGIC:
+            raise IOError(f"BGZF: bad block magic in {self._f.name}")
+        (xlen,) = struct.unpack("<H", head[10:12])
+        extra = self._f.read(xlen)
+        bsize = None
+        i = 0
+        while i + 4 <= len(extra):
+            si1, si2, slen = extra[i], extra[i + 1], struct.unpack("<H", extra[i + 2:i + 4])[0]
+            if si1 == 66 and si2 == 67:
+                (bsize,) = struct.unpack("<H", extra[i + 4:i + 6])
+            i += 4 + slen
+        if bsize is None:
+            raise IOError(f"BGZF: missing BSIZE in {self._f.name}")
+        rest = self._f.read(bsize + 1 - 12 - xlen)
+        return rest[:-8]
+
+    def _fill(self):
+        blocks = []
+        for _ in range(BGZF_BATCH):
+            b = self._read_block()
+            if b is None:
+                self._eof = True
+                break
+            blocks.append(b)
+        if blocks:
+            self._buf = b"".join(self._ex.map(lambda d: zlib.decompress(d, -15), blocks))
+            self._pos = 0
+
+    def readinto(self, b):
+        while self._pos >= len(self._buf):
+            if self._eof:
+                return 0
+            self._fill()
+        n = min(len(b), len(self._buf) - self._pos)
+        b[:n] = self._buf[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._ex.shutdown(wait=False)
+            self._f.close()
+        super().close()
+
+
+class _PipeReader(io.RawIOBase):
+    def __init__(self, cmd):
+        self._p = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        return self._p.stdout.readinto(b)
+
+    def close(self):
+        if not self.closed:
+            self._p.stdout.close()
+            rc = self._p.wait()
+            if rc not in (0, -13):  # -13: SIGPIPE when the reader stops early
+                raise IOError(f"{self._p.args[0]} exited with {rc}")
+        super().close()
+
+
+class _PipeWriter(io.RawIOBase):
+    def __init__(self, cmd, path):
+        self._out = open(path, "wb")
+        self._p = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=self._out)
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._p.stdin.write(b)
+        return len(b)
+
+    def close(self):
+        if not self.closed:
+            self._p.stdin.close()
+            rc = self._p.wait()
+            self._out.close()
+            if rc != 0:
+                raise IOError(f"{self._p.args[0]} exited with {rc}")
+        super().close()
+
+
+def _open_read_binary(path, threads):
+    kind = sniff(path)
+    if kind == "plain":
+        return open(path, "rb")
+    if kind == "bgzf" and threads > 1:
+        return io.BufferedReader(_BgzfRaw(path, threads), buffer_size=1 << 20)
+    pigz = shutil.which("pigz")
+    if pigz:
+        return io.BufferedReader(_PipeReader([pigz, "-dc", "-p", str(threads), path]), buffer_size=1 << 20)
+    return gzip.open(path, "rb")
+
+
+def _open_write_binary(path, threads):
+    if not path.endswith((".gz", ".bgz")):
+        return open(path, "wb")
+    pigz = shutil.which("pigz")
+    if pigz:
+        return io.BufferedWriter(_PipeWriter([pigz, "-c", "-p", str(threads)], path), buffer_size=1 << 20)
+    return gzip.open(path, "wb", compresslevel=6)
+
+
+def xopen(path, mode="rt", threads=None, encoding="utf-8", errors=None):
+    threads = io_threads(threads)
+    binary = "b" in mode
+    if path == "-":
+        stream = sys.stdin.buffer if "r" in mode else sys.stdout.buffer
+        return stream if binary else io.TextIOWrapper(stream, encoding=encoding, errors=errors)
+    if "r" in mode:
+        fh = _open_read_binary(path, threads)
+    elif "w" in mode:
+        fh = _open_write_binary(path, threads)
+    else:
+        raise ValueError(f"unsupported mode: {mode}")
+    return fh if binary else io.TextIOWrapper(fh, encoding=encoding, errors=errors)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p1 = sub.add_parser("cat")
+    p1.add_argument("--in", dest="inp", required=True, help="plain/gzip/BGZF file, or - for stdin")
+    p1.add_argument("--out", default="-", help="*.gz is compressed; - for stdout")
+    p1.add_argument("--threads", type=int, default=0, help="default $PFA_IO_THREADS")
+
+    args = ap.parse_args()
+    with xopen(args.inp, "rb", threads=args.threads) as src, \
+            xopen(args.out, "wb", threads=args.threads) as dst:
+        shutil.copyfileobj(src, dst, length=1 << 20)
+
+
+if __name__ == "__main__":
+    profiling.run(main)
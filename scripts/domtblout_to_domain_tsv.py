@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
 import argparse, re
+from compress_io import xopen
+import profiling
 
 def parse_args():
     ap = argparse.ArgumentParser()
@@ -25,7 +27,7 @@ def main():
         keep = {norm_pfam(x) for x in keep}
 
     out_rows = []
-    with open(args.domtbl, "r", errors="ignore") as f:
+    with xopen(args.domtbl, errors="ignore") as f:
         for line in f:
             if not line.strip() or line.startswith("#"):
                 continue
@@ -76,4 +78,4 @@ def main():
             o.write(f"{r[0]}\t{r[1]}\t{r[2]}\t{r[3]}\n")
 
 if __name__ == "__main__":
-    main()
+    profiling.run(main)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Duplication mode of family members and pairs (as MCScanX duplicate_gene_classifier):
+
+  segmental  pair is an anchor of a self-collinearity block (WGD/segmental)
+  tandem     same chromosome, adjacent in gene order (rank distance 1)
+  proximal   same chromosome, rank distance <= --proximal genes
+  dispersed  anything else
+
+Gene order comes from the GFF: transcripts (restricted to --pep ids, i.e. the
+longest isoforms) are sorted per chromosome once, and each gene gets its rank.
+A member's own type is the highest type over its pairs
+(segmental > tandem > proximal > dispersed); its nearest family neighbour on
+the chromosome is found by binary search over the sorted member ranks.
+
+--pairs is rewritten with the type column filled in (kaks_filter.py /
+kaks_store.py read it); segmental pairs also get their MCScanX block id.
+"""
+import argparse
+import os
+import sys
+from bisect import bisect_left
+from collections import defaultdict
+
+from compress_io import xopen
+from parse_mcscanx_collinearity_to_pairs import iter_anchors
+import profiling
+
+ORDER = {"dispersed": 0, "proximal": 1, "tandem": 2, "segmental": 3}
+
+
+def read_ids(fp):
+    ids = set()
+    with xopen(fp) as f:
+        for line in f:
+            if line.startswith(">"):
+                ids.add(line[1:].split()[0])
+    return ids
+
+
+def gene_ranks(gff, keep):
+    """gene -> (chrom, rank); rank = position in start order on its chromosome"""
+    by_chrom = defaultdict(list)
+    with xopen(gff) as f:
+        for line in f:
+            if line.startswith("#"):
+                continue
+            a = line.rstrip("\n").split("\t")
+            if len(a) < 9 or a[2] not in ("mRNA", "transcript"):
+                continue
+            gid = ""
+            for kv in a[8].split(";"):
+                if kv.startswith("ID="):
+                    gid = kv[3:]
+                    break
+            if gid and (not keep or gid in keep):
+                by_chrom[a[0]].append((int(a[3]), int(a[4]), gid))
+    ranks = {}
+    for chrom, genes in by_chrom.items():
+        genes.sort()
+        for r, (_s, _e, gid) in enumerate(genes):
+            ranks[gid] = (chrom, r)
+    return ranks
+
+
+def pair_type(a, b, ranks, anchors, proximal):
+    key = (a, b) if a < b else (b, a)
+    if key in anchors:
+        return "segmental", anchors[key]
+    ra, rb = ranks.get(a), ranks.get(b)
+    if ra and rb and ra[0] == rb[0]:
+        d = abs(ra[1] - rb[1])
+        if d == 1:
+            return "tandem", "NA"
+        if d <= proximal:
+            return "proximal", "NA"
+    return "dispersed", "NA"
+
+
+def nearest_members(members, ranks):
+    """member -> (nearest other member on the same chromosome, rank distance)"""
+    by_chrom = defaultdict(list)
+    for g in members:
+        if g in ranks:
+            c, r = ranks[g]
+            by_chrom[c].append((r, g))
+    out = {}
+    for lst in by_chrom.values():
+        lst.sort()
+        rs = [r for r, _ in lst]
+        for r, g in lst:
+            i = bisect_left(rs, r)
+            best = None
+            for j in (i - 1, i + 1):
+                if 0 <= j < len(lst) and (best is None or abs(rs[j] - r) < best[1]):
+                    best = (lst[j][1], abs(rs[j] - r))
+            if best:
+                out[g] = best
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--gff", required=True, help="annotation.clean.filtered.gff3")
+    ap.add_argument("--pep", default="", help="restrict gene order to these ids (target.pep.longest.fa)")
+    ap.add_argument("--pairs", required=True, help="pairs.tsv: geneA geneB type [...]")
+    ap.add_argument("--collinearity", default="", help="MCScanX self .collinearity (empty = no segmental calls)")
+    ap.add_argument("--min_block_hits", type=int, default=5)
+    ap.add_argument("--proximal", type=int, default=10, help="max rank distance for proximal duplicates")
+    ap.add_argument("--out", required=True, help="pairs.tsv with type (and block_id) filled in")
+    ap.add_argument("--out_members", default="", help="per-member type table")
+    args = ap.parse_args()
+
+    keep = read_ids(args.pep) if args.pep else set()
+    ranks = gene_ranks(args.gff, keep)
+
+    anchors = {}
+    if args.collinearity and os.path.exists(args.collinearity) and os.path.getsize(args.collinearity) > 0:
+        for a, b, blk in iter_anchors(args.collinearity, args.min_block_hits):
+            anchors[(a, b) if a < b else (b, a)] = blk
+    else:
+        print("[WARN] no self-collinearity given: segmental duplicates cannot be called", file=sys.stderr)
+
+    member_type = {}
+    counts = defaultdict(int)
+    rows = []
+    with xopen(args.pairs) as f:
+        f.readline()
+        for line in f:
+            a = line.rstrip("\n").split("\t")
+            if len(a) < 2 or not a[0]:
+                continue
+            ga, gb = a[0], a[1]
+            t, blk = pair_type(ga, gb, ranks, anchors, args.proximal)
+            rows.append((ga, gb, t, blk))
+            counts[t] += 1
+            for g in (ga, gb):
+                if ORDER[t] > ORDER.get(member_type.get(g), -1):
+                    member_type[g] = t
+
+    missing = {g for g in member_type if g not in ranks}
+    if missing:
+        print(f"[WARN] {len(missing)} genes not found in {args.gff}; their pairs are 'dispersed'", file=sys.stderr)
+
+    with open(args.out, "w") as w:
+        w.write("geneA\tgeneB\ttype\tblock_id\n")
+        for ga, gb, t, blk in rows:
+            w.write(f"{ga}\t{gb}\t{t}\t{blk}\n")
+
+    if args.out_members:
+        near = nearest_members(member_type, ranks)
+        with open(args.out_members, "w") as w:
+            w.write("gene\tchrom\trank\ttype\tnearest_member\trank_distance\n")
+            for g in sorted(member_type):
+                c, r = ranks.get(g, ("NA", "NA"))
+                ng, d = near.get(g, ("NA", "NA"))
+                w.write(f"{g}\t{c}\t{r}\t{member_type[g]}\t{ng}\t{d}\n")
+
+    print("[INFO] pair types: " + ", ".join(f"{k}={counts[k]}" for k in ORDER), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    profiling.run(main)
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+One-pass CDS + peptide extraction (replaces `gffread -x` followed by `gffread -y`).
+
+CDS features are grouped by Parent transcript, spliced from the 2-bit genome
+(scripts/genome_2bit.py) in transcription order, trimmed by the phase of the
+5'-most CDS segment and translated with CODON_TABLE from kaks_make_axt_batch.py.
+Chromosomes are processed in parallel.
+
+As with gffread -y, stop codons are written as '.' in the peptide FASTA.
+
+QC table columns:
+  transcript chrom strand n_cds cds_len phase_trim len_mod3 start_codon stop_codon
+  internal_stops partial_5 partial_3
+"""
+import argparse
+import re
+import sys
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from compress_io import xopen
+from genome_2bit import TwoBit, revcomp
+from kaks_make_axt_batch import translate
+import profiling
+
+RE_PARENT = re.compile(r"(?:^|;)Parent=([^;]+)")
+STOPS = {"TAA", "TAG", "TGA"}
+
+_TB = {}
+
+
+def parse_gff_cds(gff):
+    """
+    return:
+      by_chrom: chrom -> list of (tid, strand, [(start0, end, phase), ...]) in GFF order
+    """
+    cds = defaultdict(list)      # tid -> [(start0, end, phase)]
+    info = {}                    # tid -> (chrom, strand)
+    order = []
+    with xopen(gff, errors="ignore") as f:
+        for line in f:
+            if not line or line.startswith("#"):
+                continue
+            a = line.rstrip("\n").split("\t")
+            if len(a) < 9 or a[2] != "CDS":
+                continue
+            m = RE_PARENT.search(a[8])
+            if not m:
+                continue
+            try:
+                s, e = int(a[3]), int(a[4])
+            except ValueError:
+                continue
+            phase = int(a[7]) if a[7] in ("0", "1", "2") else 0
+            for tid in m.group(1).split(","):
+                if tid not in info:
+                    info[tid] = (a[0], a[6])
+                    order.append(tid)
+                cds[tid].append((min(s, e) - 1, max(s, e), phase))
+
+    by_chrom = defaultdict(list)
+    for tid in order:
+        chrom, strand = info[tid]
+        by_chrom[chrom].append((tid, strand, cds[tid]))
+    return by_chrom
+
+
+def splice(tb, chrom, strand, segs):
+    segs = sorted(segs)
+    if strand == "-":
+        # 转录方向：负链从右往左，第一个 CDS 是坐标最大的那段
+        parts = [revcomp(tb.fetch(chrom, s, e, mask=False)) for s, e, _ in reversed(segs)]
+        phase = segs[-1][2]
+    else:
+        parts = [tb.fetch(chrom, s, e, mask=False) for s, e, _ in segs]
+        phase = segs[0][2]
+    seq = "".join(parts)
+    return seq[phase:], phase
+
+
+def extract_chrom(job):
+    twobit, chrom, transcripts = job
+    tb = _TB.get(twobit)
+    if tb is None:
+        tb = _TB[twobit] = TwoBit(twobit)
+
+    out = []
+    if chrom not in tb.offsets:
+        for tid, strand, segs in transcripts:
+            out.append((tid, None, None, None))
+        return chrom, out
+
+    for tid, strand, segs in transcripts:
+        cds, phase = splice(tb, chrom, strand, segs)
+        pep = translate(cds)
+        start_codon = cds[:3]
+        n_codon = len(cds) // 3
+        stop_codon = cds[3 * (n_codon - 1):3 * n_codon] if n_codon else ""
+        has_stop = stop_codon in STOPS
+        internal = pep[:-1].count("*") if has_stop else pep.count("*")
+        qc = (tid, chrom, strand, len(segs), len(cds), phase, len(cds) % 3,
+              start_codon or "NA", stop_codon or "NA", internal,
+              int(start_codon != "ATG"), int(not has_stop))
+        out.append((tid, cds, pep.replace("*", "."), qc))
+    return chrom, out
+
+
+def wrap(seq, width=60):
+    return "\n".join(seq[i:i + width] for i in range(0, len(seq), width))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--gff", required=True)
+    ap.add_argument("--twobit", required=True, help="genome .2bit (genome_2bit.py build)")
+    ap.add_argument("--out_cds", default="", help="spliced CDS FASTA (gffread -x)")
+    ap.add_argument("--out_pep", default="", help="peptide FASTA (gffread -y)")
+    ap.add_argument("--out_qc", default="", help="per-transcript QC TSV")
+    ap.add_argument("--threads", type=int, default=1)
+    args = ap.parse_args()
+
+    if not (args.out_cds or args.out_pep):
+        raise SystemExit("[ERROR] need --out_cds and/or --out_pep")
+
+    by_chrom = parse_gff_cds(args.gff)
+    jobs = [(args.twobit, chrom, tr) for chrom, tr in by_chrom.items()]
+
+    if args.threads > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=args.threads) as ex:
+            results = dict(ex.map(extract_chrom, jobs))
+    else:
+        results = dict(map(extract_chrom, jobs))
+
+    w_cds = open(args.out_cds, "w") if args.out_cds else None
+    w_pep = open(args.out_pep, "w") if args.out_pep else None
+    w_qc = open(args.out_qc, "w") if args.out_qc else None
+    if w_qc:
+        w_qc.write("transcript\tchrom\tstrand\tn_cds\tcds_len\tphase_trim\tlen_mod3\t"
+                   "start_codon\tstop_codon\tinternal_stops\tpartial_5\tpartial_3\n")
+
+    n = missing = internal = partial = 0
+    for chrom in by_chrom:
+        for tid, cds, pep, qc in results[chrom]:
+            if cds is None:
+                missing += 1
+                continue
+            n += 1
+            internal += qc[9] > 0
+            partial += qc[10] or qc[11]
+            if w_cds:
+                w_cds.write(f">{tid}\n{wrap(cds)}\n")
+            if w_pep:
+                w_pep.write(f">{tid}\n{wrap(pep)}\n")
+            if w_qc:
+                w_qc.write("\t".join(map(str, qc)) + "\n")
+
+    for w in (w_cds, w_pep, w_qc):
+        if w:
+            w.close()
+
+    if missing:
+        print(f"[WARN] {missing} transcripts on sequences absent from {args.twobit}", file=sys.stderr)
+    print(f"[INFO] transcripts: {n}, with internal stops: {internal}, partial: {partial}", file=sys.stderr)
+    if n == 0:
+        raise SystemExit("[ERROR] no CDS extracted; check GFF seqids against the genome")
+
+
+if __name__ == "__main__":
+    profiling.run(main)
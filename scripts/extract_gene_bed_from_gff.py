@@ -1,9 +1,11 @@
 #!/usr/bin/env python3
 import argparse
+from compress_io import xopen
+import profiling
 
 def read_set(p):
     s=set()
-    with open(p) as f:
+    with xopen(p) as f:
         for line in f:
             line=line.strip()
             if line:
@@ -18,33 +20,50 @@ def parse_attr(attr):
             d[k]=v
     return d
 
+def from_dict(dict_fp, genes, what):
+    """GFF genes of the listed genes/transcripts via gene_dict.py, no GFF pass."""
+    import numpy as np
+    from gene_dict import GeneDict, report_unmatched
+    gd=GeneDict.load(dict_fp)
+    names=sorted(genes)
+    ids=gd.encode(names)
+    report_unmatched(names, ids, what)
+    return [(gd.chrom[g], int(gd.start[g])-1, int(gd.end[g]), gd.names[g], "0", gd.strand[g])
+            for g in np.unique(gd.gene_of(ids[ids>=0]))]
+
 def main():
     ap=argparse.ArgumentParser()
-    ap.add_argument("--gff", required=True)
+    ap.add_argument("--gff", default="")
     ap.add_argument("--genes", required=True)
     ap.add_argument("--out", required=True)
+    ap.add_argument("--dict", default="", help="gene_dict.py table: listed genes/transcripts -> their GFF gene")
     args=ap.parse_args()
+    if not (args.gff or args.dict):
+        raise SystemExit("[ERROR] need --gff or --dict")
 
     genes=read_set(args.genes)
     out=[]
 
-    with open(args.gff) as f:
-        for line in f:
-            if line.startswith("#"):
-                continue
-            a=line.rstrip("\n").split("\t")
-            if len(a) != 9:
-                continue
-            chrom, src, ftype, start, end, score, strand, phase, attr = a
-            if ftype != "gene":
-                continue
-            info=parse_attr(attr)
-            gid=info.get("ID") or info.get("Name")
-            if not gid:
-                continue
-            gprefix = gid.rsplit(".",1)[0] if "." in gid else gid
-            if gid in genes or gprefix in genes:
-                out.append((chrom, int(start)-1, int(end), gid, "0", strand))
+    if args.dict:
+        out=from_dict(args.dict, genes, args.genes)
+    else:
+        with xopen(args.gff) as f:
+            for line in f:
+                if line.startswith("#"):
+                    continue
+                a=line.rstrip("\n").split("\t")
+                if len(a) != 9:
+                    continue
+                chrom, src, ftype, start, end, score, strand, phase, attr = a
+                if ftype != "gene":
+                    continue
+                info=parse_attr(attr)
+                gid=info.get("ID") or info.get("Name")
+                if not gid:
+                    continue
+                gprefix = gid.rsplit(".",1)[0] if "." in gid else gid
+                if gid in genes or gprefix in genes:
+                    out.append((chrom, int(start)-1, int(end), gid, "0", strand))
 
     out.sort(key=lambda x:(x[0], x[1], x[2]))
     with open(args.out,"w") as o:
@@ -52,4 +71,4 @@ def main():
             o.write("\t".join(map(str,r))+"\n")
 
 if __name__=="__main__":
-    main()
+    profiling.run(main)
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Per-species gene / transcript dictionary with dense integer IDs.
+
+Built once from the cleaned GFF; every script that joins gene identities across
+files (FASTA headers, member lists, BED, pair tables) encodes its names through
+it instead of guessing with rsplit('.') prefixes or Parent= regexes.
+
+  id  kind  name  gene  chrom  start  end  strand  aliases
+
+  id       0..n-1; genes first in genome order, then transcripts grouped by gene
+  kind     gene | mRNA  (a CDS parented directly by a gene makes that gene its own transcript)
+  gene     id of the gene (itself for genes)
+  aliases  Name=, ID without a 'gene:' / 'transcript:' style prefix, and the
+           transcript ID without its last '.N' suffix; an alias that would
+           point at two genes, or that is some other entry's name, is dropped
+
+Library use:
+  gd = GeneDict.load("gene_dict.tsv")
+  ids = gd.encode(names)            # int32, -1 = unmatched
+  report_unmatched(names, ids, "family list")
+  genes = gd.gene_of(ids)
+
+CLI:
+  gene_dict.py build --gff ann.gff3 --species Ath --out Ath.ids.tsv
+  gene_dict.py bed   --dict Ath.ids.tsv --ids members.list --out family_genes.bed
+  gene_dict.py longest --dict Ath.ids.tsv --pep pep.fa --bed genes.bed \
+                       --out_pep pep.longest.fa --out_bed genes.longest.bed
+"""
+import argparse
+import re
+import sys
+from collections import defaultdict
+
+import numpy as np
+
+from compress_io import xopen
+import profiling
+
+RE_ATTR = {k: re.compile(rf"(?:^|;){k}=([^;]+)") for k in ("ID", "Parent", "Name")}
+RE_TYPE_PREFIX = re.compile(r"^(?:gene|transcript|mRNA|cds|CDS):")
+TX_TYPES = {"mRNA", "transcript"}
+
+
+def attr(s, key):
+    m = RE_ATTR[key].search(s)
+    return m.group(1) if m else ""
+
+
+# ---------------------------------------------------------------- build
+def parse_gff(gff):
+    genes = {}                                   # name -> [chrom, start, end, strand, Name]
+    tx = {}                                      # name -> [chrom, start, end, strand, Name, parent]
+    cds_parents = set()
+    with xopen(gff, errors="ignore") as f:
+        for line in f:
+            if line.startswith("#"):
+                continue
+            a = line.rstrip("\n").split("\t")
+            if len(a) < 9:
+                continue
+            t = a[2]
+            if t == "CDS":
+                p = attr(a[8], "Parent")
+                if p:
+                    cds_parents.update(p.split(","))
+                continue
+            if t != "gene" and t not in TX_TYPES:
+                continue
+            gid = attr(a[8], "ID")
+            if not gid:
+                continue
+            try:
+                rec = [a[0], int(a[3]), int(a[4]), a[6], attr(a[8], "Name")]
+            except ValueError:
+                continue
+            if t == "gene":
+                genes.setdefault(gid, rec)
+            else:
+                tx.setdefault(gid, rec + [attr(a[8], "Parent").split(",")[0]])
+    # 没有 gene 行的转录本：父 ID 不存在时以转录本自身坐标补一个 gene
+    for tid, r in tx.items():
+        if not r[5] or r[5] not in genes:
+            r[5] = r[5] or tid
+            genes.setdefault(r[5], r[:4] + [""])
+    # CDS 直接挂在 gene 上（没有 mRNA 层）：gene 就是它自己的转录本，不再另开一行
+    return genes, tx, cds_parents
+
+
+def build(gff, out, species=""):
+    genes, tx, cds_parents = parse_gff(gff)
+    gnames = sorted(genes, key=lambda g: (genes[g][0], genes[g][1], genes[g][2], g))
+    gidx = {g: i for i, g in enumerate(gnames)}
+    tnames = sorted((t for t in tx if t not in gidx), key=lambda t: (gidx[tx[t][5]], tx[t][1], t))
+    rows = [(g, "gene", gidx[g], *genes[g]) for g in gnames]
+    rows += [(t, "mRNA", gidx[tx[t][5]], *tx[t][:5]) for t in tnames]
+    names = {r[0] for r in rows}
+
+    # 别名：Name=、去掉类型前缀的 ID、转录本去掉 .N 后缀；指向多个 gene 或与正式名冲突的丢弃
+    cand = defaultdict(set)                      # alias -> {row index}
+    for i, r in enumerate(rows):
+        name, nm = r[0], r[7]
+        forms = {nm, RE_TYPE_PREFIX.sub("", name)}
+        if r[1] == "mRNA" and "." in name:
+            forms.add(name.rsplit(".", 1)[0])
+        for a in forms:
+            if a and a != name:
+                cand[a].add(i)
+    aliases = defaultdict(list)
+    n_amb = 0
+    for a, idx in cand.items():
+        if a in names:
+            continue
+        if len({rows[i][2] for i in idx}) > 1:
+            n_amb += 1
+            continue
+        # 同一 gene 的多个条目共享别名时挂在 gene 上
+        i = min(idx, key=lambda k: (rows[k][1] != "gene", k))
+        aliases[i].append(a)
+
+    no_cds = sum(1 for t in tnames if t not in cds_parents) if cds_parents else 0
+    with open(out, "w") as w:
+        w.write(f"#gene_dict v1 species={species} genes={len(gnames)} transcripts={len(tnames)}\n")
+        w.write("id\tkind\tname\tgene\tchrom\tstart\tend\tstrand\taliases\n")
+        for i, (name, kind, g, chrom, s, e, strand, _nm) in enumerate(rows):
+            w.write(f"{i}\t{kind}\t{name}\t{g}\t{chrom}\t{s}\t{e}\t{strand}\t{','.join(sorted(aliases[i]))}\n")
+    print(f"[INFO] {species or gff}: {len(gnames)} genes, {len(tnames)} transcripts"
+          + (f", {no_cds} transcripts without CDS" if no_cds else "")
+          + (f"; {n_amb} ambiguous aliases dropped" if n_amb else ""), file=sys.stderr)
+
+
+# ---------------------------------------------------------------- library
+class GeneDict:
+    def __init__(self, names, kind, gene, chrom, start, end, strand, aliases):
+        self.names = np.asarray(names, dtype=object)
+        self.is_gene = np.asarray([k == "gene" for k in kind])
+        self.gene = np.asarray(gene, dtype=np.int32)
+        self.chrom = np.asarray(chrom, dtype=object)
+        self.start = np.asarray(start, dtype=np.int64)
+        self.end = np.asarray(end, dtype=np.int64)
+        self.strand = np.asarray(strand, dtype=object)
+        self.index = {n: i for i, n in enumerate(names)}
+        self.alias = {}
+        for i, al in enumerate(aliases):
+            for a in al:
+                self.alias.setdefault(a, i)
+
+    @classmethod
+    def load(cls, fp):
+        cols = [[] for _ in range(8)]
+        with xopen(fp) as f:
+            for line in f:
+                if line.startswith("#") or line.startswith("id\t"):
+                    continue
+                a = line.rstrip("\n").split("\t")
+                cols[0].append(a[2])
+                cols[1].append(a[1])
+                cols[2].append(int(a[3]))
+                cols[3].append(a[4])
+                cols[4].append(int(a[5]))
+                cols[5].append(int(a[6]))
+                cols[6].append(a[7])
+                cols[7].append(a[8].split(",") if len(a) > 8 and a[8] else [])
+        return cls(*cols)
+
+    def __len__(self):
+        return len(self.names)
+
+    def lookup(self, name):
+        name = name.split()[0] if name else name
+        i = self.index.get(name)
+        if i is None:
+            i = self.alias.get(name, -1)
+        return i
+
+    def encode(self, names):
+        """int32 ids, -1 for names that are neither an entry nor an alias."""
+        return np.fromiter((self.lookup(n) for n in names), dtype=np.int32, count=len(names))
+
+    def gene_of(self, ids):
+        ids = np.asarray(ids, dtype=np.int32)
+        return np.where(ids >= 0, self.gene[np.maximum(ids, 0)], -1).astype(np.int32)
+
+    def decode(self, ids):
+        return [self.names[i] if i >= 0 else None for i in ids]
+
+
+def report_unmatched(names, ids, what, limit=5, file=sys.stderr):
+    """warn about names with id -1; returns how many there were."""
+    bad = [n for n, i in zip(names, ids) if i < 0]
+    if bad:
+        show = ", ".join(bad[:limit]) + (" ..." if len(bad) > limit else "")
+        print(f"[WARN] {what}: {len(bad)}/{len(names)} IDs not in the gene dictionary: {show}", file=file)
+    return len(bad)
+
+
+def read_ids(fp):
+    out = []
+    with xopen(fp) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                out.append(line.split()[0])
+    return out
+
+
+# ---------------------------------------------------------------- cli
+def write_bed(gd, ids_fp, out):
+    names = read_ids(ids_fp)
+    ids = gd.encode(names)
+    report_unmatched(names, ids, ids_fp)
+    ok = ids >= 0
+    sel = ids[ok]
+    keep = np.asarray(names, dtype=object)[ok]
+    order = np.lexsort((gd.start[sel], gd.chrom[sel].astype(str)))
+    with open(out, "w") as w:
+        for k in order:
+            i = sel[k]
+            w.write(f"{gd.chrom[i]}\t{max(gd.start[i] - 1, 0)}\t{gd.end[i]}\t{keep[k]}\t0\t{gd.strand[i]}\n")
+
+
+def read_fasta(fp):
+    recs, name, buf = [], None, []
+    with xopen(fp) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith(">"):
+                if name is not None:
+                    recs.append((name, "".join(buf)))
+                name, buf = line[1:].split()[0], []
+            else:
+                buf.append(line)
+    if name is not None:
+        recs.append((name, "".join(buf)))
+    return recs
+
+
+def write_longest(gd, pep, bed, out_pep, out_bed, chosen=""):
+    """
+    one transcript per GFF gene: the longest protein, or the one listed in the
+    `chosen` FASTA (the target's target.pep.longest.fa, so IDs match the member
+    lists); IDs the dictionary does not know are kept as their own gene.
+    """
+    recs = read_fasta(pep)
+    names = [n for n, _s in recs]
+    ids = gd.encode(names)
+    report_unmatched(names, ids, pep)
+    genes = gd.gene_of(ids)
+    pinned = {n for n, _s in read_fasta(chosen)} if chosen else set()
+    best = {}
+    for (name, seq), g in zip(recs, genes):
+        key = int(g) if g >= 0 else name
+        cur = best.get(key)
+        if cur is None or (name in pinned) > (cur[0] in pinned) or (
+                (name in pinned) == (cur[0] in pinned) and len(seq) > len(cur[1])):
+            best[key] = (name, seq)
+    keep = {n for n, _s in best.values()}
+    with open(out_pep, "w") as w:
+        for name, seq in recs:
+            if name in keep:
+                w.write(f">{name}\n{seq}\n")
+    n_bed = 0
+    with xopen(bed) as f, open(out_bed, "w") as w:
+        for line in f:
+            a = line.split("\t", 4)
+            if len(a) > 3 and a[3].strip() in keep:
+                w.write(line)
+                n_bed += 1
+    print(f"[INFO] {pep}: {len(keep)}/{len(recs)} transcripts kept (one per gene), {n_bed} BED rows",
+          file=sys.stderr)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="gene dictionary from a GFF3")
+    b.add_argument("--gff", required=True)
+    b.add_argument("--species", default="")
+    b.add_argument("--out", required=True)
+    d = sub.add_parser("bed", help="BED6 of listed genes/transcripts (name column = listed ID)")
+    d.add_argument("--dict", required=True)
+    d.add_argument("--ids", required=True)
+    d.add_argument("--out", required=True)
+    g = sub.add_parser("longest", help="longest isoform per gene of a peptide FASTA + its BED rows")
+    g.add_argument("--dict", required=True)
+    g.add_argument("--pep", required=True)
+    g.add_argument("--bed", required=True, help="BED with the transcript ID in column 4")
+    g.add_argument("--chosen", default="", help="FASTA whose IDs are the isoforms to keep for their genes")
+    g.add_argument("--out_pep", required=True)
+    g.add_argument("--out_bed", required=True)
+    args = ap.parse_args()
+
+    if args.cmd == "build":
+        build(args.gff, args.out, args.species)
+    elif args.cmd == "bed":
+        write_bed(GeneDict.load(args.dict), args.ids, args.out)
+    else:
+        write_longest(GeneDict.load(args.dict), args.pep, args.bed, args.out_pep, args.out_bed, args.chosen)
+
+
+if __name__ == "__main__":
+    profiling.run(main)
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Packed 2-bit genome store (UCSC .2bit layout, readable by twoBitToFa).
+
+Each base takes 2 bits (T=0 C=1 A=2 G=3); runs of N and of soft-masked
+(lowercase) bases are kept as (start, size) block tables. The file is read
+through np.memmap, so slicing a region only touches the pages it covers.
+
+Subcommands:
+  build     genome.fa[.gz] -> genome.2bit (one pass, vectorized packing)
+  sizes     chromosome lengths (same as `cut -f1,2 genome.fa.fai`)
+  getfasta  BED regions -> FASTA (replacement for `bedtools getfasta -s -name`)
+
+Library use:
+  from genome_2bit import TwoBit, revcomp
+  tb = TwoBit("genome.2bit"); tb.fetch("chr1", 0, 100)
+"""
+import argparse
+import os
+import shutil
+import struct
+import sys
+import tempfile
+
+import numpy as np
+
+from compress_io import xopen
+import profiling
+
+SIGNATURE = 0x1A412743
+
+# 2-bit codes in UCSC order
+BASES = b"TCAG"
+ENCODE = np.zeros(256, dtype=np.uint8)
+for _i, _b in enumerate(BASES):
+    ENCODE[_b] = _i
+IS_ACGT = np.zeros(256, dtype=bool)
+IS_ACGT[list(BASES)] = True
+
+# packed byte -> 4 ASCII bases
+UNPACK = np.array(
+    [[BASES[(b >> s) & 3] for s in (6, 4, 2, 0)] for b in range(256)], dtype=np.uint8
+)
+
+_COMP = bytes.maketrans(b"ACGTNacgtnRYKMrykmBDHVbdhvSWsw", b"TGCANtgcanYRMKyrmkVHDBvhdbSWsw")
+
+
+def revcomp(seq: str) -> str:
+    return seq.encode("ascii").translate(_COMP)[::-1].decode("ascii")
+
+
+def runs(mask):
+    """(starts, sizes) of True runs in a bool array."""
+    if not mask.any():
+        return np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.uint32)
+    d = np.diff(np.concatenate(([0], mask.view(np.int8), [0])))
+    starts = np.flatnonzero(d == 1)
+    ends = np.flatnonzero(d == -1)
+    return starts.astype(np.uint32), (ends - starts).astype(np.uint32)
+
+
+def region_mask(n, offset, starts, sizes):
+    """bool[n] marking block coverage of [offset, offset+n); blocks sorted, non-overlapping."""
+    if starts.size == 0:
+        return None
+    ends = starts.astype(np.int64) + sizes
+    i0 = np.searchsorted(ends, offset, side="right")
+    i1 = np.searchsorted(starts, offset + n, side="left")
+    if i0 >= i1:
+        return None
+    s = np.clip(starts[i0:i1].astype(np.int64) - offset, 0, n)
+    e = np.clip(ends[i0:i1] - offset, 0, n)
+    mark = np.zeros(n + 1, dtype=np.int32)
+    np.add.at(mark, s, 1)
+    np.add.at(mark, e, -1)
+    return np.cumsum(mark[:-1]) > 0
+
+
+def iter_fasta_bytes(fp):
+    name = None
+    buf = []
+    with xopen(fp, "rb") as f:
+        for line in f:
+            if line.startswith(b">"):
+                if name is not None:
+                    yield name, b"".join(buf)
+                name = line[1:].split()[0].decode()
+                buf = []
+            else:
+                buf.append(line.strip())
+        if name is not None:
+            yield name, b"".join(buf)
+
+
+def pack_record(seq: bytes) -> bytes:
+    arr = np.frombuffer(seq, dtype=np.uint8)
+    lower = (arr >= 97) & (arr <= 122)
+    upper = np.where(lower, arr - 32, arr).astype(np.uint8)
+
+    n_starts, n_sizes = runs(~IS_ACGT[upper])
+    m_starts, m_sizes = runs(lower)
+
+    codes = ENCODE[upper]
+    pad = (-codes.size) % 4
+    if pad:
+        codes = np.concatenate((codes, np.zeros(pad, dtype=np.uint8)))
+    c = codes.reshape(-1, 4)
+    packed = (c[:, 0] << 6) | (c[:, 1] << 4) | (c[:, 2] << 2) | c[:, 3]
+
+    return b"".join((
+        struct.pack("<II", arr.size, n_starts.size),
+        n_starts.astype("<u4").tobytes(), n_sizes.astype("<u4").tobytes(),
+        struct.pack("<I", m_starts.size),
+        m_starts.astype("<u4").tobytes(), m_sizes.astype("<u4").tobytes(),
+        struct.pack("<I", 0),
+        packed.astype(np.uint8).tobytes(),
+    ))
+
+
+def build(fa, out):
+    names, sizes = [], []
+    out_dir = os.path.dirname(os.path.abspath(out))
+    with tempfile.TemporaryFile(dir=out_dir) as body:
+        for name, seq in iter_fasta_bytes(fa):
+            rec = pack_record(seq)
+            names.append(name)
+            sizes.append(len(rec))
+            body.write(rec)
+
+        if not names:
+            raise SystemExit(f"[ERROR] no sequences in {fa}")
+
+        index_len = sum(1 + len(n.encode()) for n in names)
+        total = 16 + index_len + 4 * len(names) + sum(sizes)
+        version, off_fmt = (0, "<I") if total < 2 ** 32 else (1, "<Q")
+        off_size = struct.calcsize(off_fmt)
+
+        tmp_out = out + ".tmp"
+        with open(tmp_out, "wb") as w:
+            w.write(struct.pack("<IIII", SIGNATURE, version, len(names), 0))
+            offset = 16 + index_len + off_size * len(names)
+            for name, size in zip(names, sizes):
+                nb = name.encode()
+                w.write(struct.pack("<B", len(nb)) + nb + struct.pack(off_fmt, offset))
+                offset += size
+            body.seek(0)
+            shutil.copyfileobj(body, w, length=16 << 20)
+        os.replace(tmp_out, out)
+    return len(names)
+
+
+class TwoBit:
+    def __init__(self, path):
+        self.path = path
+        self.mm = np.memmap(path, dtype=np.uint8, mode="r")
+        sig, version, count, _ = struct.unpack_from("<IIII", self.mm, 0)
+        if sig != SIGNATURE:
+            raise ValueError(f"not a .2bit file: {path}")
+        off_fmt = "<I" if version == 0 else "<Q"
+        pos = 16
+        self.offsets = {}
+        self.order = []
+        for _ in range(count):
+            n = int(self.mm[pos])
+            name = self.mm[pos + 1:pos + 1 + n].tobytes().decode()
+            (off,) = struct.unpack_from(off_fmt, self.mm, pos + 1 + n)
+            pos += 1 + n + struct.calcsize(off_fmt)
+            self.offsets[name] = off
+            self.order.append(name)
+        self._records = {}
+
+    def _u32(self, pos, n):
+        return np.frombuffer(self.mm, dtype="<u4", count=n, offset=pos)
+
+    def record(self, name):
+        rec = self._records.get(name)
+        if rec is None:
+            if name not in self.offsets:
+                raise KeyError(f"sequence not in {self.path}: {name}")
+            pos = self.offsets[name]
+            size, nb = struct.unpack_from("<II", self.mm, pos)
+            pos += 8
+            n_starts, n_sizes = self._u32(pos, nb), self._u32(pos + 4 * nb, nb)
+            pos += 8 * nb
+            (mb,) = struct.unpack_from("<I", self.mm, pos)
+            pos += 4
+            m_starts, m_sizes = self._u32(pos, mb), self._u32(pos + 4 * mb, mb)
+            pos += 8 * mb + 4
+            rec = (size, n_starts, n_sizes, m_starts, m_sizes, pos)
+            self._records[name] = rec
+        return rec
+
+    def sizes(self):
+        return [(name, self.record(name)[0]) for name in self.order]
+
+    def length(self, name):
+        return self.record(name)[0]
+
+    def fetch_array(self, name, start, end, mask=True):
+        """uint8 ASCII array of [start, end) (0-based, half-open), clipped to the sequence."""
+        size, n_starts, n_sizes, m_starts, m_sizes, dna = self.record(name)
+        start = max(0, int(start))
+        end = min(size, int(end))
+        if end <= start:
+            return np.zeros(0, dtype=np.uint8)
+        packed = self.mm[dna + start // 4: dna + (end + 3) // 4]
+        first = start % 4
+        seq = UNPACK[packed].ravel()[first:first + (end - start)].copy()
+
+        nmask = region_mask(seq.size, start, n_starts, n_sizes)
+        if nmask is not None:
+            seq[nmask] = ord("N")
+        if mask:
+            lmask = region_mask(seq.size, start, m_starts, m_sizes)
+            if lmask is not None:
+                seq[lmask] |= 0x20
+        return seq
+
+    def fetch(self, name, start, end, strand="+", mask=True):
+        s = self.fetch_array(name, start, end, mask=mask).tobytes().decode("ascii")
+        return revcomp(s) if strand == "-" else s
+
+
+def getfasta(twobit, bed, out, stranded=True, use_name=True):
+    tb = TwoBit(twobit)
+    n = 0
+    with xopen(bed) as f, open(out, "w") as w:
+        for line in f:
+            if not line.strip() or line.startswith(("#", "track", "browser")):
+                continue
+            a = line.rstrip("\n").split("\t")
+            chrom, start, end = a[0], int(a[1]), int(a[2])
+            strand = a[5] if stranded and len(a) >= 6 else "+"
+            if chrom not in tb.offsets:
+                print(f"[WARN] {chrom} not in {twobit}; skipped", file=sys.stderr)
+                continue
+            name = a[3] if use_name and len(a) >= 4 else f"{chrom}:{start}-{end}"
+            w.write(f">{name}\n{tb.fetch(chrom, start, end, strand)}\n")
+            n += 1
+    return n
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p1 = sub.add_parser("build")
+    p1.add_argument("--fa", required=True)
+    p1.add_argument("--out", required=True)
+
+    p2 = sub.add_parser("sizes")
+    p2.add_argument("--twobit", required=True)
+    p2.add_argument("--out", default="-")
+
+    p3 = sub.add_parser("getfasta")
+    p3.add_argument("--twobit", required=True)
+    p3.add_argument("--bed", required=True)
+    p3.add_argument("--out", required=True)
+    p3.add_argument("--no_strand", action="store_true", help="ignore BED strand (no reverse complement)")
+    p3.add_argument("--no_name", action="store_true", help="use chr:start-end as FASTA header")
+
+    args = ap.parse_args()
+    if args.cmd == "build":
+        n = build(args.fa, args.out)
+        print(f"[INFO] packed {n} sequences: {args.fa} -> {args.out}", file=sys.stderr)
+    elif args.cmd == "sizes":
+        w = sys.stdout if args.out == "-" else open(args.out, "w")
+        for name, size in TwoBit(args.twobit).sizes():
+            w.write(f"{name}\t{size}\n")
+        if w is not sys.stdout:
+            w.close()
+    elif args.cmd == "getfasta":
+        n = getfasta(args.twobit, args.bed, args.out,
+                     stranded=not args.no_strand, use_name=not args.no_name)
+        print(f"[INFO] extracted {n} regions", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    profiling.run(main)
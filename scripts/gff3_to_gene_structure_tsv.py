@@ -2,6 +2,8 @@
 import argparse
 import re
 from pathlib import Path
+from compress_io import xopen
+import profiling
 
 def parse_args():
     ap = argparse.ArgumentParser()
@@ -14,7 +16,7 @@ def parse_args():
 
 def load_ids(path):
     s = set()
-    with open(path) as f:
+    with xopen(path) as f:
         for line in f:
             x = line.strip()
             if x:
@@ -32,7 +34,7 @@ def main():
     feats = set([x.strip() for x in args.features.split(",") if x.strip()])
 
     rows = []
-    with open(args.gff, "r", errors="ignore") as f:
+    with xopen(args.gff, errors="ignore") as f:
         for line in f:
             if not line or line.startswith("#"):
                 continue
@@ -78,4 +80,4 @@ def main():
             o.write(f"{r[0]}\t{r[1]}\t{r[2]}\t{r[3]}\n")
 
 if __name__ == "__main__":
-    main()
+    profiling.run(main)
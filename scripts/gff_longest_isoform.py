@@ -2,21 +2,32 @@
 import argparse
 from collections import defaultdict
 from Bio import SeqIO
+from compress_io import xopen
+import profiling
 
 def get_prefix(rid: str) -> str:
     rid = rid.split()[0]
     return rid.rsplit(".", 1)[0] if "." in rid else rid
 
-def load_best_by_prefix(fa_path: str):
+def load_best_by_prefix(fa_path: str, gd=None):
     """
     return:
       by_prefix: dict[prefix] -> dict[iso_id] -> SeqRecord
+    with a gene dictionary (gene_dict.py) the key is the GFF gene of each isoform;
+    IDs it does not know fall back to the '.N' prefix and are reported.
     """
+    recs = list(SeqIO.parse(xopen(fa_path), "fasta"))
+    rids = [r.id.split()[0] for r in recs]
+    keys = [get_prefix(rid) for rid in rids]
+    if gd is not None:
+        from gene_dict import report_unmatched
+        ids = gd.encode(rids)
+        report_unmatched(rids, ids, fa_path)
+        genes = gd.gene_of(ids)
+        keys = [gd.names[g] if g >= 0 else k for g, k in zip(genes, keys)]
     by_prefix = defaultdict(dict)
-    for r in SeqIO.parse(fa_path, "fasta"):
-        rid = r.id.split()[0]
-        prefix = get_prefix(rid)
-        by_prefix[prefix][rid] = r
+    for r, rid, key in zip(recs, rids, keys):
+        by_prefix[key][rid] = r
     return by_prefix
 
 def main():
@@ -28,10 +39,15 @@ def main():
     ap.add_argument("--out_map", required=True)
     ap.add_argument("--prefer", choices=["cds", "pep"], default="cds",
                     help="choose longest isoform by cds length (default) or pep length")
+    ap.add_argument("--dict", default="", help="gene_dict.py table: group isoforms by their GFF gene")
     args = ap.parse_args()
 
-    cds = load_best_by_prefix(args.cds)
-    pep = load_best_by_prefix(args.pep)
+    gd = None
+    if args.dict:
+        from gene_dict import GeneDict
+        gd = GeneDict.load(args.dict)
+    cds = load_best_by_prefix(args.cds, gd)
+    pep = load_best_by_prefix(args.pep, gd)
 
     common_prefixes = sorted(set(cds.keys()) & set(pep.keys()))
 
@@ -68,4 +84,4 @@ def main():
     SeqIO.write([chosen[p][1] for p in sorted(chosen.keys())], args.out_pep, "fasta")
 
 if __name__ == "__main__":
-    main()
+    profiling.run(main)
@@ -1,19 +1,45 @@
 #!/usr/bin/env python3
 import argparse
+import sqlite3
 import pandas as pd
 
+from compress_io import xopen
+from kaks_store import build_query
+import profiling
+
+def filter_from_store(db, min_ks, max_ks, max_w):
+    # 只读需要的列；阈值过滤走 Ks 索引，数值列本身就是 REAL，无需再转换
+    sql, params = build_query(["pair", "Ka", "Ks", "KaKs", "type"],
+                              min_ks=min_ks, max_ks=max_ks, max_w=max_w, finite=True)
+    con = sqlite3.connect(db)
+    try:
+        dt = pd.read_sql_query(sql, con, params=params)
+    finally:
+        con.close()
+    dt["type"] = dt["type"].fillna("NA")
+    return dt
+
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument("--kaks_raw", required=True)
-    ap.add_argument("--pairs", required=True)
+    ap.add_argument("--db", default="", help="Ka/Ks store from kaks_store.py (replaces --kaks_raw/--pairs)")
+    ap.add_argument("--kaks_raw", default="")
+    ap.add_argument("--pairs", default="")
     ap.add_argument("--min_ks", type=float, required=True)
     ap.add_argument("--max_ks", type=float, required=True)
     ap.add_argument("--max_w", type=float, required=True)
     ap.add_argument("--out", required=True)
     args = ap.parse_args()
 
+    if args.db:
+        dt = filter_from_store(args.db, args.min_ks, args.max_ks, args.max_w)
+        dt.to_csv(args.out, sep="\t", index=False)
+        return
+
+    if not (args.kaks_raw and args.pairs):
+        raise SystemExit("[ERROR] need --db, or both --kaks_raw and --pairs")
+
     # 读 raw
-    dt = pd.read_csv(args.kaks_raw, sep="\t", dtype=str)
+    dt = pd.read_csv(xopen(args.kaks_raw), sep="\t", dtype=str)
 
     # 自动兼容 4列/5列：如果有 method，就丢掉它
     # 目标统一为: pair, Ka, Ks, KaKs
@@ -35,7 +61,7 @@ def main():
 
     # 加 type（如果你需要 pairs.tsv 的类型）
     # pairs.tsv: geneA geneB type
-    pairs = pd.read_csv(args.pairs, sep="\t", dtype=str)
+    pairs = pd.read_csv(xopen(args.pairs), sep="\t", dtype=str)
     if set(["geneA","geneB","type"]).issubset(pairs.columns):
         pairs["pair"] = pairs["geneA"] + "__" + pairs["geneB"]
         dt = dt.merge(pairs[["pair","type"]], on="pair", how="left")
@@ -45,4 +71,4 @@ def main():
     dt.to_csv(args.out, sep="\t", index=False)
 
 if __name__ == "__main__":
-    main()
+    profiling.run(main)
@@ -1,6 +1,10 @@
 #!/usr/bin/env python3
-import argparse, os, subprocess, sys
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import argparse, os, sys
+from async_runner import one_line, stream
+from batch_journal import Journal, atomic_write, content_hash, publish
+from compress_io import xopen
+from pair_memo import PairMemo, axt_key, restore_axt, store_axt
+import profiling
 
 CODON_TABLE = {
     "TTT":"F","TTC":"F","TTA":"L","TTG":"L",
@@ -25,7 +29,7 @@ def read_fasta(fp):
     seqs = {}
     name = None
     buf = []
-    with open(fp) as f:
+    with xopen(fp) as f:
         for line in f:
             line = line.strip()
             if not line:
@@ -55,7 +59,7 @@ def translate(cds):
 
 def parse_pairs(fp):
     pairs = []
-    with open(fp) as f:
+    with xopen(fp) as f:
         header = f.readline()
         for line in f:
             if not line.strip():
@@ -106,10 +110,14 @@ def fasta2kaks_axt(two_seq_fa: str, out_axt: str, nameA: str, nameB: str):
         w.write(s1 + "\n")
         w.write(s2 + "\n")
 
-def build_one(pair, cds_map, outdir, mafft, pal2nal):
+def pair_hash(pair, cds_map, mafft, pal2nal):
+    geneA, geneB, _type = pair
+    return content_hash(geneA, cds_map.get(geneA, ""), geneB, cds_map.get(geneB, ""), mafft, pal2nal)
+
+async def build_one(run, pair, cds_map, outdir, mafft, pal2nal):
     geneA, geneB, _type = pair
     if geneA not in cds_map or geneB not in cds_map:
-        return (None, f"missing CDS for {geneA} or {geneB}")
+        raise ValueError(f"missing CDS for {geneA} or {geneB}")
 
     cdsA = cds_map[geneA]
     cdsB = cds_map[geneB]
@@ -127,20 +135,15 @@ def build_one(pair, cds_map, outdir, mafft, pal2nal):
         w.write(f">{geneA}\n{translate(cdsA)}\n>{geneB}\n{translate(cdsB)}\n")
 
     pep_aln = os.path.join(tmp_dir, base + ".pep.aln.fa")
-    with open(pep_aln, "w") as out:
-        subprocess.check_call([mafft, "--auto", pep_fp], stdout=out, stderr=subprocess.DEVNULL)
+    await run([mafft, "--auto", pep_fp], stdout=pep_aln)
 
     codon_aln = os.path.join(tmp_dir, base + ".codon.aln.fa")
-    with open(codon_aln, "w") as out:
-        subprocess.check_call(
-            ["perl", pal2nal, pep_aln, cds_fp, "-output", "fasta"],
-            stdout=out, stderr=subprocess.DEVNULL
-        )
+    await run(["perl", pal2nal, pep_aln, cds_fp, "-output", "fasta"], stdout=codon_aln)
 
     axt_fp = os.path.join(outdir, base + ".axt")
     fasta2kaks_axt(codon_aln, axt_fp, geneA, geneB)
 
-    return (axt_fp, None)
+    return axt_fp
 
 def main():
     ap = argparse.ArgumentParser()
@@ -152,42 +155,103 @@ def main():
     # 兼容旧参数：不再需要，但保留不报错
     ap.add_argument("--axtconvertor", required=False, default="")
     ap.add_argument("--threads", type=int, default=4)
+    ap.add_argument("--timeout", type=float, default=600, help="seconds per pair (mafft + pal2nal); 0 = none")
+    ap.add_argument("--retries", type=int, default=2, help="retries per pair after a tool failure")
+    ap.add_argument("--workdir", default="",
+                    help="persistent work dir with the checkpoint journal (default: --outdir); "
+                         "finished .axt are linked into --outdir at the end")
+    ap.add_argument("--memo_dir", default="",
+                    help="content-addressed alignment memo shared across modules/runs (pair_memo.py)")
     args = ap.parse_args()
 
+    workdir = args.workdir or args.outdir
     os.makedirs(args.outdir, exist_ok=True)
-    cds_map = read_fasta(args.cds_fa)
-    pairs = parse_pairs(args.pairs)
+    with profiling.phase("parse") as ph:
+        cds_map = read_fasta(args.cds_fa)
+        pairs = parse_pairs(args.pairs)
+        ph.records = len(pairs)
 
     ok_fp = os.path.join(args.outdir, "ok.tsv")
     fail_fp = os.path.join(args.outdir, "failed.tsv")
-    ok = 0
-    fail = 0
+    done = {}       # pair -> axt in workdir
+    failed = []
+    memo = PairMemo(args.memo_dir)
+    memo_keys = {}  # pair -> (key, swapped)
+
+    async def job(run, pair):
+        return await build_one(run, pair, cds_map, workdir, args.mafft, args.pal2nal)
+
+    with Journal(workdir) as journal:
+        # 断点续跑：输入哈希一致且结果还在的 pair 直接跳过
+        hashes = {p: pair_hash(p, cds_map, args.mafft, args.pal2nal) for p in pairs}
+        todo = []
+        for p in pairs:
+            axt = journal.done(f"{p[0]}__{p[1]}", hashes[p])
+            if axt:
+                done[p] = axt
+            else:
+                todo.append(p)
+        if done:
+            print(f"[INFO] resume: {len(done)} pairs already done, {len(todo)} to run", file=sys.stderr)
+
+        # 序列相同的 pair 以前（别的模块/别的运行）比对过就直接取缓存
+        misses = []
+        n_memo = 0
+        for p in todo:
+            geneA, geneB, _t = p
+            if args.memo_dir and geneA in cds_map and geneB in cds_map:
+                memo_keys[p] = axt_key(cds_map[geneA], cds_map[geneB], args.mafft, args.pal2nal)
+                hit = memo.get("axt", memo_keys[p][0])
+                if hit:
+                    base = f"{geneA}__{geneB}".replace("|","_")
+                    axt = restore_axt(hit, memo_keys[p][1], geneA, geneB,
+                                      os.path.join(workdir, base + ".axt"))
+                    done[p] = axt
+                    journal.record(f"{geneA}__{geneB}", hashes[p], axt)
+                    n_memo += 1
+                    continue
+            misses.append(p)
+        if n_memo:
+            print(f"[INFO] memo: {n_memo} alignments reused, {len(misses)} to run", file=sys.stderr)
 
-    with open(ok_fp, "w") as okw, open(fail_fp, "w") as fw:
+        # 单个 pair 失败只记录，不中断整个批次
+        with profiling.phase("align", len(misses)):
+            for res in stream(misses, job, concurrency=args.threads,
+                              timeout=args.timeout, retries=args.retries):
+                if res.ok:
+                    done[res.key] = res.value
+                    journal.record(f"{res.key[0]}__{res.key[1]}", hashes[res.key], res.value)
+                    if res.key in memo_keys:
+                        store_axt(memo, *memo_keys[res.key], res.value)
+                else:
+                    failed.append(res)
+
+    # 汇总：结果放进 outdir，ok/failed 表整体替换
+    with profiling.phase("write", len(done)), atomic_write(ok_fp) as okw:
         okw.write("geneA\tgeneB\taxt\n")
-        fw.write("geneA\tgeneB\treason\n")
-
-        with ThreadPoolExecutor(max_workers=args.threads) as ex:
-            futs = {ex.submit(build_one, p, cds_map, args.outdir, args.mafft, args.pal2nal): p for p in pairs}
-            for fu in as_completed(futs):
-                geneA, geneB, _t = futs[fu]
-                try:
-                    axt, err = fu.result()
-                    if axt:
-                        ok += 1
-                        okw.write(f"{geneA}\t{geneB}\t{axt}\n")
-                    else:
-                        fail += 1
-                        fw.write(f"{geneA}\t{geneB}\t{err}\n")
-                except Exception as e:
-                    fail += 1
-                    fw.write(f"{geneA}\t{geneB}\tEXCEPTION: {e}\n")
+        for p in pairs:
+            if p not in done:
+                continue
+            axt = done[p]
+            if os.path.abspath(workdir) != os.path.abspath(args.outdir):
+                dst = os.path.join(args.outdir, os.path.basename(axt))
+                publish(axt, dst)
+                axt = dst
+            okw.write(f"{p[0]}\t{p[1]}\t{axt}\n")
+    with atomic_write(fail_fp) as fw:
+        fw.write("geneA\tgeneB\treason\tattempts\tstderr\n")
+        for res in failed:
+            geneA, geneB, _t = res.key
+            fw.write(f"{geneA}\t{geneB}\t{one_line(res.error)}\t{res.attempts}\t{one_line(res.stderr)}\n")
 
+    ok, fail = len(done), len(failed)
     if ok == 0:
         print("[ERROR] No AXT generated. Check gene IDs between pairs and CDS fasta.", file=sys.stderr)
         sys.exit(2)
 
     print(f"[INFO] AXT generated: {ok}, failed: {fail}", file=sys.stderr)
+    if fail:
+        print(f"[WARN] see {fail_fp} for failed pairs", file=sys.stderr)
 
 if __name__ == "__main__":
-    main()
+    profiling.run(main)
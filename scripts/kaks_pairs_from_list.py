@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 import argparse
 import itertools
+from compress_io import xopen
+import profiling
 
 def main():
     ap = argparse.ArgumentParser()
@@ -9,7 +11,7 @@ def main():
     args = ap.parse_args()
 
     genes = []
-    with open(args.gene_list) as f:
+    with xopen(args.gene_list) as f:
         for line in f:
             g = line.strip().split()[0]
             if g:
@@ -22,4 +24,4 @@ def main():
             w.write(f"{a}\t{b}\tparalog_family\n")
 
 if __name__ == "__main__":
-    main()
+    profiling.run(main)
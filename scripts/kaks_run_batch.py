@@ -1,14 +1,16 @@
 #!/usr/bin/env python3
-import argparse, glob, os, subprocess
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import argparse, glob, os, re, shutil, sys
+from async_runner import one_line, stream
+from batch_journal import Journal, atomic_write, content_hash, file_hash
+from compress_io import xopen
+from pair_memo import PairMemo, kaks_key
+import profiling
 
-def run_one(axt, kaks, method):
-    out = axt + ".kaks"
-    subprocess.check_call(
-        [kaks, "-i", axt, "-o", out, "-m", method],
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.DEVNULL
-    )
+async def run_one(run, axt, kaks, method, workdir):
+    out = os.path.join(workdir, os.path.basename(axt) + ".kaks")
+    await run([kaks, "-i", axt, "-o", out, "-m", method])
+    if not os.path.exists(out) or os.path.getsize(out) == 0:
+        raise ValueError(f"KaKs wrote no output: {out}")
     return out
 
 def parse_kaks_file(fp):
@@ -19,7 +21,7 @@ def parse_kaks_file(fp):
     或者可能没有表头/以 # 开头。
     """
     rows = []
-    with open(fp) as f:
+    with xopen(fp) as f:
         for line in f:
             line = line.strip()
             if not line:
@@ -44,24 +46,90 @@ def main():
     ap.add_argument("--method", default="YN")
     ap.add_argument("--out", required=True)
     ap.add_argument("--threads", type=int, default=4)
+    ap.add_argument("--timeout", type=float, default=600, help="seconds per KaKs call; 0 = none")
+    ap.add_argument("--retries", type=int, default=2, help="retries per pair after a KaKs failure")
+    ap.add_argument("--failed", default="", help="failure records (default: <out>.failed.tsv)")
+    ap.add_argument("--workdir", default="",
+                    help="persistent dir for .kaks results and the checkpoint journal (default: --axt_dir)")
+    ap.add_argument("--memo_dir", default="",
+                    help="content-addressed Ka/Ks memo shared across modules/runs (pair_memo.py)")
     args = ap.parse_args()
 
     axts = sorted(glob.glob(os.path.join(args.axt_dir, "*.axt")))
     if not axts:
         raise SystemExit(f"[ERROR] no .axt found in {args.axt_dir}")
 
+    failed_fp = args.failed or re.sub(r"\.tsv$", "", args.out) + ".failed.tsv"
+    workdir = args.workdir or args.axt_dir
+
+    async def job(run, axt):
+        return await run_one(run, axt, args.kaks, args.method, workdir)
+
     outfiles = []
-    with ThreadPoolExecutor(max_workers=args.threads) as ex:
-        futs = [ex.submit(run_one, axt, args.kaks, args.method) for axt in axts]
-        for fu in as_completed(futs):
-            outfiles.append(fu.result())
+    with Journal(workdir) as journal, atomic_write(failed_fp) as fw:
+        fw.write("pair\taxt\treason\tattempts\tstderr\n")
+
+        # 断点续跑：axt 内容、方法和程序都没变、且 .kaks 还在的 pair 直接跳过
+        hashes = {axt: content_hash(file_hash(axt), args.method, args.kaks) for axt in axts}
+        todo = []
+        for axt in axts:
+            fp = journal.done(os.path.basename(axt), hashes[axt])
+            if fp:
+                outfiles.append(fp)
+            else:
+                todo.append(axt)
+        if outfiles:
+            print(f"[INFO] resume: {len(outfiles)} pairs already done, {len(todo)} to run", file=sys.stderr)
 
-    with open(args.out, "w") as w:
+        # 同一条密码子比对 + 同一方法算过的结果直接取缓存
+        memo = PairMemo(args.memo_dir)
+        memo_keys = {}
+        misses = []
+        for axt in todo:
+            if args.memo_dir:
+                try:
+                    memo_keys[axt] = kaks_key(axt, args.method, args.kaks)
+                except ValueError:
+                    misses.append(axt)
+                    continue
+                hit = memo.get("kaks", memo_keys[axt])
+                if hit:
+                    out = os.path.join(workdir, os.path.basename(axt) + ".kaks")
+                    shutil.copyfile(hit, out)   # 复制而非硬链接：重跑时 KaKs 覆写不能波及缓存
+                    outfiles.append(out)
+                    journal.record(os.path.basename(axt), hashes[axt], out)
+                    continue
+            misses.append(axt)
+        if len(misses) < len(todo):
+            print(f"[INFO] memo: {len(todo) - len(misses)} Ka/Ks results reused, {len(misses)} to run",
+                  file=sys.stderr)
+
+        # 结果边跑边收；单个 KaKs 失败只记录，不中断整个批次
+        for res in stream(misses, job, concurrency=args.threads,
+                          timeout=args.timeout, retries=args.retries):
+            if res.ok:
+                outfiles.append(res.value)
+                journal.record(os.path.basename(res.key), hashes[res.key], res.value)
+                if res.key in memo_keys:
+                    memo.put_file("kaks", memo_keys[res.key], res.value)
+            else:
+                pair = os.path.basename(res.key)[:-len(".axt")]
+                fw.write(f"{pair}\t{res.key}\t{one_line(res.error)}\t{res.attempts}\t{one_line(res.stderr)}\n")
+
+    # 最终合并一次性写出，中断不会留下半个 raw 表
+    with atomic_write(args.out) as w:
         w.write("pair\tmethod\tKa\tKs\tKaKs\n")
         for fp in sorted(outfiles):
             pair = os.path.basename(fp).replace(".axt.kaks", "")
             for _seq, method, ka, ks, wk in parse_kaks_file(fp):
                 w.write(f"{pair}\t{method}\t{ka}\t{ks}\t{wk}\n")
 
+    n_fail = len(axts) - len(outfiles)
+    print(f"[INFO] KaKs done: {len(outfiles)}, failed: {n_fail}", file=sys.stderr)
+    if n_fail:
+        print(f"[WARN] see {failed_fp} for failed pairs", file=sys.stderr)
+    if not outfiles:
+        raise SystemExit("[ERROR] every KaKs call failed")
+
 if __name__ == "__main__":
-    main()
+    profiling.run(main)
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Typed Ka/Ks results store (SQLite).
+
+Tables:
+  genes(gene_id INTEGER PK, name TEXT UNIQUE)
+  kaks(geneA, geneB -> genes.gene_id, pair_type, block_id, method, Ka, Ks, KaKs)
+       PK (geneA, geneB, method); indexes on geneB and Ks
+
+Subcommands:
+  ingest  append/replace rows from kaks_run_batch.py output (pair method Ka Ks KaKs),
+          resolving pair names through pairs.tsv (geneA geneB type [block_id]);
+          rows whose pair is not in pairs.tsv are counted and skipped.
+          In the workflow the store is a rule output, so Snakemake deletes it
+          and it is rebuilt from the whole kaks.raw.tsv (new pairs are cheap
+          there through the kaks.memo cache); appending to an existing store is
+          for merging batches run outside the workflow
+  query   select rows by gene / Ks range, only the requested columns
+"""
+import argparse
+import os
+import sqlite3
+import sys
+
+from compress_io import xopen
+import profiling
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS genes (
+    gene_id INTEGER PRIMARY KEY,
+    name    TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS kaks (
+    geneA     INTEGER NOT NULL REFERENCES genes(gene_id),
+    geneB     INTEGER NOT NULL REFERENCES genes(gene_id),
+    pair_type TEXT,
+    block_id  INTEGER,
+    method    TEXT NOT NULL,
+    Ka        REAL,
+    Ks        REAL,
+    KaKs      REAL,
+    PRIMARY KEY (geneA, geneB, method)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_kaks_geneB ON kaks(geneB);
+CREATE INDEX IF NOT EXISTS idx_kaks_ks ON kaks(Ks);
+"""
+
+# columns exposed by `query` (and by kaks_filter.py --db)
+COLUMNS = {
+    # 与 pair_name() 相同的清洗，--db 与 --kaks_raw 两条路径的 pair 一致
+    "pair": "replace(ga.name || '__' || gb.name, '|', '_')",
+    "geneA": "ga.name",
+    "geneB": "gb.name",
+    "type": "k.pair_type",
+    "block_id": "k.block_id",
+    "method": "k.method",
+    "Ka": "k.Ka",
+    "Ks": "k.Ks",
+    "KaKs": "k.KaKs",
+}
+
+
+def connect(db):
+    con = sqlite3.connect(db)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    con.executescript(SCHEMA)
+    return con
+
+
+def pair_name(a, b):
+    # 与 kaks_make_axt_batch.py 的 axt 文件名一致
+    return f"{a}__{b}".replace("|", "_")
+
+
+def to_float(x):
+    try:
+        v = float(x)
+    except (TypeError, ValueError):
+        return None
+    return v if v == v and v not in (float("inf"), float("-inf")) else None
+
+
+def load_pairs(fp):
+    """pair_name -> (geneA, geneB, type, block_id)"""
+    d = {}
+    if not fp:
+        return d
+    with xopen(fp) as f:
+        header = f.readline().rstrip("\n").split("\t")
+        col = {c: i for i, c in enumerate(header)}
+        ib = col.get("block_id")
+        for line in f:
+            a = line.rstrip("\n").split("\t")
+            if len(a) < 3:
+                continue
+            block = None
+            if ib is not None and ib < len(a) and a[ib] not in ("", "NA"):
+                block = int(a[ib])
+            d[pair_name(a[0], a[1])] = (a[0], a[1], a[2], block)
+    return d
+
+
+def gene_ids(con, names):
+    con.executemany("INSERT OR IGNORE INTO genes(name) VALUES (?)", ((n,) for n in names))
+    return dict(con.execute("SELECT name, gene_id FROM genes"))
+
+
+def ingest(con, raw_files, pairs_fp, default_type):
+    pairs = load_pairs(pairs_fp)
+    rows = []
+    unmatched = 0
+    for fp in raw_files:
+        with xopen(fp) as f:
+            header = f.readline().rstrip("\n").split("\t")
+            col = {c: i for i, c in enumerate(header)}
+            for line in f:
+                a = line.rstrip("\n").split("\t")
+                if len(a) < 4:
+                    continue
+                pair = a[col.get("pair", 0)]
+                if pair not in pairs:
+                    # 清洗过的 pair 名拆不回原始 ID，不在 pairs.tsv 里的只计数、跳过
+                    unmatched += 1
+                    continue
+                ga, gb, ptype, block = pairs[pair]
+                if ptype in ("", "NA"):
+                    ptype = default_type
+                method = a[col["method"]] if "method" in col else "NA"
+                rows.append((ga, gb, ptype, block, method,
+                             to_float(a[col.get("Ka", 1)]),
+                             to_float(a[col.get("Ks", 2)]),
+                             to_float(a[col.get("KaKs", 3)])))
+
+    with con:
+        ids = gene_ids(con, {r[0] for r in rows} | {r[1] for r in rows})
+        con.executemany(
+            "INSERT OR REPLACE INTO kaks(geneA, geneB, pair_type, block_id, method, Ka, Ks, KaKs) "
+            "VALUES (?,?,?,?,?,?,?,?)",
+            ((ids[r[0]], ids[r[1]]) + r[2:] for r in rows),
+        )
+    return len(rows), unmatched
+
+
+def build_query(columns, min_ks=None, max_ks=None, max_w=None, gene=None, pair_type=None, finite=False):
+    bad = [c for c in columns if c not in COLUMNS]
+    if bad:
+        raise SystemExit(f"[ERROR] unknown column(s): {','.join(bad)} (choose from {','.join(COLUMNS)})")
+    sel = ", ".join(f"{COLUMNS[c]} AS \"{c}\"" for c in columns)
+    sql = (f"SELECT {sel} FROM kaks k "
+           "JOIN genes ga ON ga.gene_id = k.geneA "
+           "JOIN genes gb ON gb.gene_id = k.geneB")
+    where, args = [], []
+    if finite:
+        where.append("k.Ka IS NOT NULL AND k.Ks IS NOT NULL AND k.KaKs IS NOT NULL")
+    if min_ks is not None:
+        where.append("k.Ks >= ?")
+        args.append(min_ks)
+    if max_ks is not None:
+        where.append("k.Ks <= ?")
+        args.append(max_ks)
+    if max_w is not None:
+        where.append("k.KaKs <= ?")
+        args.append(max_w)
+    if gene:
+        where.append("(ga.name = ? OR gb.name = ?)")
+        args += [gene, gene]
+    if pair_type:
+        where.append("k.pair_type = ?")
+        args.append(pair_type)
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    return sql + " ORDER BY ga.name, gb.name", args
+
+
+def fmt(v):
+    return "NA" if v is None else str(v)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p1 = sub.add_parser("ingest")
+    p1.add_argument("--db", required=True)
+    p1.add_argument("--kaks_raw", required=True, nargs="+", help="kaks_run_batch.py output(s)")
+    p1.add_argument("--pairs", required=True, help="pairs.tsv: geneA geneB type [block_id]")
+    p1.add_argument("--default_type", default="NA", help="type for pairs with an empty type in --pairs")
+    p1.add_argument("--fresh", action="store_true", help="drop existing rows before ingesting")
+
+    p2 = sub.add_parser("query")
+    p2.add_argument("--db", required=True)
+    p2.add_argument("--columns", default="pair,Ka,Ks,KaKs,type")
+    p2.add_argument("--min_ks", type=float, default=None)
+    p2.add_argument("--max_ks", type=float, default=None)
+    p2.add_argument("--max_w", type=float, default=None)
+    p2.add_argument("--gene", default="")
+    p2.add_argument("--type", dest="pair_type", default="")
+    p2.add_argument("--out", default="-")
+
+    args = ap.parse_args()
+
+    if args.cmd == "ingest":
+        if args.fresh and os.path.exists(args.db):
+            os.remove(args.db)
+        con = connect(args.db)
+        n, unmatched = ingest(con, args.kaks_raw, args.pairs, args.default_type)
+        total = con.execute("SELECT COUNT(*) FROM kaks").fetchone()[0]
+        con.close()
+        if unmatched:
+            print(f"[WARN] {unmatched} rows skipped: pair not in {args.pairs}", file=sys.stderr)
+        print(f"[INFO] ingested {n} rows, store now holds {total}", file=sys.stderr)
+    elif args.cmd == "query":
+        if not os.path.exists(args.db):
+            raise SystemExit(f"[ERROR] store not found: {args.db}")
+        con = connect(args.db)
+        columns = [c.strip() for c in args.columns.split(",") if c.strip()]
+        sql, qargs = build_query(columns, args.min_ks, args.max_ks, args.max_w, args.gene, args.pair_type)
+        w = sys.stdout if args.out == "-" else open(args.out, "w")
+        w.write("\t".join(columns) + "\n")
+        for row in con.execute(sql, qargs):
+            w.write("\t".join(fmt(v) for v in row) + "\n")
+        if w is not sys.stdout:
+            w.close()
+        con.close()
+
+
+if __name__ == "__main__":
+    profiling.run(main)
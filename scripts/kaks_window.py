@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Sliding-window Ka / Ks along the codon alignments of kaks_make_axt_batch.py.
+
+Per codon column the Nei-Gojobori (1986) quantities are looked up from 64 x 64
+tables: synonymous / nonsynonymous sites (mean of the two codons) and
+synonymous / nonsynonymous differences (averaged over the mutational pathways
+that avoid stop codons). Columns with a gap, an ambiguous base or a stop codon
+contribute nothing. Cumulative sums of the four arrays give every window sum
+with two lookups, so a pair costs O(alignment length) whatever --width/--step.
+pS and pN are Jukes-Cantor corrected (Ks/Ka = NA when p >= 0.75).
+
+Windows and coordinates are in codons = protein positions: aln_start/aln_end are
+alignment columns, startA..endA / startB..endB the residues of each protein the
+window covers (1-based, NA when the window is all gap in that sequence).
+--domains (domain.tsv: seq_id domain start end) adds the domains of either
+protein that overlap the window.
+"""
+import argparse
+import glob
+import math
+import os
+import sys
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import permutations
+
+import numpy as np
+
+from compress_io import xopen
+from kaks_make_axt_batch import CODON_TABLE
+import profiling
+
+BASES = "TCAG"
+NT = np.full(256, 4, dtype=np.uint8)
+for _i, _c in enumerate(BASES):
+    NT[ord(_c)] = _i
+    NT[ord(_c.lower())] = _i
+BAD = 64
+
+CODONS = [a + b + c for a in BASES for b in BASES for c in BASES]
+AMINO = [CODON_TABLE[c] for c in CODONS]
+STOP = np.array([a == "*" for a in AMINO] + [True])     # BAD 也当作不可用
+
+
+def _sites():
+    s = np.zeros(65)
+    for i, c in enumerate(CODONS):
+        if AMINO[i] == "*":
+            continue
+        for p in range(3):
+            for b in BASES:
+                if b != c[p] and CODON_TABLE[c[:p] + b + c[p + 1:]] == AMINO[i]:
+                    s[i] += 1.0 / 3
+    n = np.where(STOP, 0.0, 3.0 - s)
+    return s, n
+
+
+def _differences():
+    sd = np.zeros((65, 65))
+    nd = np.zeros((65, 65))
+    ok = np.zeros((65, 65), dtype=bool)
+    for i, a in enumerate(CODONS):
+        for j, b in enumerate(CODONS):
+            if STOP[i] or STOP[j]:
+                continue
+            diff = [p for p in range(3) if a[p] != b[p]]
+            n_syn = n_non = 0.0
+            n_path = 0
+            for order in permutations(diff):
+                cur, s_, n_, valid = a, 0, 0, True
+                for p in order:
+                    nxt = cur[:p] + b[p] + cur[p + 1:]
+                    if CODON_TABLE[nxt] == "*":
+                        valid = False
+                        break
+                    if CODON_TABLE[nxt] == CODON_TABLE[cur]:
+                        s_ += 1
+                    else:
+                        n_ += 1
+                    cur = nxt
+                if valid:
+                    n_syn += s_
+                    n_non += n_
+                    n_path += 1
+            if n_path:
+                sd[i, j], nd[i, j], ok[i, j] = n_syn / n_path, n_non / n_path, True
+    return sd, nd, ok
+
+
+SYN_SITES, NON_SITES = _sites()
+SYN_DIFF, NON_DIFF, PAIR_OK = _differences()
+
+
+def codon_columns(seq):
+    """(codon index per column, column holds a residue i.e. is not '---')"""
+    raw = np.frombuffer(seq[: len(seq) // 3 * 3].encode("ascii", "replace"), dtype=np.uint8).reshape(-1, 3)
+    nt = NT[raw]
+    idx = nt[:, 0].astype(np.int64) * 16 + nt[:, 1] * 4 + nt[:, 2]
+    idx[(nt == 4).any(axis=1)] = BAD
+    return idx, ~(raw == ord("-")).all(axis=1)
+
+
+def jc(p):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(p < 0.75, -0.75 * np.log(1.0 - 4.0 * p / 3.0), np.nan)
+
+
+def window_starts(n, width, step):
+    if n <= width:
+        return np.array([0])
+    st = np.arange(0, n - width + 1, step)
+    if st[-1] + width < n:
+        st = np.append(st, n - width)   # 末尾不足一个 step 的部分也覆盖到
+    return st
+
+
+def pair_windows(seqA, seqB, width, step):
+    """per-window arrays for one aligned pair."""
+    a, resA = codon_columns(seqA)
+    b, resB = codon_columns(seqB)
+    ok = PAIR_OK[a, b]
+    S = np.where(ok, (SYN_SITES[a] + SYN_SITES[b]) / 2, 0.0)
+    N = np.where(ok, (NON_SITES[a] + NON_SITES[b]) / 2, 0.0)
+    Sd = np.where(ok, SYN_DIFF[a, b], 0.0)
+    Nd = np.where(ok, NON_DIFF[a, b], 0.0)
+
+    def cs(x):
+        return np.concatenate(([0], np.cumsum(x)))
+
+    cS, cN, cSd, cNd, cA, cB = cs(S), cs(N), cs(Sd), cs(Nd), cs(resA), cs(resB)
+    st = window_starts(a.size, width, step)
+    en = np.minimum(st + width, a.size)
+    wS, wN = cS[en] - cS[st], cN[en] - cN[st]
+    wSd, wNd = cSd[en] - cSd[st], cNd[en] - cNd[st]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pS = np.where(wS > 0, wSd / wS, np.nan)
+        pN = np.where(wN > 0, wNd / wN, np.nan)
+    Ks, Ka = jc(pS), jc(pN)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        w = np.where(Ks > 0, Ka / Ks, np.nan)
+    # 蛋白坐标：窗口前已有的残基数 + 1 .. 窗口末尾的累计残基数
+    pa0, pa1 = cA[st] + 1, cA[en]
+    pb0, pb1 = cB[st] + 1, cB[en]
+    return st + 1, en, pa0, pa1, pb0, pb1, wS, wN, wSd, wNd, Ks, Ka, w
+
+
+def read_axt(fp):
+    with xopen(fp) as f:
+        lines = [x.strip() for x in f if x.strip()]
+    if len(lines) < 3:
+        raise ValueError(f"not a 2-sequence AXT: {fp}")
+    return lines[1].upper(), lines[2].upper()
+
+
+def list_pairs(axt_dir):
+    ok = os.path.join(axt_dir, "ok.tsv")
+    pairs = []
+    if os.path.exists(ok):
+        with open(ok) as f:
+            next(f)
+            for line in f:
+                a = line.rstrip("\n").split("\t")
+                if len(a) >= 3:
+                    fp = a[2] if os.path.isabs(a[2]) or os.path.exists(a[2]) else os.path.join(axt_dir, os.path.basename(a[2]))
+                    pairs.append((a[0], a[1], fp))
+        return pairs
+    for fp in sorted(glob.glob(os.path.join(axt_dir, "*.axt"))):
+        with open(fp) as f:
+            name = f.readline().strip().lstrip(">")
+        ga, _, gb = name.partition("-")
+        pairs.append((ga, gb, fp))
+    return pairs
+
+
+def read_domains(fp):
+    dom = defaultdict(list)
+    with xopen(fp) as f:
+        for line in f:
+            a = line.rstrip("\n").split("\t")
+            if len(a) < 4 or not a[2].isdigit():
+                continue
+            dom[a[0]].append((int(a[2]), int(a[3]), a[1]))
+    return dom
+
+
+def overlapping(dom, gid, s, e):
+    if s > e:
+        return []
+    return [name for ds, de, name in dom.get(gid, ()) if ds <= e and de >= s]
+
+
+def fmt(v, nd=4):
+    return "NA" if not math.isfinite(v) else f"{v + 0.0:.{nd}f}"   # + 0.0: 不输出 -0.0000
+
+
+def run_pair(job):
+    ga, gb, fp, width, step = job
+    try:
+        sa, sb = read_axt(fp)
+        if len(sa) != len(sb):
+            raise ValueError("aligned sequences differ in length")
+        return ga, gb, pair_windows(sa, sb, width, step), ""
+    except (OSError, ValueError) as e:
+        return ga, gb, None, str(e)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--axt_dir", required=True, help="kaks_make_axt_batch.py --outdir (ok.tsv + *.axt)")
+    ap.add_argument("--width", type=int, default=30, help="window width in codons")
+    ap.add_argument("--step", type=int, default=5, help="window step in codons")
+    ap.add_argument("--domains", default="", help="domain.tsv (seq_id domain start end), protein coordinates")
+    ap.add_argument("--out", required=True)
+    ap.add_argument("--threads", type=int, default=1)
+    args = ap.parse_args()
+    if args.width < 1 or args.step < 1:
+        raise SystemExit("[ERROR] --width and --step must be >= 1")
+
+    pairs = list_pairs(args.axt_dir)
+    dom = read_domains(args.domains) if args.domains and os.path.exists(args.domains) else {}
+    jobs = [(ga, gb, fp, args.width, args.step) for ga, gb, fp in pairs]
+    if args.threads > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=args.threads) as ex:
+            results = list(ex.map(run_pair, jobs, chunksize=max(1, len(jobs) // (args.threads * 4))))
+    else:
+        results = list(map(run_pair, jobs))
+
+    n_win = n_bad = 0
+    with open(args.out, "w") as w:
+        w.write("geneA\tgeneB\twindow\taln_start\taln_end\tstartA\tendA\tstartB\tendB\t"
+                "S\tN\tSd\tNd\tKa\tKs\tKa_Ks\tdomains\n")
+        for ga, gb, res, err in results:
+            if res is None:
+                n_bad += 1
+                print(f"[WARN] {ga}-{gb}: {err}", file=sys.stderr)
+                continue
+            st, en, pa0, pa1, pb0, pb1, S, N, Sd, Nd, Ks, Ka, om = res
+            for k in range(st.size):
+                ra = (int(pa0[k]), int(pa1[k]))
+                rb = (int(pb0[k]), int(pb1[k]))
+                doms = overlapping(dom, ga, *ra) + overlapping(dom, gb, *rb) if dom else []
+                ca = (str(ra[0]), str(ra[1])) if ra[0] <= ra[1] else ("NA", "NA")
+                cb = (str(rb[0]), str(rb[1])) if rb[0] <= rb[1] else ("NA", "NA")
+                w.write(f"{ga}\t{gb}\t{k + 1}\t{st[k]}\t{en[k]}\t{ca[0]}\t{ca[1]}\t{cb[0]}\t{cb[1]}\t"
+                        f"{S[k]:.2f}\t{N[k]:.2f}\t{Sd[k]:.2f}\t{Nd[k]:.2f}\t"
+                        f"{fmt(Ka[k])}\t{fmt(Ks[k])}\t{fmt(om[k])}\t{','.join(sorted(set(doms))) or 'NA'}\n")
+                n_win += 1
+
+    print(f"[INFO] {len(pairs) - n_bad} pairs, {n_win} windows (width={args.width}, step={args.step})"
+          + (f"; {n_bad} unreadable" if n_bad else ""), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    profiling.run(main)
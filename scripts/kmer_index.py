@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Spaced-seed k-mer inverted index over a proteome, for instant candidate screening.
+
+Peptides are recoded into the Murphy 10-letter alphabet (as DIAMOND does) and
+cut into spaced seeds (default shapes 1110101 and 11011001, weight 5). For every
+seed the index keeps the sorted list of proteins containing it:
+
+  <index_root>/<sha1(pep)[:16]>.<shapes>/
+      meta.json               shapes, sequence count, total length, source file
+      ids.txt                 protein ids, one per line (index = row)
+      lengths.npy             uint32 protein lengths
+      shape<i>.offsets.npy    int64[nkeys + 1] postings start per seed
+      shape<i>.postings.npy   uint32 protein indices
+
+All arrays are opened with np.load(mmap_mode="r"): a query only touches the
+postings of its own seeds, so screening a model FASTA takes well under a second
+once the index exists. The directory name is the hash of the proteome, so the
+index is built once per genome and shared through cache_dir.
+
+Subcommands:
+  build   --pep target.pep.longest.fa --index_root DIR   (prints the index dir)
+  query   --pep ... --index_root DIR --model model.pep.fa --out ranked.tsv
+
+Library use:
+  from kmer_index import KmerIndex
+  idx = KmerIndex.open_or_build(pep, root); idx.screen(model_records)
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+from batch_journal import file_hash
+from compress_io import xopen
+import profiling
+
+VERSION = 1
+DEFAULT_SHAPES = ("1110101", "11011001")
+
+# Murphy et al. 2000, 10 groups
+MURPHY10 = ("LVIM", "C", "A", "G", "ST", "P", "FYW", "EDNQ", "KR", "H")
+NLETTER = len(MURPHY10)
+INVALID = 255
+RECODE = np.full(256, INVALID, dtype=np.uint8)
+for _i, _grp in enumerate(MURPHY10):
+    for _c in _grp:
+        RECODE[ord(_c)] = _i
+        RECODE[ord(_c.lower())] = _i
+
+
+def read_fasta(fp):
+    """[(id, seq)] in file order."""
+    recs = []
+    name, buf = None, []
+    with xopen(fp) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith(">"):
+                if name is not None:
+                    recs.append((name, "".join(buf)))
+                name, buf = line[1:].split()[0], []
+            else:
+                buf.append(line)
+    if name is not None:
+        recs.append((name, "".join(buf)))
+    return recs
+
+
+def encode(seqs):
+    """concatenated recoded residues (INVALID between proteins) + protein index per position."""
+    lens = np.array([len(s) for s in seqs], dtype=np.int64)
+    raw = np.frombuffer("\x00".join(seqs).encode("ascii", "replace") + b"\x00", dtype=np.uint8)
+    codes = RECODE[raw]
+    owner = np.repeat(np.arange(len(seqs), dtype=np.int64), lens + 1)
+    return codes, owner, lens
+
+
+def seed_keys(codes, owner, shape):
+    """(key, protein) for every valid seed position of one shape."""
+    offs = [i for i, c in enumerate(shape) if c == "1"]
+    span = len(shape)
+    n = codes.size - span + 1
+    if n <= 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    key = np.zeros(n, dtype=np.int64)
+    ok = owner[:n] == owner[span - 1:span - 1 + n]   # seed must not straddle two proteins
+    for o in offs:
+        c = codes[o:o + n]
+        ok &= c != INVALID
+        key = key * NLETTER + c
+    return key[ok], owner[:n][ok]
+
+
+def _save(d, name, arr):
+    np.save(os.path.join(d, name), np.ascontiguousarray(arr))
+
+
+class KmerIndex:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.shapes = self.meta["shapes"]
+        with open(os.path.join(path, "ids.txt")) as f:
+            self.ids = [x.rstrip("\n") for x in f]
+        self.lengths = np.load(os.path.join(path, "lengths.npy"), mmap_mode="r")
+        self.tables = [
+            (np.load(os.path.join(path, f"shape{i}.offsets.npy"), mmap_mode="r"),
+             np.load(os.path.join(path, f"shape{i}.postings.npy"), mmap_mode="r"))
+            for i in range(len(self.shapes))
+        ]
+
+    @property
+    def n_seqs(self):
+        return len(self.ids)
+
+    @staticmethod
+    def build(pep, path, shapes=DEFAULT_SHAPES, source_hash=""):
+        recs = read_fasta(pep)
+        if not recs:
+            raise SystemExit(f"[ERROR] no sequences in {pep}")
+        ids = [r[0] for r in recs]
+        codes, owner, lens = encode([r[1] for r in recs])
+        nseq = len(recs)
+
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=parent, prefix=os.path.basename(path) + ".", suffix=".tmp")
+        try:
+            for i, shape in enumerate(shapes):
+                nkeys = NLETTER ** shape.count("1")
+                key, seq = seed_keys(codes, owner, shape)
+                # 每个 seed 在同一蛋白里只记一次
+                pair = np.sort(key * nseq + seq)
+                pair = pair[np.concatenate(([True], pair[1:] != pair[:-1]))]
+                key_u = pair // nseq
+                offsets = np.zeros(nkeys + 1, dtype=np.int64)
+                np.cumsum(np.bincount(key_u, minlength=nkeys), out=offsets[1:])
+                _save(tmp, f"shape{i}.offsets.npy", offsets)
+                _save(tmp, f"shape{i}.postings.npy", (pair % nseq).astype(np.uint32))
+            _save(tmp, "lengths.npy", lens.astype(np.uint32))
+            with open(os.path.join(tmp, "ids.txt"), "w") as w:
+                w.write("\n".join(ids) + "\n")
+            meta = {
+                "version": VERSION,
+                "shapes": list(shapes),
+                "alphabet": list(MURPHY10),
+                "n_seqs": nseq,
+                "total_length": int(lens.sum()),
+                "source": os.path.abspath(pep),
+                "source_hash": source_hash,
+            }
+            with open(os.path.join(tmp, "meta.json"), "w") as w:
+                json.dump(meta, w, indent=1)
+            if os.path.isdir(path):        # 并发构建：后到的直接用先建好的
+                shutil.rmtree(tmp)
+            else:
+                os.replace(tmp, path)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        return KmerIndex(path)
+
+    @staticmethod
+    def open_or_build(pep, root, shapes=DEFAULT_SHAPES):
+        h = file_hash(pep)
+        path = os.path.join(root, f"{h[:16]}.{'_'.join(shapes)}")
+        if os.path.exists(os.path.join(path, "meta.json")):
+            return KmerIndex(path)
+        print(f"[INFO] building k-mer index for {pep} -> {path}", file=sys.stderr)
+        return KmerIndex.build(pep, path, shapes, source_hash=h)
+
+    def shared_seeds(self, seq, max_occ):
+        """(int32[n_seqs] distinct query seeds each protein shares with `seq`, query seeds used)"""
+        codes, owner, _ = encode([seq])
+        counts = np.zeros(self.n_seqs, dtype=np.int32)
+        n_query = 0
+        for shape, (offsets, postings) in zip(self.shapes, self.tables):
+            keys = np.unique(seed_keys(codes, owner, shape)[0])
+            starts = offsets[keys]
+            ends = offsets[keys + 1]
+            # 低复杂度/高频 seed 不提供区分度，跳过
+            keep = (ends - starts) <= max_occ
+            n_query += int(keep.sum())
+            hits = [postings[s:e] for s, e in zip(starts[keep], ends[keep])]
+            if hits:
+                counts += np.bincount(np.concatenate(hits), minlength=self.n_seqs).astype(np.int32)
+        return counts, n_query
+
+    def screen(self, queries, min_shared=4, top=500, max_occ_frac=0.01):
+        """
+        Ranked candidates for a set of model proteins:
+        [(target, shared, frac, best_query)] sorted by shared seeds, best query per target.
+        """
+        max_occ = max(100, int(self.n_seqs * max_occ_frac))
+        best = np.zeros(self.n_seqs, dtype=np.int32)
+        frac = np.zeros(self.n_seqs, dtype=np.float64)
+        best_q = np.full(self.n_seqs, -1, dtype=np.int64)
+        for qi, (_qid, seq) in enumerate(queries):
+            counts, n_query = self.shared_seeds(seq, max_occ)
+            better = counts > best
+            best[better] = counts[better]
+            frac[better] = counts[better] / max(1, n_query)
+            best_q[better] = qi
+        order = np.flatnonzero(best >= min_shared)
+        order = order[np.lexsort((-frac[order], -best[order]))]
+        if top and top > 0:
+            order = order[:top]
+        return [(self.ids[i], int(best[i]), float(frac[i]), queries[best_q[i]][0]) for i in order]
+
+
+def write_ranked(rows, out):
+    with open(out, "w") as w:
+        w.write("target\tshared_seeds\tquery_frac\tbest_query\n")
+        for t, n, fr, q in rows:
+            w.write(f"{t}\t{n}\t{fr:.4f}\t{q}\n")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    def common(p):
+        p.add_argument("--pep", required=True, help="proteome FASTA (target.pep.longest.fa)")
+        p.add_argument("--index_root", required=True, help="index cache dir (one subdir per proteome)")
+        p.add_argument("--shapes", nargs="+", default=list(DEFAULT_SHAPES), help="spaced-seed shapes (1=match)")
+
+    p1 = sub.add_parser("build")
+    common(p1)
+
+    p2 = sub.add_parser("query")
+    common(p2)
+    p2.add_argument("--model", required=True)
+    p2.add_argument("--out", required=True)
+    p2.add_argument("--min_shared", type=int, default=4)
+    p2.add_argument("--top", type=int, default=500)
+
+    args = ap.parse_args()
+    idx = KmerIndex.open_or_build(args.pep, args.index_root, tuple(args.shapes))
+    if args.cmd == "build":
+        print(idx.path)
+    else:
+        rows = idx.screen(read_fasta(args.model), args.min_shared, args.top)
+        write_ranked(rows, args.out)
+        print(f"[INFO] {len(rows)} candidates", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    profiling.run(main)
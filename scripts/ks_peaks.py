@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Ks peaks of the syntenic (anchor) background and assignment of family pairs to them.
+
+Everything runs on ln(Ks):
+
+  GMM   1..--max_k Gaussian components fitted by EM on finely binned ln(Ks)
+        (several starts per k), best k by BIC; component means back-transformed
+        = peaks
+  KDE   Gaussian kernel density on a fixed grid (linear binning + FFT
+        convolution, bandwidth by Silverman's rule unless --bw, with the sd
+        alone when ties make the IQR 0); peaks are local maxima above
+        --min_height of the highest one. Bootstrap replicates are
+        multinomial resamples of the binned counts, so all --n_boot densities
+        are one (n_boot x grid) FFT; each observed peak gets the percentile
+        interval of the nearest replicate peak within half a bandwidth.
+
+Each family pair (kaks.filtered.tsv) gets the GMM component with the highest
+posterior, that posterior, and the nearest KDE peak.
+
+Outputs (--outdir):
+  gmm_selection.tsv   k loglik BIC
+  peaks.tsv           method peak Ks ci_low ci_high weight sd_log support
+  family_assign.tsv   input columns + gmm_peak posterior kde_peak
+"""
+import argparse
+import math
+import os
+import sys
+
+import numpy as np
+
+from compress_io import xopen
+import profiling
+
+LOG2PI = math.log(2 * math.pi)
+
+
+def read_ks(fp, min_ks, max_ks):
+    """(header, rows, Ks array) from a kaks_filter.py table (needs a Ks column)."""
+    with xopen(fp) as f:
+        header = f.readline().rstrip("\n").split("\t")
+        if "Ks" not in header:
+            raise SystemExit(f"[ERROR] {fp}: no Ks column")
+        i = header.index("Ks")
+        rows = [line.rstrip("\n").split("\t") for line in f if line.strip()]
+    ks = np.array([float(r[i]) if len(r) > i and r[i] not in ("", "NA") else np.nan for r in rows])
+    ok = np.isfinite(ks) & (ks >= min_ks) & (ks <= max_ks) & (ks > 0)
+    return header, rows, ks, ok
+
+
+# ---------------- GMM ----------------
+
+def log_gauss(x, mu, var):
+    """n x k log densities."""
+    return -0.5 * (LOG2PI + np.log(var) + (x[:, None] - mu) ** 2 / var)
+
+
+def em(x, c, mu, var, w, max_iter=500, tol=1e-7, var_floor=1e-4):
+    """EM on points x with counts c (binned data: cost depends on the bin count, not on n)."""
+    n = c.sum()
+    ll_old = -np.inf
+    for _ in range(max_iter):
+        lp = log_gauss(x, mu, var) + np.log(w)
+        m = lp.max(axis=1, keepdims=True)
+        lse = m[:, 0] + np.log(np.exp(lp - m).sum(axis=1))
+        ll = float(c @ lse)
+        r = np.exp(lp - lse[:, None]) * c[:, None]
+        nk = r.sum(axis=0) + 1e-12
+        w = nk / n
+        mu = (r * x[:, None]).sum(axis=0) / nk
+        var = np.maximum((r * (x[:, None] - mu) ** 2).sum(axis=0) / nk, var_floor)
+        if ll - ll_old < tol * abs(ll):
+            break
+        ll_old = ll
+    return mu, var, w, ll
+
+
+def fit_gmm(x, k, n_init, rng, n_bins=4096):
+    # 在细分箱（ln Ks 上约 0.002 宽）上做加权 EM，结果与逐点 EM 基本一致但快两个数量级
+    counts, edges = np.histogram(x, bins=n_bins)
+    keep = counts > 0
+    xc = ((edges[:-1] + edges[1:]) / 2)[keep]
+    cc = counts[keep].astype(np.float64)
+    best = None
+    qs = np.quantile(x, (np.arange(k) + 0.5) / k)
+    for t in range(n_init):
+        # 第一次按分位数起始，其余随机抽样起始
+        mu = qs if t == 0 else np.sort(rng.choice(x, k, replace=False))
+        var = np.full(k, x.var() / k + 1e-3)
+        res = em(xc, cc, mu.astype(float), var, np.full(k, 1.0 / k))
+        if best is None or res[3] > best[3]:
+            best = res
+    mu, var, w, ll = best
+    order = np.argsort(mu)
+    bic = -2 * ll + (3 * k - 1) * math.log(x.size)
+    return mu[order], var[order], w[order], ll, bic
+
+
+def posterior(x, mu, var, w):
+    lp = log_gauss(x, mu, var) + np.log(w)
+    lp -= lp.max(axis=1, keepdims=True)
+    p = np.exp(lp)
+    return p / p.sum(axis=1, keepdims=True)
+
+
+# ---------------- KDE ----------------
+
+def bin_counts(x, lo, hi, n):
+    """linear binning onto n grid points."""
+    d = (hi - lo) / (n - 1)
+    pos = (x - lo) / d
+    i = np.clip(np.floor(pos).astype(np.int64), 0, n - 2)
+    f = pos - i
+    return np.bincount(i, 1 - f, minlength=n) + np.bincount(i + 1, f, minlength=n)
+
+
+def kde_fft(counts, d, bw):
+    """Gaussian smoothing of binned counts (rows = replicates) by FFT; densities per unit x."""
+    counts = np.atleast_2d(counts)
+    n = counts.shape[1]
+    L = min(n - 1, int(math.ceil(4 * bw / d)))
+    kx = np.arange(-L, L + 1) * d
+    kern = np.exp(-0.5 * (kx / bw) ** 2) / (bw * math.sqrt(2 * math.pi))
+    size = 1 << int(math.ceil(math.log2(n + 2 * L + 1)))
+    fk = np.fft.rfft(kern, size)
+    conv = np.fft.irfft(np.fft.rfft(counts, size, axis=1) * fk, size, axis=1)[:, L:L + n]
+    return conv / counts.sum(axis=1, keepdims=True)
+
+
+def local_maxima(dens, min_height):
+    """bool mask (same shape) of interior local maxima above min_height x row max."""
+    dens = np.atleast_2d(dens)
+    mx = np.zeros_like(dens, dtype=bool)
+    mx[:, 1:-1] = (dens[:, 1:-1] > dens[:, :-2]) & (dens[:, 1:-1] >= dens[:, 2:])
+    return mx & (dens >= min_height * dens.max(axis=1, keepdims=True))
+
+
+def silverman_bw(x):
+    """1.06 min(sd, IQR / 1.34) n^-1/5; falls back to sd when ties make the IQR 0."""
+    sd = x.std()
+    iqr = (np.quantile(x, 0.75) - np.quantile(x, 0.25)) / 1.34
+    return 1.06 * (min(sd, iqr) if iqr > 0 else sd) * x.size ** -0.2
+
+
+def kde_peaks(x, bw, grid, n_boot, min_height, rng, ci=0.95):
+    lo, hi = x.min() - 3 * bw, x.max() + 3 * bw
+    d = (hi - lo) / (grid - 1)
+    g = lo + d * np.arange(grid)
+    counts = bin_counts(x, lo, hi, grid)
+    dens = kde_fft(counts, d, bw)[0]
+    peaks = np.flatnonzero(local_maxima(dens, min_height)[0])
+    out = []
+    if n_boot > 0 and peaks.size:
+        boot = rng.multinomial(x.size, counts / counts.sum(), size=n_boot).astype(np.float64)
+        bmask = local_maxima(kde_fft(boot, d, bw), min_height)
+        rep, col = np.nonzero(bmask)
+        for p in peaks:
+            # 每个 bootstrap 重复里取离该峰最近、且在半个带宽内的峰
+            dist = np.abs(col - p)
+            near = dist <= max(1, int(0.5 * bw / d))
+            r_, c_, dd = rep[near], col[near], dist[near]
+            o = np.lexsort((dd, r_))
+            first = np.concatenate(([True], r_[o][1:] != r_[o][:-1])) if o.size else o.astype(bool)
+            sel = np.full(n_boot, -1)
+            sel[r_[o][first]] = c_[o][first]
+            found = sel >= 0
+            a = (1 - ci) / 2
+            if found.any():
+                lo_, hi_ = np.quantile(g[sel[found]], [a, 1 - a])
+            else:
+                lo_ = hi_ = np.nan
+            out.append((g[p], lo_, hi_, dens[p], found.mean()))
+    else:
+        out = [(g[p], np.nan, np.nan, dens[p], np.nan) for p in peaks]
+    return out
+
+
+def fmt(v, nd=4):
+    return "NA" if v is None or not math.isfinite(v) else f"{v:.{nd}g}"
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--background", required=True, help="syntenic Ks table (kaks_filter.py output, Ks column)")
+    ap.add_argument("--family", default="", help="family kaks.filtered.tsv to assign to peaks")
+    ap.add_argument("--min_ks", type=float, default=0.005)
+    ap.add_argument("--max_ks", type=float, default=5.0)
+    ap.add_argument("--max_k", type=int, default=5, help="largest number of GMM components tried")
+    ap.add_argument("--n_init", type=int, default=5, help="EM starts per k")
+    ap.add_argument("--bw", type=float, default=0.0, help="KDE bandwidth on ln(Ks); 0 = Silverman")
+    ap.add_argument("--grid", type=int, default=1024)
+    ap.add_argument("--n_boot", type=int, default=1000)
+    ap.add_argument("--min_height", type=float, default=0.1, help="KDE peaks below this fraction of the top are dropped")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--outdir", required=True)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    _h, _r, ks, ok = read_ks(args.background, args.min_ks, args.max_ks)
+    x = np.log(ks[ok])
+    os.makedirs(args.outdir, exist_ok=True)
+    fits = {}
+    with open(os.path.join(args.outdir, "gmm_selection.tsv"), "w") as w:
+        w.write("k\tloglik\tBIC\n")
+        for k in range(1, min(args.max_k, x.size // 5) + 1):
+            fits[k] = fit_gmm(x, k, args.n_init, rng)
+            w.write(f"{k}\t{fits[k][3]:.2f}\t{fits[k][4]:.2f}\n")
+
+    if x.size < 10:
+        # 背景太少（小基因组/共线性关闭）：输出空表，下游照常运行
+        print(f"[WARN] only {x.size} background Ks values in [{args.min_ks}, {args.max_ks}]; no peaks called",
+              file=sys.stderr)
+        best_k, mu, var, wt, kpeaks = 0, np.zeros(0), np.zeros(0), np.zeros(0), []
+    else:
+        best_k = min(fits, key=lambda k: fits[k][4])
+        mu, var, wt, _ll, _bic = fits[best_k]
+        bw = args.bw or silverman_bw(x)
+        if not bw > 0:
+            raise SystemExit(f"[ERROR] KDE bandwidth is {bw:g}: all {x.size} background Ks values are equal "
+                             f"or --bw is not positive; set --bw > 0")
+        kpeaks = kde_peaks(x, bw, args.grid, args.n_boot, args.min_height, rng)
+
+    with open(os.path.join(args.outdir, "peaks.tsv"), "w") as w:
+        w.write("method\tpeak\tKs\tci_low\tci_high\tweight\tsd_log\tsupport\n")
+        for i in range(best_k):
+            sd = math.sqrt(var[i])
+            # GMM 的区间取成分在 ln(Ks) 上的 +-1.96 sd
+            w.write(f"gmm\t{i + 1}\t{fmt(math.exp(mu[i]))}\t{fmt(math.exp(mu[i] - 1.96 * sd))}\t"
+                    f"{fmt(math.exp(mu[i] + 1.96 * sd))}\t{wt[i]:.4f}\t{sd:.4f}\tNA\n")
+        for i, (gx, lo, hi, dens, sup) in enumerate(kpeaks):
+            w.write(f"kde\t{i + 1}\t{fmt(math.exp(gx))}\t{fmt(math.exp(lo) if math.isfinite(lo) else lo)}\t"
+                    f"{fmt(math.exp(hi) if math.isfinite(hi) else hi)}\t{dens:.4f}\tNA\t{fmt(sup, 3)}\n")
+
+    if args.family:
+        header, rows, fks, fok = read_ks(args.family, args.min_ks, args.max_ks)
+        post = np.full((len(rows), best_k), np.nan)
+        if fok.any() and best_k:
+            post[fok] = posterior(np.log(fks[fok]), mu, var, wt)
+        kx = np.array([p[0] for p in kpeaks])
+        with open(os.path.join(args.outdir, "family_assign.tsv"), "w") as w:
+            w.write("\t".join(header + ["gmm_peak", "posterior", "kde_peak"]) + "\n")
+            for i, r in enumerate(rows):
+                if fok[i] and best_k:
+                    j = int(np.argmax(post[i]))
+                    kd = int(np.argmin(np.abs(kx - math.log(fks[i])))) + 1 if kx.size else "NA"
+                    extra = [str(j + 1), f"{post[i, j]:.4f}", str(kd)]
+                else:
+                    extra = ["NA", "NA", "NA"]
+                w.write("\t".join(r + extra) + "\n")
+        print(f"[INFO] family pairs assigned: {int(fok.sum()) if best_k else 0}/{len(rows)}", file=sys.stderr)
+
+    print(f"[INFO] {x.size} background Ks; GMM k={best_k} (BIC) peaks at Ks "
+          + ", ".join(f"{math.exp(m):.3g}" for m in mu)
+          + "; KDE peaks at " + ", ".join(f"{math.exp(p[0]):.3g}" for p in kpeaks), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    profiling.run(main)
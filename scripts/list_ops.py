@@ -1,10 +1,18 @@
 #!/usr/bin/env python3
 import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
 from Bio import SeqIO
+from compress_io import xopen
+from kmer_index import KmerIndex, read_fasta, write_ranked
+import profiling
 
 def read_list(p):
     s=set()
-    with open(p) as f:
+    with xopen(p) as f:
         for line in f:
             line=line.strip()
             if not line or line.startswith("#"):
@@ -19,7 +27,7 @@ def write_list(s, out):
 
 def blast_candidates(blast_tsv, out):
     s=set()
-    with open(blast_tsv) as f:
+    with xopen(blast_tsv) as f:
         for line in f:
             a=line.rstrip("\n").split("\t")
             if len(a) < 12:
@@ -27,37 +35,131 @@ def blast_candidates(blast_tsv, out):
             s.add(a[1])  # sseqid
     write_list(s, out)
 
-def final_members(blast, pfam, hmm, strategy, out_list, out_venn_tsv):
-    A=read_list(blast)
-    B=read_list(pfam)
-    C=read_list(hmm)
+def select_members(A, B, C, strategy, M=None):
+    base, _, extra = strategy.partition("+")
+    if extra not in ("", "motif") or (extra and M is None):
+        raise SystemExit(f"Unknown strategy: {strategy}" + (" (needs --motif)" if extra == "motif" else ""))
 
-    if strategy == "intersection":
+    if base == "intersection":
         final = A & B & C
-    elif strategy == "union":
+    elif base == "union":
         final = A | B | C
-    elif strategy == "blast_and_domain":
+    elif base == "blast_and_domain":
         final = A & (B | C)
     else:
         raise SystemExit(f"Unknown strategy: {strategy}")
+    if extra == "motif":
+        final |= M
+    return final
+
+def final_members(blast, pfam, hmm, strategy, out_list, out_venn_tsv, motif=""):
+    A=read_list(blast)
+    B=read_list(pfam)
+    C=read_list(hmm)
+    # motif 证据（motif_scan.py 的携带者列表）：venn 多一列；strategy 加 "+motif" 时并入最终成员
+    M=read_list(motif) if motif else None
+    final = select_members(A, B, C, strategy, M)
 
-    all_ids = sorted(A | B | C)
+    all_ids = sorted(A | B | C | (M or set()))
     with open(out_venn_tsv,"w") as f:
-        f.write("gene\tBLAST\tPFAM\tHMM\n")
+        f.write("gene\tBLAST\tPFAM\tHMM" + ("\tMOTIF" if M is not None else "") + "\n")
         for g in all_ids:
-            f.write(f"{g}\t{int(g in A)}\t{int(g in B)}\t{int(g in C)}\n")
+            f.write(f"{g}\t{int(g in A)}\t{int(g in B)}\t{int(g in C)}"
+                    + (f"\t{int(g in M)}" if M is not None else "") + "\n")
 
     write_list(final, out_list)
 
-def extract_fasta(fasta, ids, out):
+def extract_fasta(fasta, ids, out, dict_fp=""):
     ids_set = read_list(ids)
-    recs=[]
-    for r in SeqIO.parse(fasta, "fasta"):
-        rid = r.id.split()[0]
-        if rid in ids_set or (rid.rsplit(".",1)[0] in ids_set):
-            recs.append(r)
+    if dict_fp:
+        recs = extract_by_dict(fasta, ids_set, dict_fp, ids)
+    else:
+        recs=[]
+        for r in SeqIO.parse(xopen(fasta), "fasta"):
+            rid = r.id.split()[0]
+            if rid in ids_set or (rid.rsplit(".",1)[0] in ids_set):
+                recs.append(r)
     SeqIO.write(recs, out, "fasta")
 
+def extract_by_dict(fasta, ids_set, dict_fp, what):
+    """listed transcripts match exactly, listed genes take all their transcripts (gene_dict.py)."""
+    import numpy as np
+    from gene_dict import GeneDict, report_unmatched
+    gd = GeneDict.load(dict_fp)
+    want = sorted(ids_set)
+    wid = gd.encode(want)
+    report_unmatched(want, wid, what)
+    wid = wid[wid >= 0]
+    recs = list(SeqIO.parse(xopen(fasta), "fasta"))
+    rids = [r.id.split()[0] for r in recs]
+    fid = gd.encode(rids)
+    report_unmatched(rids, fid, fasta)
+    keep = np.isin(fid, wid) | np.isin(gd.gene_of(fid), wid[gd.is_gene[wid]])
+    keep &= fid >= 0
+    missing = np.setdiff1d(wid, np.concatenate([fid[keep], gd.gene_of(fid[keep])]))
+    if missing.size:
+        print(f"[WARN] {missing.size} listed IDs have no sequence in {fasta}: "
+              + ", ".join(gd.decode(missing[:5])), file=sys.stderr)
+    return [r for r, k in zip(recs, keep) if k]
+
+def quick_screen(args):
+    """
+    k-mer 预筛：几秒内给出候选排名；可选把候选子集交给 DIAMOND/HMMER 确认。
+    E-value 按全集大小换算（--dbsize / -Z），与全量搜索可比。
+    """
+    idx = KmerIndex.open_or_build(args.pep, args.index_root)
+    queries = read_fasta(args.model)
+    rows = idx.screen(queries, args.min_shared, args.top)
+    write_ranked(rows, args.out)
+    ids = [r[0] for r in rows]
+    print(f"[INFO] quick_screen: {len(ids)} candidates from {idx.n_seqs} proteins", file=sys.stderr)
+
+    if args.confirm != "none" and ids:
+        if not args.confirm_out:
+            args.confirm_out = args.out + ".confirm.tsv"
+        tmp = tempfile.mkdtemp(prefix="quick_screen.")
+        cand_fa = os.path.join(tmp, "candidates.pep.fa")
+        keep = set(ids)
+        with open(cand_fa, "w") as w:
+            for rid, seq in read_fasta(args.pep):
+                if rid in keep:
+                    w.write(f">{rid}\n{seq}\n")
+        try:
+            if args.confirm == "diamond":
+                subprocess.run([args.diamond, "makedb", "--in", cand_fa, "-d", os.path.join(tmp, "cand"),
+                                "--quiet"], check=True)
+                subprocess.run([args.diamond, "blastp", "-q", args.model, "-d", os.path.join(tmp, "cand"),
+                                "-f", "6", "qseqid", "sseqid", "pident", "length", "qlen", "slen",
+                                "qstart", "qend", "sstart", "send", "evalue", "bitscore",
+                                "-e", str(args.evalue), "--dbsize", str(idx.meta["total_length"]),
+                                "--threads", str(args.threads), "--quiet", "-o", args.confirm_out], check=True)
+                confirmed = set()
+                with open(args.confirm_out) as f:
+                    for line in f:
+                        a = line.rstrip("\n").split("\t")
+                        if len(a) >= 12:
+                            confirmed.add(a[1])
+            else:
+                if not args.hmm:
+                    raise SystemExit("[ERROR] --confirm hmmer needs --hmm")
+                subprocess.run([args.hmmsearch, "--cpu", str(args.threads), "--domtblout", args.confirm_out,
+                                "-E", str(args.evalue), "-Z", str(idx.n_seqs), "-o", os.devnull,
+                                args.hmm, cand_fa], check=True)
+                confirmed = set()
+                with open(args.confirm_out) as f:
+                    for line in f:
+                        if line.startswith("#") or not line.strip():
+                            continue
+                        confirmed.add(line.split()[0])
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        ids = [x for x in ids if x in confirmed]
+        print(f"[INFO] quick_screen: {len(ids)} confirmed by {args.confirm}", file=sys.stderr)
+    elif args.confirm_out:
+        open(args.confirm_out, "w").close()
+
+    write_list(set(ids), args.out_list)
+
 def main():
     ap=argparse.ArgumentParser()
     sub=ap.add_subparsers(dest="cmd", required=True)
@@ -73,19 +175,39 @@ def main():
     p2.add_argument("--strategy", required=True)
     p2.add_argument("--out_list", required=True)
     p2.add_argument("--out_venn_tsv", required=True)
+    p2.add_argument("--motif", default="", help="motif carriers (motif_scan.py --out_list); adds a MOTIF column")
 
     p3=sub.add_parser("extract_fasta")
     p3.add_argument("--fasta", required=True)
     p3.add_argument("--ids", required=True)
     p3.add_argument("--out", required=True)
+    p3.add_argument("--dict", default="", help="gene_dict.py table; replaces the '.N' prefix matching")
+
+    p4=sub.add_parser("quick_screen")
+    p4.add_argument("--pep", required=True, help="target.pep.longest.fa")
+    p4.add_argument("--model", required=True)
+    p4.add_argument("--index_root", required=True, help="k-mer index cache dir (kmer_index.py)")
+    p4.add_argument("--out", required=True, help="ranked candidates TSV")
+    p4.add_argument("--out_list", required=True)
+    p4.add_argument("--min_shared", type=int, default=4)
+    p4.add_argument("--top", type=int, default=500)
+    p4.add_argument("--confirm", choices=["none", "diamond", "hmmer"], default="none")
+    p4.add_argument("--confirm_out", default="", help="DIAMOND TSV / hmmsearch domtblout of the confirmation")
+    p4.add_argument("--evalue", type=float, default=1e-5)
+    p4.add_argument("--hmm", default="")
+    p4.add_argument("--diamond", default="diamond")
+    p4.add_argument("--hmmsearch", default="hmmsearch")
+    p4.add_argument("--threads", type=int, default=4)
 
     args=ap.parse_args()
     if args.cmd=="blast_candidates":
         blast_candidates(args.blast_tsv, args.out)
     elif args.cmd=="final_members":
-        final_members(args.blast,args.pfam,args.hmm,args.strategy,args.out_list,args.out_venn_tsv)
+        final_members(args.blast,args.pfam,args.hmm,args.strategy,args.out_list,args.out_venn_tsv,args.motif)
     elif args.cmd=="extract_fasta":
-        extract_fasta(args.fasta,args.ids,args.out)
+        extract_fasta(args.fasta,args.ids,args.out,args.dict)
+    elif args.cmd=="quick_screen":
+        quick_screen(args)
 
 if __name__=="__main__":
-    main()
+    profiling.run(main)
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+MAFFT wrapper with an alignment cache keyed by the hash of the sequence set.
+
+  1) exact hit (same sequences + same mode) -> cached alignment is reused
+  2) mode "add": the cached alignment (or --seed_aln) sharing the most
+     sequences with the input is used as base; rows not in the input are
+     dropped and only the missing sequences are added with `mafft --add`
+  3) otherwise (or mode "full") -> `mafft --auto` from scratch
+
+Cache layout (cache_dir):
+  <set_hash>.aln.fa   alignment
+  <set_hash>.ids      seq_id <TAB> seq_hash   (members of the alignment)
+"""
+import argparse
+import glob
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from compress_io import xopen
+import profiling
+
+GAP_CHARS = "-."
+
+
+def read_fasta(fp):
+    seqs = {}
+    name = None
+    buf = []
+    with xopen(fp) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith(">"):
+                if name:
+                    seqs[name] = "".join(buf)
+                name = line[1:].split()[0]
+                buf = []
+            else:
+                buf.append(line.replace(" ", "").replace("\r", ""))
+        if name:
+            seqs[name] = "".join(buf)
+    return seqs
+
+
+def write_fasta(seqs, fp):
+    with open(fp, "w") as w:
+        for name, s in seqs.items():
+            w.write(f">{name}\n{s}\n")
+
+
+def ungap(s):
+    return "".join(c for c in s if c not in GAP_CHARS)
+
+
+def seq_key(name, seq):
+    s = ungap(seq).upper().rstrip("*")
+    return hashlib.sha1(f"{name}\t{s}".encode()).hexdigest()
+
+
+def set_hash(keys, mode):
+    h = hashlib.sha1(f"mafft-auto|{mode}\n".encode())
+    for k in sorted(keys):
+        h.update(k.encode())
+        h.update(b"\n")
+    return h.hexdigest()
+
+
+def load_ids(fp):
+    d = {}
+    with open(fp) as f:
+        for line in f:
+            a = line.rstrip("\n").split("\t")
+            if len(a) >= 2:
+                d[a[0]] = a[1]
+    return d
+
+
+def drop_rows(aln, keep):
+    """Keep only `keep` rows and remove columns that became all-gap."""
+    rows = {n: s for n, s in aln.items() if n in keep}
+    if not rows:
+        return rows
+    L = len(next(iter(rows.values())))
+    cols = [i for i in range(L) if any(s[i] not in GAP_CHARS for s in rows.values())]
+    return {n: "".join(s[i] for i in cols) for n, s in rows.items()}
+
+
+def run_mafft(cmd, out_fp):
+    with open(out_fp, "w") as out:
+        subprocess.check_call(cmd, stdout=out, stderr=subprocess.DEVNULL)
+    if os.path.getsize(out_fp) == 0:
+        raise SystemExit(f"[ERROR] mafft produced empty output: {' '.join(cmd)}")
+
+
+def store(cache_dir, h, aln_fp, ids):
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_aln = os.path.join(cache_dir, f".{h}.aln.fa.tmp")
+    tmp_ids = os.path.join(cache_dir, f".{h}.ids.tmp")
+    shutil.copyfile(aln_fp, tmp_aln)
+    with open(tmp_ids, "w") as w:
+        for name, k in ids.items():
+            w.write(f"{name}\t{k}\n")
+    # .ids is written last: an entry only counts once both files are in place
+    os.replace(tmp_aln, os.path.join(cache_dir, f"{h}.aln.fa"))
+    os.replace(tmp_ids, os.path.join(cache_dir, f"{h}.ids"))
+
+
+def candidate_bases(cache_dir, seed_aln, seed_prefix):
+    """yield (label, {name: aligned_seq}, {name: seq_key})"""
+    if seed_aln and os.path.exists(seed_aln) and os.path.getsize(seed_aln) > 0:
+        aln = {f"{seed_prefix}{n}": s for n, s in read_fasta(seed_aln).items()}
+        yield seed_aln, aln, {n: seq_key(n, s) for n, s in aln.items()}
+    if cache_dir and os.path.isdir(cache_dir):
+        for ids_fp in glob.glob(os.path.join(cache_dir, "*.ids")):
+            aln_fp = ids_fp[:-len(".ids")] + ".aln.fa"
+            if os.path.exists(aln_fp):
+                yield aln_fp, None, load_ids(ids_fp)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--in", dest="inp", required=True, help="unaligned FASTA")
+    ap.add_argument("--out", required=True, help="aligned FASTA")
+    ap.add_argument("--cache_dir", default="", help="alignment cache directory ('' = no cache)")
+    ap.add_argument("--mode", choices=["add", "full"], default="add",
+                    help="add: reuse the closest existing alignment + mafft --add; full: always realign")
+    ap.add_argument("--seed_aln", default="", help="existing alignment to use as base in add mode")
+    ap.add_argument("--seed_prefix", default="", help="prefix added to seed_aln IDs (e.g. 'Target|')")
+    ap.add_argument("--max_add_frac", type=float, default=0.5,
+                    help="add mode falls back to full realignment if more than this fraction is new")
+    ap.add_argument("--mafft", default="mafft")
+    ap.add_argument("--threads", type=int, default=1)
+    args = ap.parse_args()
+
+    seqs = read_fasta(args.inp)
+    if not seqs:
+        raise SystemExit(f"[ERROR] no sequences in {args.inp}")
+    keys = {n: seq_key(n, s) for n, s in seqs.items()}
+    h = set_hash(keys.values(), args.mode)
+
+    if args.cache_dir:
+        hit = os.path.join(args.cache_dir, f"{h}.aln.fa")
+        if os.path.exists(os.path.join(args.cache_dir, f"{h}.ids")) and os.path.exists(hit):
+            shutil.copyfile(hit, args.out)
+            print(f"[INFO] alignment cache hit: {hit}", file=sys.stderr)
+            return
+
+    want = set(keys.items())
+    best = None
+    if args.mode == "add":
+        for label, aln, ids in candidate_bases(args.cache_dir, args.seed_aln, args.seed_prefix):
+            shared = {n for n, k in ids.items() if (n, k) in want}
+            if shared and (best is None or len(shared) > len(best[2])):
+                best = (label, aln, shared)
+
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(args.out))) as tmp:
+        tmp_out = os.path.join(tmp, "out.aln.fa")
+        new = [n for n in seqs if best is None or n not in best[2]]
+
+        if best is not None and len(new) <= args.max_add_frac * len(seqs):
+            label, aln, shared = best
+            base = drop_rows(aln if aln is not None else read_fasta(label), shared)
+            base_fp = os.path.join(tmp, "base.aln.fa")
+            write_fasta(base, base_fp)
+            if new:
+                add_fp = os.path.join(tmp, "add.fa")
+                write_fasta({n: ungap(seqs[n]) for n in new}, add_fp)
+                run_mafft([args.mafft, "--add", add_fp, "--thread", str(args.threads), base_fp], tmp_out)
+            else:
+                shutil.copyfile(base_fp, tmp_out)
+            print(f"[INFO] reused {len(shared)} aligned seqs from {label}, added {len(new)}", file=sys.stderr)
+        else:
+            in_fp = os.path.join(tmp, "in.fa")
+            write_fasta({n: ungap(s) for n, s in seqs.items()}, in_fp)
+            run_mafft([args.mafft, "--auto", "--thread", str(args.threads), in_fp], tmp_out)
+            print(f"[INFO] full alignment of {len(seqs)} seqs", file=sys.stderr)
+
+        got = read_fasta(tmp_out)
+        if set(got) != set(seqs):
+            raise SystemExit(f"[ERROR] aligned IDs differ from input ({len(got)} vs {len(seqs)})")
+
+        if args.cache_dir:
+            store(args.cache_dir, h, tmp_out, keys)
+        shutil.move(tmp_out, args.out)
+
+
+if __name__ == "__main__":
+    profiling.run(main)
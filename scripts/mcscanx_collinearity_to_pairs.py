@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
 import argparse, random
+from compress_io import xopen
+import profiling
 
 def main():
     ap = argparse.ArgumentParser()
@@ -12,7 +14,7 @@ def main():
     pairs = []
     seen = set()
 
-    with open(args.col) as f:
+    with xopen(args.col) as f:
         for line in f:
             line = line.strip()
             if not line or line.startswith("#"):
@@ -39,4 +41,4 @@ def main():
             w.write(f"{a}\t{b}\t{t}\n")
 
 if __name__ == "__main__":
-    main()
+    profiling.run(main)
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 import argparse
 from Bio import SeqIO
+from compress_io import xopen
+import profiling
 
 def main():
     ap = argparse.ArgumentParser()
@@ -16,7 +18,7 @@ def main():
 
     def add(fa, prefix):
         nonlocal recs, seen
-        for r in SeqIO.parse(fa, "fasta"):
+        for r in SeqIO.parse(xopen(fa), "fasta"):
             rid = r.id.split()[0]
             new_id = f"{prefix}{rid}"
             if new_id in seen:
@@ -36,4 +38,4 @@ def main():
     SeqIO.write(recs, args.out, "fasta")
 
 if __name__ == "__main__":
-    main()
+    profiling.run(main)
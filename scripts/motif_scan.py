@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Proteome-wide PSSM scan with MEME motifs (rescue of divergent family members).
+
+Motifs are read from meme.txt (letter-probability matrices) or meme.xml and turned
+into log-odds matrices against the MEME background. Each matrix is rescaled to
+integers so the exact score distribution under the background can be computed by
+convolution, which gives a per-motif score threshold for --pvalue (as FIMO does).
+
+The scan itself is a NumPy sliding window over all proteins concatenated
+(score[i] = sum_j M[j, seq[i+j]]); chunks of proteins run on a process pool.
+
+A protein "carries the family motif combination" when it has hits for at least
+--min_motifs distinct motifs and for every motif listed in --require.
+
+Outputs:
+  --out_hits     seq_id motif motif_id start end score pvalue
+  --out_summary  seq_id n_motifs motifs in_family   (carriers only)
+  --out_list     carrier ids
+  --out_rescued  carriers not in --known (e.g. final_family_members.list)
+"""
+import argparse
+import math
+import re
+import sys
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from compress_io import xopen
+import profiling
+
+AA = "ACDEFGHIKLMNPQRSTVWY"
+UNKNOWN = len(AA)          # X/B/Z/*: scored as the column minimum
+SEP = UNKNOWN + 1          # between proteins
+ENCODE = np.full(256, UNKNOWN, dtype=np.uint8)
+for _i, _c in enumerate(AA):
+    ENCODE[ord(_c)] = _i
+    ENCODE[ord(_c.lower())] = _i
+SCALE_RANGE = 1000         # integer score range of a whole motif
+PSEUDO = 0.01
+
+
+class Motif:
+    def __init__(self, num, name, probs, bg):
+        self.num = num
+        self.name = name
+        self.width = probs.shape[0]
+        p = (probs + PSEUDO * bg) / (1.0 + PSEUDO)
+        lo = np.log2(p / bg)                                      # W x 20 bits
+        colmin = lo.min(axis=1, keepdims=True)
+        span = float((lo.max(axis=1) - colmin[:, 0]).sum()) or 1.0
+        self.scale = SCALE_RANGE / span
+        self.offset = float(colmin.sum())
+        ints = np.rint((lo - colmin) * self.scale).astype(np.int32)
+        # extra columns: unknown residue = column minimum, separator = very negative
+        self.matrix = np.zeros((self.width, SEP + 1), dtype=np.int32)
+        self.matrix[:, :len(AA)] = ints
+        self.matrix[:, SEP] = -(1 << 20)
+        self.pvalues = score_pvalues(ints, bg)
+
+    def threshold(self, pvalue):
+        """smallest integer score whose P(S >= score) <= pvalue"""
+        ok = np.flatnonzero(self.pvalues <= pvalue)
+        return int(ok[0]) if ok.size else len(self.pvalues)
+
+    def bits(self, s):
+        return s / self.scale + self.offset
+
+
+def score_pvalues(ints, bg):
+    """P(S >= s) for s = 0..max, S = sum of column scores under background composition."""
+    pmf = np.ones(1)
+    for row in ints:
+        col = np.zeros(int(row.max()) + 1)
+        np.add.at(col, row, bg)
+        pmf = np.convolve(pmf, col)
+    return np.clip(np.cumsum(pmf[::-1])[::-1], 0.0, 1.0)
+
+
+def parse_background(line_iter):
+    vals = {}
+    for line in line_iter:
+        toks = line.split()
+        if not toks:
+            if vals:
+                break
+            continue
+        for a, b in zip(toks[::2], toks[1::2]):
+            try:
+                vals[a.upper()] = float(b)
+            except ValueError:
+                return vals
+    return vals
+
+
+def motif_number(name, fallback):
+    m = re.search(r"MEME-(\d+)", name)
+    return int(m.group(1)) if m else fallback
+
+
+def read_meme_txt(fp):
+    with xopen(fp, errors="ignore") as f:
+        lines = f.read().splitlines()
+    alphabet, bg = AA, {}
+    motifs = []
+    name = None
+    it = iter(lines)
+    for line in it:
+        st = line.strip()
+        if st.startswith("ALPHABET="):
+            alphabet = st.split("=", 1)[1].strip() or AA
+        elif st.startswith("Background letter frequencies"):
+            bg = parse_background(it)
+        elif st.startswith("MOTIF"):
+            toks = st.split()
+            tag = next((t for t in toks if t.startswith("MEME-")), toks[1] if len(toks) > 1 else "")
+            name = tag
+        elif st.startswith("letter-probability matrix"):
+            m = re.search(r"w=\s*(\d+)", st)
+            w = int(m.group(1)) if m else 0
+            rows = []
+            while len(rows) < w:
+                row = next(it).split()
+                if row:
+                    rows.append([float(x) for x in row])
+            motifs.append((name or f"MEME-{len(motifs) + 1}", np.array(rows)))
+            name = None
+    return alphabet, bg, motifs
+
+
+def read_meme_xml(fp):
+    with xopen(fp, "rb") as f:
+        root = ET.parse(f).getroot()
+    ids = {}
+    for le in root.iter("letter"):
+        if le.get("id") and le.get("symbol"):
+            ids[le.get("id")] = le.get("symbol").upper()
+    alphabet = "".join(ids.values()) or AA
+    bg = {}
+    bgf = root.find(".//background_frequencies/alphabet_array")
+    if bgf is not None:
+        for v in bgf.findall("value"):
+            bg[ids.get(v.get("letter_id"), v.get("letter_id"))] = float(v.text)
+    motifs = []
+    for mo in root.iter("motif"):
+        arr = mo.find("probabilities/alphabet_matrix")
+        if arr is None:
+            continue
+        rows = []
+        for a in arr.findall("alphabet_array"):
+            d = {ids.get(v.get("letter_id"), v.get("letter_id")): float(v.text) for v in a.findall("value")}
+            rows.append([d.get(c, 0.0) for c in alphabet])
+        motifs.append((mo.get("alt") or mo.get("name") or mo.get("id"), np.array(rows)))
+    return alphabet, bg, motifs
+
+
+def load_motifs(fp):
+    with xopen(fp, errors="ignore") as f:
+        head = f.read(200).lstrip()
+    alphabet, bg, raw = (read_meme_xml if head.startswith("<") else read_meme_txt)(fp)
+    order = [AA.index(c) for c in alphabet.upper() if c in AA]
+    if len(order) != len(AA):
+        raise SystemExit(f"[ERROR] {fp}: not a protein motif file (alphabet {alphabet})")
+    bgv = np.array([bg.get(c, 0.0) for c in AA])
+    bgv = bgv / bgv.sum() if bgv.sum() > 0 else np.full(len(AA), 1.0 / len(AA))
+    motifs = []
+    for i, (name, probs) in enumerate(raw, 1):
+        m = np.zeros((probs.shape[0], len(AA)))
+        m[:, order] = probs[:, :len(AA)]
+        m /= m.sum(axis=1, keepdims=True)
+        motifs.append(Motif(motif_number(name, i), name, m, bgv))
+    return motifs
+
+
+def read_fasta(fp):
+    recs = []
+    name, buf = None, []
+    with xopen(fp) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith(">"):
+                if name is not None:
+                    recs.append((name, "".join(buf)))
+                name, buf = line[1:].split()[0], []
+            else:
+                buf.append(line)
+    if name is not None:
+        recs.append((name, "".join(buf)))
+    return recs
+
+
+def read_ids(fp):
+    s = set()
+    with xopen(fp) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                s.add(line.split()[0])
+    return s
+
+
+def scan_chunk(job):
+    """job = (records, [(motif_idx, matrix, threshold)]) -> [(rec_idx, motif_idx, start0, score)]"""
+    recs, mats = job
+    lens = np.array([len(s) for _, s in recs], dtype=np.int64)
+    raw = np.frombuffer(("\x00".join(s for _, s in recs) + "\x00").encode("ascii", "replace"), dtype=np.uint8)
+    codes = ENCODE[raw]
+    starts = np.concatenate(([0], np.cumsum(lens + 1)[:-1]))
+    codes[starts + lens] = SEP
+    owner = np.repeat(np.arange(len(recs)), lens + 1)
+    out = []
+    for mi, mat, thr in mats:
+        w = mat.shape[0]
+        n = codes.size - w + 1
+        if n <= 0:
+            continue
+        score = np.zeros(n, dtype=np.int32)
+        for j in range(w):
+            score += mat[j][codes[j:j + n]]
+        pos = np.flatnonzero(score >= thr)
+        for p in pos:
+            r = owner[p]
+            out.append((int(r), mi, int(p - starts[r]), int(score[p])))
+    return out
+
+
+def chunks(recs, n):
+    size = max(1, math.ceil(len(recs) / n))
+    for i in range(0, len(recs), size):
+        yield i, recs[i:i + size]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pep", required=True, help="proteome to scan (target.pep.longest.fa)")
+    ap.add_argument("--meme", required=True, help="meme.txt or meme.xml")
+    ap.add_argument("--pvalue", type=float, default=1e-5, help="per-site p-value threshold")
+    ap.add_argument("--min_motifs", type=int, default=3, help="distinct motifs a carrier must have")
+    ap.add_argument("--require", default="", help="motif numbers that must all be present, e.g. 1,2")
+    ap.add_argument("--known", default="", help="current family members; carriers outside it are 'rescued'")
+    ap.add_argument("--out_hits", default="")
+    ap.add_argument("--out_summary", default="")
+    ap.add_argument("--out_list", required=True)
+    ap.add_argument("--out_rescued", default="")
+    ap.add_argument("--threads", type=int, default=1)
+    args = ap.parse_args()
+
+    motifs = load_motifs(args.meme)
+    if not motifs:
+        raise SystemExit(f"[ERROR] no motifs in {args.meme}")
+    require = {int(x) for x in re.split(r"[,\s]+", args.require) if x}
+    unknown = require - {m.num for m in motifs}
+    if unknown:
+        raise SystemExit(f"[ERROR] --require motifs not in {args.meme}: {sorted(unknown)}")
+
+    recs = read_fasta(args.pep)
+    mats = [(i, m.matrix, m.threshold(args.pvalue)) for i, m in enumerate(motifs)]
+    n_chunks = max(1, args.threads) * 4
+    jobs = [(c, mats) for _, c in chunks(recs, n_chunks)]
+    bases = [i for i, _ in chunks(recs, n_chunks)]
+
+    if args.threads > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=args.threads) as ex:
+            results = list(ex.map(scan_chunk, jobs))
+    else:
+        results = list(map(scan_chunk, jobs))
+
+    hits = []
+    for base, res in zip(bases, results):
+        for r, mi, start0, score in res:
+            hits.append((recs[base + r][0], mi, start0, score))
+    hits.sort(key=lambda x: (x[0], motifs[x[1]].num, x[2]))
+
+    per_seq = {}
+    for sid, mi, _s, _sc in hits:
+        per_seq.setdefault(sid, set()).add(motifs[mi].num)
+    carriers = [sid for sid, _ in recs
+                if sid in per_seq and len(per_seq[sid]) >= args.min_motifs and require <= per_seq[sid]]
+    known = read_ids(args.known) if args.known else set()
+
+    if args.out_hits:
+        with open(args.out_hits, "w") as w:
+            w.write("seq_id\tmotif\tmotif_id\tstart\tend\tscore\tpvalue\n")
+            for sid, mi, start0, score in hits:
+                m = motifs[mi]
+                w.write(f"{sid}\tMotif{m.num}\t{m.num}\t{start0 + 1}\t{start0 + m.width}\t"
+                        f"{m.bits(score):.2f}\t{m.pvalues[min(score, len(m.pvalues) - 1)]:.3g}\n")
+    if args.out_summary:
+        with open(args.out_summary, "w") as w:
+            w.write("seq_id\tn_motifs\tmotifs\tin_family\n")
+            for sid in carriers:
+                ms = sorted(per_seq[sid])
+                w.write(f"{sid}\t{len(ms)}\t{','.join(f'Motif{x}' for x in ms)}\t{int(sid in known)}\n")
+    with open(args.out_list, "w") as w:
+        for sid in sorted(carriers):
+            w.write(sid + "\n")
+    rescued = sorted(set(carriers) - known)
+    if args.out_rescued:
+        with open(args.out_rescued, "w") as w:
+            for sid in rescued:
+                w.write(sid + "\n")
+
+    print(f"[INFO] {len(motifs)} motifs, {len(hits)} sites in {len(per_seq)} proteins; "
+          f"{len(carriers)} carry the motif combination"
+          + (f", {len(rescued)} outside the family list" if args.known else ""), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    profiling.run(main)
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Family identification over the target + all synteny species in one search pass.
+
+  concat    per-species peptide FASTAs -> one FASTA with "<species>|<id>" headers
+            (longest isoform per gene; with --dict the gene comes from the species
+            gene dictionary, as in gff_longest_isoform.py)
+  profiles  Pfam domains of interest (pulled out of Pfam-A.hmm by accession) +
+            family HMM -> one HMM file, so a single hmmsearch covers both
+  split     DIAMOND TSV + hmmsearch domtblout of the combined run -> per-species
+            member lists, evidence table and species x model-protein count matrix
+
+Members are chosen per species with the same final_strategy as the target
+(list_ops.select_members); a "+motif" suffix is ignored here.
+"""
+import argparse
+import os
+import sys
+from collections import defaultdict
+
+from compress_io import xopen
+from gene_dict import GeneDict, report_unmatched
+from gff_longest_isoform import get_prefix
+from list_ops import select_members
+import profiling
+
+SEP = "|"
+
+
+def read_fasta(fp):
+    recs = []
+    name, buf = None, []
+    with xopen(fp) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith(">"):
+                if name is not None:
+                    recs.append((name, "".join(buf)))
+                name, buf = line[1:].split()[0], []
+            else:
+                buf.append(line)
+    if name is not None:
+        recs.append((name, "".join(buf)))
+    return recs
+
+
+def longest_per_gene(recs, gd=None, what=""):
+    """one record per gene; with a gene dictionary the gene is the GFF gene of each
+    isoform, IDs it does not know fall back to the '.N' prefix and are reported."""
+    rids = [rid for rid, _seq in recs]
+    keys = [get_prefix(rid) for rid in rids]
+    if gd is not None:
+        ids = gd.encode(rids)
+        report_unmatched(rids, ids, what)
+        keys = [gd.names[g] if g >= 0 else k for g, k in zip(gd.gene_of(ids), keys)]
+    best = {}
+    for (rid, seq), p in zip(recs, keys):
+        if p not in best or len(seq) > len(best[p][1]):
+            best[p] = (rid, seq)
+    return [best[p] for p in sorted(best)]
+
+
+def cmd_concat(args):
+    dicts = dict(x.partition("=")[::2] for x in args.dict)
+    with open(args.out, "w") as w, open(args.out_map, "w") as m:
+        m.write("species\tpep\tn_proteins\n")
+        for item in args.species:
+            sp, _, fp = item.partition("=")
+            if not fp or SEP in sp:
+                raise SystemExit(f"[ERROR] bad --species entry (NAME=PEP, no '{SEP}' in NAME): {item}")
+            gd = GeneDict.load(dicts[sp]) if dicts.get(sp) else None
+            recs = longest_per_gene(read_fasta(fp), gd, fp)
+            for rid, seq in recs:
+                w.write(f">{sp}{SEP}{rid}\n{seq.replace('*', '')}\n")
+            m.write(f"{sp}\t{fp}\t{len(recs)}\n")
+            print(f"[INFO] {sp}: {len(recs)} proteins", file=sys.stderr)
+
+
+def iter_hmm_records(fp):
+    buf = []
+    with xopen(fp) as f:
+        for line in f:
+            buf.append(line)
+            if line.startswith("//"):
+                yield buf
+                buf = []
+
+
+def hmm_field(rec, key):
+    for line in rec:
+        if line.startswith(key + " "):
+            return line.split(None, 1)[1].strip()
+        if line.startswith("HMM "):
+            break
+    return ""
+
+
+def cmd_profiles(args):
+    want = {x.strip().split(".")[0] for x in args.pfam_ids.split(",") if x.strip()}
+    found = set()
+    with open(args.out, "w") as w:
+        if want:
+            for rec in iter_hmm_records(args.pfam_hmm):
+                acc = hmm_field(rec, "ACC").split(".")[0]
+                if acc in want:
+                    w.writelines(rec)
+                    found.add(acc)
+                    if found == want:
+                        break
+        if args.family_hmm:
+            for rec in iter_hmm_records(args.family_hmm):
+                w.writelines(rec)
+    missing = want - found
+    if missing:
+        print(f"[WARN] not in {args.pfam_hmm}: {','.join(sorted(missing))}", file=sys.stderr)
+
+
+def cmd_split(args):
+    species = [x.split("=")[0] for x in args.species]
+    want = {x.strip().split(".")[0] for x in args.pfam_ids.split(",") if x.strip()}
+    fam_names = {hmm_field(rec, "NAME") for rec in iter_hmm_records(args.family_hmm)} if args.family_hmm else set()
+
+    n_prot = defaultdict(int)
+    with open(args.species_map) as f:
+        next(f)
+        for line in f:
+            a = line.rstrip("\n").split("\t")
+            n_prot[a[0]] = int(a[2])
+
+    def split_id(x):
+        sp, _, gid = x.partition(SEP)
+        return sp, gid
+
+    A, B, C = (defaultdict(set) for _ in range(3))
+    best = {}  # (sp, gid) -> (bitscore, query)
+    with xopen(args.blast) as f:
+        for line in f:
+            a = line.rstrip("\n").split("\t")
+            if len(a) < 12:
+                continue
+            sp, gid = split_id(a[1])
+            A[sp].add(gid)
+            bs = float(a[11])
+            if (sp, gid) not in best or bs > best[(sp, gid)][0]:
+                best[(sp, gid)] = (bs, a[0])
+    with xopen(args.domtbl) as f:
+        for line in f:
+            if line.startswith("#"):
+                continue
+            a = line.split()
+            if len(a) < 23:
+                continue
+            sp, gid = split_id(a[0])
+            if a[4].split(".")[0] in want:
+                B[sp].add(gid)
+            if a[3] in fam_names:
+                C[sp].add(gid)
+
+    queries = sorted({q for _bs, q in best.values()})
+    strategy = args.strategy.partition("+")[0]   # no motif evidence for the other species
+    os.makedirs(args.outdir, exist_ok=True)
+    members = {}
+    with open(os.path.join(args.outdir, "evidence.tsv"), "w") as ev:
+        ev.write("species\tgene\tBLAST\tPFAM\tHMM\tmember\tbest_query\n")
+        for sp in species:
+            final = select_members(A[sp], B[sp], C[sp], strategy)
+            members[sp] = final
+            with open(os.path.join(args.outdir, f"{sp}.members.list"), "w") as w:
+                for g in sorted(final):
+                    w.write(g + "\n")
+            for g in sorted(A[sp] | B[sp] | C[sp]):
+                q = best.get((sp, g), (0, "NA"))[1]
+                ev.write(f"{sp}\t{g}\t{int(g in A[sp])}\t{int(g in B[sp])}\t{int(g in C[sp])}\t"
+                         f"{int(g in final)}\t{q}\n")
+
+    with open(os.path.join(args.outdir, "summary.tsv"), "w") as w:
+        w.write("species\tn_proteins\tBLAST\tPFAM\tHMM\tmembers\n")
+        for sp in species:
+            w.write(f"{sp}\t{n_prot[sp]}\t{len(A[sp])}\t{len(B[sp])}\t{len(C[sp])}\t{len(members[sp])}\n")
+
+    # species x model protein: members assigned to their best DIAMOND query
+    with open(os.path.join(args.outdir, "count_matrix.tsv"), "w") as w:
+        w.write("species\t" + "\t".join(queries) + "\tno_blast_hit\ttotal\n")
+        for sp in species:
+            cnt = defaultdict(int)
+            for g in members[sp]:
+                cnt[best.get((sp, g), (0, None))[1]] += 1
+            w.write(sp + "\t" + "\t".join(str(cnt[q]) for q in queries)
+                    + f"\t{cnt[None]}\t{len(members[sp])}\n")
+
+    print("[INFO] members: " + ", ".join(f"{sp}={len(members[sp])}" for sp in species), file=sys.stderr)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p1 = sub.add_parser("concat")
+    p1.add_argument("--species", nargs="+", required=True, help="NAME=PEP_FASTA ...")
+    p1.add_argument("--out", required=True)
+    p1.add_argument("--dict", nargs="*", default=[], help="NAME=GENE_DICT ... (gene_dict.py build) for isoform grouping")
+    p1.add_argument("--out_map", required=True, help="species / source / protein count TSV")
+
+    p2 = sub.add_parser("profiles")
+    p2.add_argument("--pfam_hmm", required=True)
+    p2.add_argument("--pfam_ids", default="", help="comma separated PFxxxxx list")
+    p2.add_argument("--family_hmm", default="")
+    p2.add_argument("--out", required=True)
+
+    p3 = sub.add_parser("split")
+    p3.add_argument("--species", nargs="+", required=True, help="species names in output order (NAME or NAME=...)")
+    p3.add_argument("--species_map", required=True, help="concat --out_map")
+    p3.add_argument("--blast", required=True)
+    p3.add_argument("--domtbl", required=True, help="hmmsearch --domtblout of the profiles file")
+    p3.add_argument("--pfam_ids", default="")
+    p3.add_argument("--family_hmm", default="")
+    p3.add_argument("--strategy", required=True)
+    p3.add_argument("--outdir", required=True)
+
+    args = ap.parse_args()
+    {"concat": cmd_concat, "profiles": cmd_profiles, "split": cmd_split}[args.cmd](args)
+
+
+if __name__ == "__main__":
+    profiling.run(main)
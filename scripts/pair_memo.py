@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Content-addressed memo for per-pair codon alignments and Ka/Ks results.
+
+Shared by module 9 (family pairs) and module 10 (syntenic pairs), and across runs
+and projects that point at the same cache dir (config: cache_dir):
+
+  <memo_dir>/axt/<h[:2]>/<h>.axt     two aligned codon sequences, no header
+                                     h = sha1(cdsA, cdsB, mafft, pal2nal)
+  <memo_dir>/kaks/<h[:2]>/<h>.kaks   KaKs_Calculator output for that alignment
+                                     h = sha1(aligned seqs, method, KaKs)
+
+Keys depend only on sequences and tool settings, never on gene IDs, and the two
+sequences are put in a canonical order so A-B and B-A share one entry.
+Writes are atomic (temp file + rename), so concurrent jobs can share a memo.
+"""
+import os
+
+from batch_journal import content_hash
+
+
+class PairMemo:
+    SUFFIX = {"axt": ".axt", "kaks": ".kaks"}
+
+    def __init__(self, root):
+        self.root = root or ""
+
+    def path(self, kind, key):
+        return os.path.join(self.root, kind, key[:2], key + self.SUFFIX[kind])
+
+    def get(self, kind, key):
+        if not self.root:
+            return None
+        p = self.path(kind, key)
+        return p if os.path.exists(p) and os.path.getsize(p) > 0 else None
+
+    def put_text(self, kind, key, text):
+        if not self.root:
+            return
+        p = self.path(kind, key)
+        os.makedirs(os.path.dirname(p), exist_ok=True)
+        tmp = f"{p}.{os.getpid()}.tmp"
+        with open(tmp, "w") as w:
+            w.write(text)
+        os.replace(tmp, p)
+
+    def put_file(self, kind, key, src):
+        with open(src) as f:
+            self.put_text(kind, key, f.read())
+
+
+def tool_id(path):
+    # 只用程序名：不同机器/项目的安装路径不同也能命中
+    return os.path.basename(path or "")
+
+
+def axt_key(cdsA, cdsB, mafft, pal2nal):
+    """(key, swapped): swapped means geneB's CDS comes first in the memo entry."""
+    swapped = cdsB < cdsA
+    first, second = (cdsB, cdsA) if swapped else (cdsA, cdsB)
+    return content_hash("axt", first, second, tool_id(mafft), tool_id(pal2nal)), swapped
+
+
+def read_axt(fp):
+    with open(fp) as f:
+        lines = [x.strip() for x in f if x.strip()]
+    if len(lines) < 3 or not lines[0].startswith(">"):
+        raise ValueError(f"not a 2-sequence AXT: {fp}")
+    return lines[0], lines[1], lines[2]
+
+
+def store_axt(memo, key, swapped, axt_fp):
+    _h, s1, s2 = read_axt(axt_fp)
+    if swapped:
+        s1, s2 = s2, s1
+    memo.put_text("axt", key, f"{s1}\n{s2}\n")
+
+
+def restore_axt(memo_fp, swapped, nameA, nameB, out_fp):
+    with open(memo_fp) as f:
+        s1, s2 = [x.strip() for x in f if x.strip()][:2]
+    if swapped:
+        s1, s2 = s2, s1
+    with open(out_fp, "w") as w:
+        w.write(f">{nameA}-{nameB}\n{s1}\n{s2}\n")
+    return out_fp
+
+
+def kaks_key(axt_fp, method, kaks):
+    _h, s1, s2 = read_axt(axt_fp)
+    first, second = sorted((s1, s2))
+    return content_hash("kaks", first, second, method, tool_id(kaks))
@@ -0,0 +1,487 @@
+#!/usr/bin/env python3
+"""
+Shared-filesystem work queue for pair batches (kaks_make_axt_batch.py, kaks_run_batch.py).
+
+A queue is a directory on a filesystem every worker can see (NFS, Lustre, ...):
+
+  manifest.json       command template, task count, input hash, lease ttl, merge spec
+  tasks/<id>.tsv      a chunk of the pairs table (header kept), or
+  tasks/<id>/         hard links to a chunk of *.axt files
+  leases/<id>         owner "host pid worker" ; mtime = last heartbeat
+  results/<id>/       output of the finished task
+  done/<id>  dead/<id>  failed/<id>.<attempt>
+  merged              written once by the worker that merges the drained queue
+
+Any number of `worker` processes, on any node, loop: claim a task, run the
+command template with {task} {out} {work} filled in, heartbeat the lease while it
+runs, publish the result. Claims use link(2), which is atomic on NFS as well. A
+lease whose mtime is older than the ttl belongs to a dead worker and is taken
+over; ages are measured against a probe file touched on the same filesystem, so
+clock skew between nodes does not matter. A task runs in a private scratch dir
+and is renamed into results/ on success, so a task that ran twice (stolen lease
+of a worker that was only slow) still has exactly one result. A failed task is
+re-queued until it has used --retries, then it is dead. When every task is done
+or dead, one worker takes the merge lease and merges into --dest.
+
+Local use (what the Snakefile does; more workers may join from other nodes):
+  pair_queue.py init   --queue Q --pairs pairs.tsv --chunk 200 --cmd '... --pairs {task} --outdir {out}' \
+                       --merge axt --dest axt_dir
+  pair_queue.py local  --queue Q --workers 4
+  pair_queue.py worker --queue Q          # on any other node
+  pair_queue.py status --queue Q
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+from batch_journal import atomic_write, content_hash, file_hash, publish
+import profiling
+
+MANIFEST = "manifest.json"
+
+
+# ---------------------------------------------------------------- queue layout
+def qpath(q, *parts):
+    return os.path.join(q, *parts)
+
+
+def load_manifest(q):
+    with open(qpath(q, MANIFEST)) as f:
+        return json.load(f)
+
+
+def task_ids(man):
+    return [f"{i:06d}" for i in range(man["n_tasks"])]
+
+
+def fs_now(q, wid):
+    """current time on the queue's filesystem (mtime of a freshly touched probe)."""
+    probe = qpath(q, "leases", f".clock.{wid}")
+    with open(probe, "a"):
+        os.utime(probe, None)
+    return os.stat(probe).st_mtime
+
+
+def n_attempts(q, tid):
+    return len(glob.glob(qpath(q, "failed", tid + ".*")))
+
+
+def state(q, man):
+    done = {t for t in task_ids(man) if os.path.exists(qpath(q, "done", t))}
+    dead = {t for t in task_ids(man) if os.path.exists(qpath(q, "dead", t))} - done
+    return done, dead
+
+
+# ---------------------------------------------------------------- init
+def split_pairs(fp, chunk, tdir):
+    with open(fp) as f:
+        header = f.readline()
+        rows = [line for line in f if line.strip()]
+    n = 0
+    for i in range(0, len(rows), chunk):
+        with open(os.path.join(tdir, f"{n:06d}.tsv"), "w") as w:
+            w.write(header)
+            w.writelines(rows[i:i + chunk])
+        n += 1
+    return n
+
+
+def split_files(files, chunk, tdir):
+    n = 0
+    for i in range(0, len(files), chunk):
+        d = os.path.join(tdir, f"{n:06d}")
+        os.makedirs(d)
+        for fp in files[i:i + chunk]:
+            publish(fp, os.path.join(d, os.path.basename(fp)))
+        n += 1
+    return n
+
+
+def init(args):
+    q = args.queue
+    if args.pairs:
+        src = [args.pairs]
+    else:
+        src = sorted(glob.glob(os.path.join(args.axt_dir, "*.axt")))
+    h = content_hash(args.cmd, str(args.chunk), args.merge, *[file_hash(fp) for fp in src])
+    if os.path.exists(qpath(q, MANIFEST)):
+        man = load_manifest(q)
+        if man.get("input_hash") == h:
+            done, dead = state(q, man)
+            # 同样的输入：保留已完成的任务，只把 dead 的重新放回队列
+            for t in dead:
+                os.remove(qpath(q, "dead", t))
+                for fp in glob.glob(qpath(q, "failed", t + ".*")):
+                    os.remove(fp)
+            if os.path.exists(qpath(q, "merged")):
+                os.remove(qpath(q, "merged"))
+            print(f"[INFO] queue {q}: resume, {len(done)}/{man['n_tasks']} tasks done", file=sys.stderr)
+            return
+        shutil.rmtree(q)
+
+    os.makedirs(q)
+    for d in ("tasks", "leases", "results", "done", "dead", "failed", "scratch"):
+        os.makedirs(qpath(q, d))
+    if args.pairs:
+        n = split_pairs(args.pairs, args.chunk, qpath(q, "tasks"))
+    else:
+        n = split_files(src, args.chunk, qpath(q, "tasks"))
+    man = {
+        "version": 1, "n_tasks": n, "input_hash": h, "cmd": args.cmd,
+        "task_kind": "pairs" if args.pairs else "axt",
+        "lease_ttl": args.lease_ttl, "retries": args.retries,
+        "merge": args.merge, "dest": os.path.abspath(args.dest),
+    }
+    # manifest 最后写：worker 看到它时任务都已就位
+    with atomic_write(qpath(q, MANIFEST)) as w:
+        json.dump(man, w, indent=1)
+    print(f"[INFO] queue {q}: {n} tasks", file=sys.stderr)
+
+
+# ---------------------------------------------------------------- leases
+class Lease:
+    def __init__(self, q, name, wid, ttl):
+        self.q, self.name, self.wid, self.ttl = q, name, wid, ttl
+        self.path = qpath(q, "leases", name)
+        self.owner = f"{socket.gethostname()}\t{os.getpid()}\t{wid}\n"
+        self.lost = False
+        self._stop = threading.Event()
+        self._th = None
+
+    def _mine(self):
+        try:
+            with open(self.path) as f:
+                return f.read() == self.owner
+        except OSError:
+            return False
+
+    def claim(self):
+        tmp = qpath(self.q, "leases", f".{self.name}.{self.wid}")
+        with open(tmp, "w") as w:
+            w.write(self.owner)
+        try:
+            for _ in range(2):
+                try:
+                    os.link(tmp, self.path)
+                    return True
+                except FileExistsError:
+                    pass
+                # 已被占用：只有过期（ttl 内没有心跳）的租约才接管
+                try:
+                    st = os.stat(self.path)
+                except FileNotFoundError:
+                    continue
+                if fs_now(self.q, self.wid) - st.st_mtime <= self.ttl:
+                    return False
+                stale = qpath(self.q, "leases", f".{self.name}.expired.{self.wid}")
+                try:
+                    os.rename(self.path, stale)
+                except FileNotFoundError:
+                    return False        # 别的 worker 抢先接管了
+                st2 = os.stat(stale)
+                if (st2.st_ino, st2.st_mtime) != (st.st_ino, st.st_mtime):
+                    # 挪走的是别人刚拿到的新租约：还回去，让出这个任务
+                    try:
+                        os.link(stale, self.path)
+                    except FileExistsError:
+                        pass
+                    os.remove(stale)
+                    return False
+                os.remove(stale)
+                print(f"[INFO] lease {self.name} expired, taken over by {self.wid}", file=sys.stderr)
+            return False
+        finally:
+            os.remove(tmp)
+
+    def _beat(self):
+        while not self._stop.wait(max(1.0, self.ttl / 4)):
+            if not self._mine():
+                self.lost = True
+                return
+            try:
+                os.utime(self.path, None)
+            except OSError:
+                self.lost = True
+                return
+
+    def start(self):
+        self._th = threading.Thread(target=self._beat, daemon=True)
+        self._th.start()
+
+    def release(self):
+        self._stop.set()
+        if self._th:
+            self._th.join()
+        if self._mine():
+            os.remove(self.path)
+
+
+# ---------------------------------------------------------------- worker
+def run_task(q, man, tid, wid):
+    task = qpath(q, "tasks", tid + (".tsv" if man["task_kind"] == "pairs" else ""))
+    scratch = qpath(q, "scratch", f"{tid}.{wid}")
+    out = os.path.join(scratch, "out")
+    work = os.path.join(scratch, "work")
+    os.makedirs(out, exist_ok=True)
+    os.makedirs(work, exist_ok=True)
+    cmd = man["cmd"].replace("{task}", os.path.abspath(task)) \
+                    .replace("{out}", os.path.abspath(out)).replace("{work}", os.path.abspath(work))
+    with open(os.path.join(scratch, "log.txt"), "w") as log:
+        rc = subprocess.run(cmd, shell=True, executable="/bin/bash", stdout=log, stderr=subprocess.STDOUT).returncode
+    return rc, scratch, out
+
+
+def finish(q, tid, wid, rc, scratch, out, retries):
+    if rc == 0:
+        try:
+            os.rename(out, qpath(q, "results", tid))
+        except OSError:
+            pass                        # 同一任务已被另一个 worker 完成
+        with atomic_write(qpath(q, "done", tid)) as w:
+            w.write(wid + "\n")
+        shutil.rmtree(scratch, ignore_errors=True)
+        return True
+    k = n_attempts(q, tid) + 1
+    log = os.path.join(scratch, "log.txt")
+    tail = ""
+    if os.path.exists(log):
+        with open(log, errors="replace") as f:
+            tail = f.read()[-2000:]
+    with atomic_write(qpath(q, "failed", f"{tid}.{k}")) as w:
+        w.write(f"exit {rc} on {socket.gethostname()} ({wid})\n{tail}")
+    if k > retries:
+        with atomic_write(qpath(q, "dead", tid)) as w:
+            w.write(f"{k} attempts\n")
+    shutil.rmtree(scratch, ignore_errors=True)
+    return False
+
+
+def worker(q, poll=5.0, max_tasks=0, merge_when_drained=True, quiet=False):
+    while not os.path.exists(qpath(q, MANIFEST)):
+        time.sleep(poll)
+    man = load_manifest(q)
+    wid = uuid.uuid4().hex[:12]
+    ttl = float(man["lease_ttl"])
+    n_run = 0
+    while True:
+        done, dead = state(q, man)
+        open_tasks = [t for t in task_ids(man) if t not in done and t not in dead]
+        if not open_tasks:
+            break
+        claimed = None
+        for tid in open_tasks:
+            lease = Lease(q, tid, wid, ttl)
+            # claim 之后再确认一次：可能刚刚被别人做完
+            if lease.claim():
+                if os.path.exists(qpath(q, "done", tid)) or os.path.exists(qpath(q, "dead", tid)):
+                    lease.release()
+                    continue
+                claimed = (tid, lease)
+                break
+        if claimed is None:
+            time.sleep(poll)            # 剩下的都在别人手里：等它们完成或过期
+            continue
+        tid, lease = claimed
+        lease.start()
+        t0 = time.monotonic()
+        rc, scratch, out = run_task(q, man, tid, wid)
+        lease.release()
+        if lease.lost and rc == 0:
+            print(f"[WARN] task {tid}: lease was lost while running; result kept only if first", file=sys.stderr)
+        ok = finish(q, tid, wid, rc, scratch, out, int(man["retries"]))
+        n_run += 1
+        if not quiet:
+            print(f"[INFO] {wid} task {tid} {'done' if ok else 'failed'} in {time.monotonic() - t0:.1f}s",
+                  file=sys.stderr)
+        if max_tasks and n_run >= max_tasks:
+            return 0
+    rc = merge_once(q, man, wid) if merge_when_drained else 0
+    probe = qpath(q, "leases", f".clock.{wid}")
+    if os.path.exists(probe):
+        os.remove(probe)
+    return rc
+
+
+# ---------------------------------------------------------------- merge
+def merge_axt(q, man, tids, dest):
+    os.makedirs(dest, exist_ok=True)
+    ok_rows, fail_rows = [], []
+    for t in tids:
+        r = qpath(q, "results", t)
+        for fp in sorted(glob.glob(os.path.join(r, "*.axt"))):
+            publish(fp, os.path.join(dest, os.path.basename(fp)))
+        for name, rows in (("ok.tsv", ok_rows), ("failed.tsv", fail_rows)):
+            fp = os.path.join(r, name)
+            if os.path.exists(fp):
+                with open(fp) as f:
+                    next(f, None)
+                    rows.extend(line for line in f if line.strip())
+    with atomic_write(os.path.join(dest, "ok.tsv")) as w:
+        w.write("geneA\tgeneB\taxt\n")
+        for line in ok_rows:
+            a = line.rstrip("\n").split("\t")
+            w.write(f"{a[0]}\t{a[1]}\t{os.path.join(dest, os.path.basename(a[2]))}\n")
+    return ok_rows, fail_rows
+
+
+def merge_table(q, tids, dest):
+    name = os.path.basename(dest)
+    fname = re.sub(r"\.tsv$", "", name) + ".failed.tsv"
+    header, rows, fail_rows = None, [], []
+    for t in tids:
+        r = qpath(q, "results", t)
+        fp = os.path.join(r, name)
+        if os.path.exists(fp):
+            with open(fp) as f:
+                h = f.readline()
+                header = header or h
+                rows.extend(line for line in f if line.strip())
+        fp = os.path.join(r, fname)
+        if os.path.exists(fp):
+            with open(fp) as f:
+                next(f, None)
+                fail_rows.extend(line for line in f if line.strip())
+    with atomic_write(dest) as w:
+        w.write(header or "")
+        w.writelines(rows)
+    return rows, fail_rows
+
+
+def dead_pairs(q, man, dead):
+    """pairs of dead tasks, as (geneA, geneB) rows for the failed table."""
+    out = []
+    for t in sorted(dead):
+        if man["task_kind"] == "pairs":
+            with open(qpath(q, "tasks", t + ".tsv")) as f:
+                next(f, None)
+                out.extend(line.rstrip("\n").split("\t")[:2] for line in f if line.strip())
+        else:
+            for fp in sorted(glob.glob(qpath(q, "tasks", t, "*.axt"))):
+                out.append([os.path.basename(fp)[:-len(".axt")], ""])
+    return out
+
+
+def merge_once(q, man, wid):
+    lease = Lease(q, "merge", wid, float(man["lease_ttl"]))
+    while not os.path.exists(qpath(q, "merged")):
+        if not lease.claim():
+            time.sleep(2)
+            continue
+        lease.start()
+        try:
+            if not os.path.exists(qpath(q, "merged")):
+                merge(q, man)
+        finally:
+            lease.release()
+    with open(qpath(q, "merged")) as f:
+        return int(f.readline().split("\t")[0] != "ok")
+
+
+def merge(q, man):
+    done, dead = state(q, man)
+    tids = sorted(done)
+    dest = man["dest"]
+    if man["merge"] == "axt":
+        ok_rows, fail_rows = merge_axt(q, man, tids, dest)
+        fail_fp = os.path.join(dest, "failed.tsv")
+        fail_head = "geneA\tgeneB\treason\tattempts\tstderr\n"
+    else:
+        ok_rows, fail_rows = merge_table(q, tids, dest)
+        fail_fp = re.sub(r"\.tsv$", "", dest) + ".failed.tsv"
+        fail_head = "pair\taxt\treason\tattempts\tstderr\n"
+    with atomic_write(fail_fp) as w:
+        w.write(fail_head)
+        w.writelines(fail_rows)
+        for a, b in dead_pairs(q, man, dead):
+            if man["merge"] == "axt":
+                w.write(f"{a}\t{b}\tqueue task failed (see {q}/failed)\tNA\tNA\n")
+            else:
+                w.write(f"{a}\tNA\tqueue task failed (see {q}/failed)\tNA\tNA\n")
+    shutil.rmtree(qpath(q, "scratch"), ignore_errors=True)    # 被接管的 worker 留下的半成品
+    os.makedirs(qpath(q, "scratch"), exist_ok=True)
+    status = "ok" if ok_rows else "empty"
+    with atomic_write(qpath(q, "merged")) as w:
+        w.write(f"{status}\t{len(tids)} tasks\t{len(dead)} dead\t{len(ok_rows)} rows\n")
+    print(f"[INFO] queue merged: {len(tids)} tasks done, {len(dead)} dead, {len(ok_rows)} rows -> {dest}",
+          file=sys.stderr)
+
+
+# ---------------------------------------------------------------- cli
+def status(q):
+    man = load_manifest(q)
+    done, dead = state(q, man)
+    leases = [fp for fp in glob.glob(qpath(q, "leases", "*")) if not os.path.basename(fp).startswith(".")]
+    now = fs_now(q, "status")
+    print(f"tasks\t{man['n_tasks']}\ndone\t{len(done)}\ndead\t{len(dead)}\n"
+          f"failed_attempts\t{len(glob.glob(qpath(q, 'failed', '*')))}\n"
+          f"merged\t{'yes' if os.path.exists(qpath(q, 'merged')) else 'no'}")
+    for fp in sorted(leases):
+        with open(fp) as f:
+            host, pid, wid = (f.read().strip().split("\t") + ["?", "?", "?"])[:3]
+        age = now - os.stat(fp).st_mtime
+        tag = "EXPIRED" if age > man["lease_ttl"] else "active"
+        print(f"lease\t{os.path.basename(fp)}\t{host}\t{pid}\t{wid}\t{age:.0f}s\t{tag}")
+
+
+def local(q, n, poll):
+    """start n worker processes here and wait; returns the merge status."""
+    procs = [subprocess.Popen([sys.executable, os.path.abspath(__file__), "worker", "--queue", q,
+                               "--poll", str(poll)]) for _ in range(max(1, n))]
+    rcs = [p.wait() for p in procs]
+    return max(rcs)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd_name", required=True)
+
+    a = sub.add_parser("init", help="split a pairs table or an axt dir into tasks")
+    src = a.add_mutually_exclusive_group(required=True)
+    src.add_argument("--pairs", help="pairs TSV with header (kaks_make_axt_batch.py --pairs)")
+    src.add_argument("--axt_dir", help="dir of *.axt (kaks_run_batch.py --axt_dir)")
+    a.add_argument("--queue", required=True)
+    a.add_argument("--cmd", required=True, help="shell template; {task} {out} {work} are filled in per task")
+    a.add_argument("--chunk", type=int, default=200, help="pairs / files per task")
+    a.add_argument("--merge", choices=("axt", "table"), required=True)
+    a.add_argument("--dest", required=True, help="merge target: axt dir (axt) or TSV file (table)")
+    a.add_argument("--lease_ttl", type=float, default=300, help="seconds without heartbeat before a lease expires")
+    a.add_argument("--retries", type=int, default=2, help="re-queue a failed task this many times")
+
+    w = sub.add_parser("worker", help="claim and run tasks until the queue drains, then merge")
+    w.add_argument("--queue", required=True)
+    w.add_argument("--poll", type=float, default=5.0)
+    w.add_argument("--max_tasks", type=int, default=0, help="exit after N tasks (0 = until drained)")
+    w.add_argument("--no_merge", action="store_true")
+
+    lo = sub.add_parser("local", help="run N workers on this machine and wait for the merge")
+    lo.add_argument("--queue", required=True)
+    lo.add_argument("--workers", type=int, default=4)
+    lo.add_argument("--poll", type=float, default=2.0)
+
+    s = sub.add_parser("status")
+    s.add_argument("--queue", required=True)
+
+    args = ap.parse_args()
+    if args.cmd_name == "init":
+        if args.chunk < 1:
+            raise SystemExit("[ERROR] --chunk must be >= 1")
+        init(args)
+    elif args.cmd_name == "worker":
+        sys.exit(worker(args.queue, args.poll, args.max_tasks, not args.no_merge))
+    elif args.cmd_name == "local":
+        sys.exit(local(args.queue, args.workers, args.poll))
+    else:
+        status(args.queue)
+
+
+if __name__ == "__main__":
+    profiling.run(main)
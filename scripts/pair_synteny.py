@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Species-pair synteny (DIAMOND + MCScanX) cached by content, for incremental runs.
+
+Every pair of synteny species is compared on its own instead of in one
+all-vs-all run, and each piece is stored under the hashes of the prepared
+inputs (07.synteny/<sp>/pep.longest.fa and genes.longest.bed, one isoform per
+gene from gene_dict.py longest), so adding a species only computes the pairs
+that involve it:
+
+  <cache>/db/<sp>.<h16>.dmnd                    DIAMOND db of one proteome
+  <cache>/hits/<h[:2]>/<h>.tsv.gz               A -> B blastp hits (ordered pair)
+                                                h = sha1(A, pepA, B, pepB, evalue, max_target_seqs, diamond)
+  <cache>/collinearity/<h[:2]>/<h>.collinearity MCScanX on A -> B plus B -> A hits
+                                                h = sha1(both hit keys, bedA, bedB, MCScanX)
+
+Genes are written as '<species>|<id>' and chromosomes as '<species>|<chr>' so
+pairs never collide; the published per-pair files drop the prefix of the target
+species, so target IDs match final_family_members.list. Writes are atomic
+(temp file + rename), so concurrent jobs and projects can share the cache.
+
+Subcommands:
+  pair   one species pair -> <a>__<b>.collinearity + <a>__<b>.gff (MCScanX gene order)
+  merge  per-pair results -> one renumbered .collinearity, one .gff, pairs summary
+"""
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from batch_journal import content_hash, file_hash
+from compress_io import xopen
+from pair_memo import tool_id
+from parse_mcscanx_collinearity_to_pairs import ALN_RE
+import profiling
+
+HIT_FIELDS = "qseqid sseqid pident length mismatch gapopen qstart qend sstart send evalue bitscore".split()
+
+
+def cache_path(root, kind, key, suffix):
+    return os.path.join(root, kind, key[:2], key + suffix)
+
+
+def atomic_copy(src, dst):
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    tmp = f"{dst}.{os.getpid()}.tmp"
+    shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+def write_prefixed_pep(pep, sp, out):
+    n = 0
+    with xopen(pep) as f, open(out, "w") as w:
+        for line in f:
+            if line.startswith(">"):
+                name = line[1:].split()[0] if line[1:].strip() else ""
+                w.write(f">{sp}|{name}\n")
+                n += 1
+            else:
+                w.write(line)
+    return n
+
+
+def mcscanx_gff(bed, sp):
+    """genes.bed (chr start end id ...) -> MCScanX gff lines (chr id start end), prefixed"""
+    rows = []
+    with xopen(bed) as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            a = line.rstrip("\n").split("\t")
+            if len(a) >= 4:
+                rows.append(f"{sp}|{a[0]}\t{sp}|{a[3]}\t{int(a[1]) + 1}\t{a[2]}\n")
+    return rows
+
+
+class PairCache:
+    def __init__(self, root, diamond, mcscanx, evalue, max_target_seqs, threads):
+        self.root = root
+        self.diamond, self.mcscanx = diamond, mcscanx
+        self.evalue, self.mts, self.threads = str(evalue), str(max_target_seqs), threads
+        self.stats = []
+
+    def db(self, sp, pep, pep_hash, tmp):
+        path = os.path.join(self.root, "db", f"{sp}.{pep_hash[:16]}.dmnd")
+        if os.path.exists(path):
+            return path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fa = os.path.join(tmp, f"{sp}.db.fa")
+        write_prefixed_pep(pep, sp, fa)
+        part = f"{path[:-5]}.{os.getpid()}.tmp"
+        subprocess.run([self.diamond, "makedb", "--in", fa, "-d", part, "--quiet"], check=True)
+        os.replace(part + ".dmnd", path)
+        return path
+
+    def hits(self, a, b, tmp):
+        """cached A -> B hits; a / b are (species, pep, pep_hash)."""
+        key = content_hash("hits", a[0], a[2], b[0], b[2], self.evalue, self.mts, tool_id(self.diamond))
+        path = cache_path(self.root, "hits", key, ".tsv.gz")
+        if os.path.exists(path):
+            self.stats.append(f"hits {a[0]}->{b[0]} cached")
+            return key, path
+        db = self.db(b[0], b[1], b[2], tmp)
+        q = os.path.join(tmp, f"{a[0]}.query.fa")
+        if not os.path.exists(q):
+            write_prefixed_pep(a[1], a[0], q)
+        raw = os.path.join(tmp, f"{a[0]}__{b[0]}.tsv")
+        subprocess.run([self.diamond, "blastp", "-q", q, "-d", db, "-o", raw, "-f", "6", *HIT_FIELDS,
+                        "-e", self.evalue, "--max-target-seqs", self.mts, "--threads", str(self.threads),
+                        "--quiet"], check=True)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        part = f"{path}.{os.getpid()}.tmp.gz"
+        with open(raw) as f, xopen(part, "wt") as w:
+            shutil.copyfileobj(f, w)
+        os.replace(part, path)
+        self.stats.append(f"hits {a[0]}->{b[0]} computed")
+        return key, path
+
+    def collinearity(self, a, b, tmp):
+        """a / b are (species, pep, bed); returns the cached prefixed .collinearity."""
+        ha, hb = file_hash(a[1]), file_hash(b[1])
+        pa, pb = (a[0], a[1], ha), (b[0], b[1], hb)
+        keys, hit_files = [], []
+        for q, s in ((pa, pb), (pb, pa)) if a[0] != b[0] else ((pa, pa),):
+            k, fp = self.hits(q, s, tmp)
+            keys.append(k)
+            hit_files.append(fp)
+        key = content_hash("collinearity", *keys, a[0], file_hash(a[2]), b[0], file_hash(b[2]),
+                           tool_id(self.mcscanx))
+        path = cache_path(self.root, "collinearity", key, ".collinearity")
+        if os.path.exists(path):
+            self.stats.append("collinearity cached")
+            return path
+        prefix = os.path.join(tmp, "pair")
+        with open(prefix + ".gff", "w") as w:
+            w.writelines(mcscanx_gff(a[2], a[0]))
+            if b[0] != a[0]:
+                w.writelines(mcscanx_gff(b[2], b[0]))
+        with open(prefix + ".blast", "w") as w:
+            for fp in hit_files:
+                with xopen(fp) as f:
+                    shutil.copyfileobj(f, w)
+        subprocess.run([self.mcscanx, prefix], check=True, stdout=subprocess.DEVNULL)
+        atomic_copy(prefix + ".collinearity", path)
+        self.stats.append("collinearity computed")
+        return path
+
+
+def localizer(target):
+    """drop '<target>|' from gene / chromosome names (also inside 'chrA&chrB')."""
+    if not target:
+        return lambda s: s
+    pat = re.compile(rf"(^|[\s&]){re.escape(target)}\|")
+    return lambda s: pat.sub(r"\1", s)
+
+
+def run_pair(args):
+    if args.sp_a == args.sp_b and (args.pep_b != args.pep_a or args.bed_b != args.bed_a):
+        raise SystemExit(f"[ERROR] self pair {args.sp_a} needs the same pep/bed on both sides")
+    pc = PairCache(args.cache, args.diamond, args.mcscanx, args.evalue, args.max_target_seqs, args.threads)
+    loc = localizer(args.target)
+    with tempfile.TemporaryDirectory(prefix="pair_synteny.", dir=args.tmpdir or None) as tmp:
+        with profiling.phase("pair") as ph:
+            col = pc.collinearity((args.sp_a, args.pep_a, args.bed_a), (args.sp_b, args.pep_b, args.bed_b), tmp)
+            ph.records = 1
+    os.makedirs(os.path.dirname(os.path.abspath(args.out_col)), exist_ok=True)
+    with xopen(col) as f, open(args.out_col + ".tmp", "w") as w:
+        for line in f:
+            w.write(loc(line))
+    os.replace(args.out_col + ".tmp", args.out_col)
+    gff = mcscanx_gff(args.bed_a, args.sp_a) + (mcscanx_gff(args.bed_b, args.sp_b) if args.sp_b != args.sp_a else [])
+    with open(args.out_gff, "w") as w:
+        w.writelines(loc(x) for x in gff)
+    print(f"[INFO] {args.sp_a}__{args.sp_b}: " + ", ".join(pc.stats), file=sys.stderr)
+
+
+def pair_name(fp):
+    base = os.path.basename(fp)
+    return base[: -len(".collinearity")] if base.endswith(".collinearity") else base
+
+
+def run_merge(args):
+    """renumber the alignments of all pairs into one MCScanX-style .collinearity."""
+    n_blk = 0
+    summary = []
+    with open(args.out_col, "w") as w:
+        w.write(f"############### pairwise synteny: {len(args.col)} species pairs\n")
+        for fp in args.col:
+            pair = pair_name(fp)
+            w.write(f"# pair={pair}\n")
+            nb = na = 0
+            with xopen(fp) as f:
+                for line in f:
+                    st = line.strip()
+                    if st.startswith("#"):
+                        m = ALN_RE.match(st)
+                        if m:
+                            # "## Alignment N:" -> 全局编号
+                            line = line.replace(f"Alignment {m.group(1)}:", f"Alignment {n_blk}:", 1)
+                            n_blk += 1
+                            nb += 1
+                            w.write(line)
+                        continue
+                    if st:
+                        # "  0-  1:\tgA\tgB\t1e-50" 里的块号跟着改
+                        line = re.sub(r"^\s*\d+-", f"{n_blk - 1:>3}-", line, count=1)
+                        na += 1
+                        w.write(line)
+            summary.append((pair, nb, na))
+    seen = set()
+    with open(args.out_gff, "w") as w:
+        for fp in args.gff:
+            with xopen(fp) as f:
+                for line in f:
+                    a = line.split("\t", 2)
+                    if len(a) > 1 and a[1] not in seen:
+                        seen.add(a[1])
+                        w.write(line)
+    if args.out_summary:
+        with open(args.out_summary, "w") as w:
+            w.write("pair\tspecies_a\tspecies_b\tblocks\tanchors\n")
+            for pair, nb, na in summary:
+                sa, _, sb = pair.partition("__")
+                w.write(f"{pair}\t{sa}\t{sb}\t{nb}\t{na}\n")
+    print(f"[INFO] {len(summary)} species pairs, {n_blk} blocks, {len(seen)} genes", file=sys.stderr)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("pair", help="one species pair, served from the cache when the inputs are unchanged")
+    for s in ("a", "b"):
+        p.add_argument(f"--sp_{s}", required=True)
+        p.add_argument(f"--pep_{s}", required=True)
+        p.add_argument(f"--bed_{s}", required=True)
+    p.add_argument("--cache", required=True)
+    p.add_argument("--target", default="", help="species whose '<sp>|' prefix is dropped in the outputs")
+    p.add_argument("--diamond", default="diamond")
+    p.add_argument("--mcscanx", default="MCScanX")
+    p.add_argument("--evalue", default="1e-5")
+    p.add_argument("--max_target_seqs", default="5")
+    p.add_argument("--threads", type=int, default=4)
+    p.add_argument("--tmpdir", default="")
+    p.add_argument("--out_col", required=True)
+    p.add_argument("--out_gff", required=True)
+    m = sub.add_parser("merge", help="all pairs -> one .collinearity / .gff")
+    m.add_argument("--col", nargs="+", required=True)
+    m.add_argument("--gff", nargs="+", required=True)
+    m.add_argument("--out_col", required=True)
+    m.add_argument("--out_gff", required=True)
+    m.add_argument("--out_summary", default="")
+    args = ap.parse_args()
+
+    if args.cmd == "pair":
+        run_pair(args)
+    else:
+        run_merge(args)
+
+
+if __name__ == "__main__":
+    profiling.run(main)
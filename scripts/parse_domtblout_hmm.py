@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
 import argparse
+from compress_io import xopen
+import profiling
 
 def main():
     ap=argparse.ArgumentParser()
@@ -8,7 +10,7 @@ def main():
     args=ap.parse_args()
 
     hits=set()
-    with open(args.domtbl) as f:
+    with xopen(args.domtbl) as f:
         for line in f:
             if line.startswith("#"):
                 continue
@@ -22,4 +24,4 @@ def main():
             o.write(x+"\n")
 
 if __name__=="__main__":
-    main()
+    profiling.run(main)
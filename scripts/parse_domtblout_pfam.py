@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
 import argparse
+from compress_io import xopen
+import profiling
 
 def main():
     ap=argparse.ArgumentParser()
@@ -11,7 +13,7 @@ def main():
     want=set([x.strip() for x in args.pfam_ids.split(",") if x.strip()])
     hits=set()
 
-    with open(args.domtbl) as f:
+    with xopen(args.domtbl) as f:
         for line in f:
             if line.startswith("#"):
                 continue
@@ -29,4 +31,4 @@ def main():
             o.write(x+"\n")
 
 if __name__=="__main__":
-    main()
+    profiling.run(main)
@@ -1,31 +1,24 @@
 #!/usr/bin/env python3
 import argparse
 import re
+from compress_io import xopen
+import profiling
 
 
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--collinearity", required=True)
-    ap.add_argument("--out", required=True)
-    ap.add_argument(
-        "--min_block_hits",
-        type=int,
-        default=5,
-        help="Only keep blocks with >= this many hits/anchors (rough filter).",
-    )
-    args = ap.parse_args()
+# MCScanX .collinearity typical structure:
+# ## Alignment 1: score=... e_value=... N=23
+#  0-  0:   geneA   geneB   evalue
+#  0-  1:   geneA   geneB   evalue
+# (blank line)
+ALN_RE = re.compile(r"^##\s*Alignment\s+(\d+).*\bN=(\d+)\b", re.I)
 
-    # MCScanX .collinearity typical structure:
-    # ## Alignment 1: score=... e_value=... N=23
-    #  0-  0:   geneA   geneB   evalue
-    #  0-  1:   geneA   geneB   evalue
-    # (blank line)
-    aln_re = re.compile(r"^##\s*Alignment\s+\d+.*\bN=(\d+)\b", re.I)
 
-    pairs = []
+def iter_anchors(collinearity, min_block_hits=5):
+    """(geneA, geneB, block_id) for every anchor of blocks with >= min_block_hits anchors."""
     keep_block = False
+    block_id = "NA"
 
-    with open(args.collinearity) as f:
+    with xopen(collinearity) as f:
         for line in f:
             line = line.strip()
             if not line:
@@ -34,10 +27,11 @@ def main():
 
             # comment lines
             if line.startswith("#"):
-                m = aln_re.match(line)
+                m = ALN_RE.match(line)
                 if m:
-                    n = int(m.group(1))
-                    keep_block = n >= args.min_block_hits
+                    block_id = m.group(1)
+                    n = int(m.group(2))
+                    keep_block = n >= min_block_hits
                 continue
 
             if not keep_block:
@@ -60,23 +54,39 @@ def main():
             if g1 == g2:
                 continue
 
-            pairs.append((g1, g2))
+            yield g1, g2, block_id
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--collinearity", required=True)
+    ap.add_argument("--out", required=True)
+    ap.add_argument(
+        "--min_block_hits",
+        type=int,
+        default=5,
+        help="Only keep blocks with >= this many hits/anchors (rough filter).",
+    )
+    args = ap.parse_args()
+
+    pairs = list(iter_anchors(args.collinearity, args.min_block_hits))
 
     # de-duplicate: same pair can appear multiple times
     seen = set()
     uniq = []
-    for a, b in pairs:
+    for a, b, blk in pairs:
         key = (a, b) if a < b else (b, a)
         if key in seen:
             continue
         seen.add(key)
-        uniq.append((a, b))
+        uniq.append((a, b, blk))
 
+    # block_id: MCScanX "## Alignment <id>"，供 kaks_store.py 入库
     with open(args.out, "w") as w:
-        w.write("geneA\tgeneB\ttype\n")
-        for a, b in uniq:
-            w.write(f"{a}\t{b}\tsyntenic\n")
+        w.write("geneA\tgeneB\ttype\tblock_id\n")
+        for a, b, blk in uniq:
+            w.write(f"{a}\t{b}\tsyntenic\t{blk}\n")
 
 
 if __name__ == "__main__":
-    main()
+    profiling.run(main)
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 import argparse, re
 from Bio import SeqIO
+from compress_io import xopen
+import profiling
 
 def parse_args():
     ap = argparse.ArgumentParser()
@@ -12,7 +14,7 @@ def parse_args():
 
 def read_lengths(pep_fa):
     lens = {}
-    for r in SeqIO.parse(pep_fa, "fasta"):
+    for r in SeqIO.parse(xopen(pep_fa), "fasta"):
         seq = str(r.seq).replace("*", "")
         rid = r.id.split()[0]
         if seq:
@@ -40,16 +42,8 @@ def parse_int_any(s: str):
     m = re.search(r"[-+]?\d+", s)
     return int(m.group(0)) if m else None
 
-def main():
-    args = parse_args()
-    lens = read_lengths(args.pep)
-
-    # 输出蛋白长度
-    with open(args.out_lens, "w") as o:
-        o.write("seq_id\tlength\n")
-        for k in sorted(lens.keys()):
-            o.write(f"{k}\t{lens[k]}\n")
-
+def parse_meme(meme_txt, lens):
+    """MEME sites tables -> {(seq_id, motif, motif_id, start, end)} within the protein lengths."""
     motif_width = {}   # motif_id(num str) -> width int
     hits = set()       # 用 set 去重 (seq_id, motif, start, end)
 
@@ -57,7 +51,7 @@ def main():
     curr_motif = None
     start_col = None   # start 列索引（从 0 开始）
 
-    with open(args.meme_txt, "r", errors="ignore") as f:
+    with xopen(meme_txt, errors="ignore") as f:
         for line in f:
             s = line.rstrip("\n")
 
@@ -150,12 +144,29 @@ def main():
 
             motif_name = f"Motif{curr_motif}"
             hits.add((seq_id, motif_name, int(curr_motif), start, end))
+    return hits
+
+def main():
+    args = parse_args()
+    with profiling.phase("parse_pep") as ph:
+        lens = read_lengths(args.pep)
+        ph.records = len(lens)
+
+    # 输出蛋白长度
+    with open(args.out_lens, "w") as o:
+        o.write("seq_id\tlength\n")
+        for k in sorted(lens.keys()):
+            o.write(f"{k}\t{lens[k]}\n")
+
+    with profiling.phase("parse_meme") as ph:
+        hits = parse_meme(args.meme_txt, lens)
+        ph.records = len(hits)
 
     # 输出 hits（按 seq_id 再按 motif_id 再按 start 排序）
-    with open(args.out_hits, "w") as o:
+    with profiling.phase("write", len(hits)), open(args.out_hits, "w") as o:
         o.write("seq_id\tmotif\tmotif_id\tstart\tend\n")
         for seq_id, motif_name, motif_id, start, end in sorted(hits, key=lambda x: (x[0], x[2], x[3], x[4])):
             o.write(f"{seq_id}\t{motif_name}\t{motif_id}\t{start}\t{end}\n")
 
 if __name__ == "__main__":
-    main()
+    profiling.run(main)
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Cost plan for a configured run (`plantfamilyallin plan`), before anything runs.
+
+Sizes are counted cheaply from the inputs: genome length (.fai, else file size),
+gene / transcript counts (byte-level scan of the GFF), model proteins, and the
+expected family size (an existing final_family_members.list, --family_size, or
+the model protein count as a first guess). Each stage has a scaling model
+
+    cpu_seconds = sec * units ** power        peak_mem_mb = mem0 + mem1 * units
+
+whose units follow the work the rule really does (proteins x models for
+DIAMOND, members^2 for MEME, pairs for Ka/Ks, proteome^2 for self-comparisons).
+The default constants are rough single-core figures for current x86 nodes;
+--calibration JSON ({"stage": {"sec": .., "power": .., "mem0": .., "mem1": ..}})
+replaces them with numbers measured on your own runs.
+
+Printed: per-stage jobs / CPU-hours / wall-hours / peak memory, the critical
+path through the module DAG, and warnings for settings that grow quadratically.
+"""
+import argparse
+import json
+import os
+import sys
+
+from compress_io import sniff, xopen
+from preflight import load_config
+import profiling
+
+# stage: (units key, sec, power, mem0 MB, mem1 MB/unit, threads key, predecessors)
+MODEL = {
+    "genome_2bit":      ("genome_mb",      0.6,   1.0,  200, 0.3,   "one",     []),
+    "agat_clean_gff":   ("transcripts",    0.004, 1.0,  800, 0.05,  "one",     []),
+    "gene_dict":        ("dict_transcripts", 2e-5, 1.0, 200, 0.002, "one",     ["agat_clean_gff"]),
+    "chr_tracks":       ("target_mb",      0.02,  1.0,  300, 0.0,   "threads", ["genome_2bit", "gene_dict"]),
+    "extract_cds_pep":  ("transcripts",    0.0008, 1.0, 300, 0.01,  "one",     ["genome_2bit", "agat_clean_gff"]),
+    "diamond_blast":    ("prot_x_model",   2e-6,  1.0, 1500, 0.0,   "threads", ["extract_cds_pep"]),
+    "pfam_scan":        ("proteins",       0.08,  1.0,  600, 0.0,   "threads", ["extract_cds_pep"]),
+    "hmm_search":       ("proteins",       0.002, 1.0,  300, 0.0,   "threads", ["extract_cds_pep"]),
+    "multi_species":    ("ms_prot_x_model", 2.5e-6, 1.0, 1500, 0.0, "threads", ["extract_cds_pep", "gene_dict"]),
+    "final_members":    ("members",        0.01,  1.0,  200, 0.0,   "one",     ["diamond_blast", "pfam_scan", "hmm_search"]),
+    "meme":             ("members",        0.05,  2.0,  300, 0.5,   "one",     ["final_members"]),
+    "motif_rescan":     ("proteins",       0.004, 1.0,  400, 0.002, "threads", ["meme"]),
+    "phylogeny":        ("tree_taxa",      0.6,   1.6,  300, 2.0,   "threads", ["final_members"]),
+    "kaks_family":      ("family_pairs",   1.2,   1.0,  300, 0.0,   "kaks",    ["final_members"]),
+    "kaks_window":      ("family_pairs",   0.002, 1.0,  300, 0.0,   "threads", ["kaks_family"]),
+    "syk_self_blast":   ("proteome_sq",    1.5e-8, 1.0, 2000, 0.0,  "threads", ["extract_cds_pep"]),
+    "syk_mcscanx":      ("proteins",       0.002, 1.0,  500, 0.02,  "one",     ["syk_self_blast"]),
+    "syk_kaks":         ("syn_pairs",      0.8,   1.0,  300, 0.0,   "kaks",    ["syk_mcscanx"]),
+    "ks_peaks":         ("syn_pairs",      4e-5,  1.0,  300, 0.002, "one",     ["syk_kaks", "kaks_family"]),
+    "genespace":        ("species_pairs_sq", 2.5e-8, 1.0, 4000, 0.0, "threads", ["extract_cds_pep"]),
+    "synteny_pairs":    ("pairwise_sq",    2.5e-8, 1.0, 2000, 0.0,  "threads", ["extract_cds_pep"]),
+    "codon_usage":      ("proteins",       5e-5,  1.0,  300, 0.01,  "one",     ["extract_cds_pep", "final_members"]),
+}
+# 超过这些规模就提示
+LIMITS = {"family_pairs": 20000, "syn_pairs": 200000, "members": 400, "tree_taxa": 1000, "species": 6}
+
+
+def truthy(v):
+    return str(v).strip().lower() in ("1", "true", "yes", "y")
+
+
+def genome_mb(fp):
+    fai = fp + ".fai"
+    if os.path.exists(fai):
+        with open(fai) as f:
+            return sum(int(line.split("\t")[1]) for line in f if line.strip()) / 1e6
+    size = os.path.getsize(fp)
+    # 压缩基因组按 ~3.5 倍估计
+    return size * (3.5 if sniff(fp) != "plain" else 1.0) / 1e6
+
+
+def count_gff(fp):
+    """(genes, transcripts) by counting feature-type columns."""
+    pats = {"gene": b"\tgene\t", "mRNA": b"\tmRNA\t", "transcript": b"\ttranscript\t"}
+    n = dict.fromkeys(pats, 0)
+    if sniff(fp) == "plain":
+        tail = b""
+        with open(fp, "rb") as f:
+            while True:
+                buf = f.read(1 << 24)
+                if not buf:
+                    break
+                buf = tail + buf
+                cut = buf.rfind(b"\n") + 1
+                for k, p in pats.items():
+                    n[k] += buf.count(p, 0, cut)
+                tail = buf[cut:]
+    else:
+        with xopen(fp, errors="ignore") as f:
+            for line in f:
+                a = line.split("\t", 3)
+                if len(a) > 2 and a[2] in n:
+                    n[a[2]] += 1
+    return n["gene"], n["mRNA"] or n["transcript"]
+
+
+def count_fasta(fp):
+    with xopen(fp, errors="ignore") as f:
+        return sum(1 for line in f if line.startswith(">"))
+
+
+def count_list(fp):
+    with open(fp) as f:
+        return sum(1 for line in f if line.strip())
+
+
+def species_sizes(cfg):
+    t = cfg.get("target") or {}
+    out = [(t.get("name", "target"), t.get("genome_fa"), t.get("gff3"))]
+    for sp in cfg.get("synteny_species") or []:
+        out.append((sp.get("name"), sp.get("genome_fa"), sp.get("gff3")))
+    sizes = []
+    for name, fa, gff in out:
+        mb = genome_mb(fa) if fa and os.path.exists(fa) else float("nan")
+        genes, tx = count_gff(gff) if gff and os.path.exists(gff) else (0, 0)
+        sizes.append({"name": name, "genome_mb": mb, "genes": genes or tx, "transcripts": tx or genes})
+    return sizes
+
+
+def plan(cfg, family_size=0, calibration=None, cores=0):
+    model = {k: list(v) for k, v in MODEL.items()}
+    for k, v in (calibration or {}).items():
+        if k in model:
+            for i, key in ((1, "sec"), (2, "power"), (3, "mem0"), (4, "mem1")):
+                if key in v:
+                    model[k][i] = float(v[key])
+
+    threads = int(cfg.get("threads", 10))
+    cores = cores or threads
+    kaks_on = truthy((cfg.get("kaks") or {}).get("enable", True))
+    syk_on = kaks_on and truthy((cfg.get("syntenic_kaks") or {}).get("enable", True))
+    gs_on = truthy((cfg.get("synteny") or {}).get("enable_genespace", True))
+    pw_on = truthy((cfg.get("synteny") or {}).get("pairwise", False))
+    pw_self = truthy((cfg.get("synteny") or {}).get("pairwise_self", False))
+    mr_on = truthy((cfg.get("motif_rescan") or {}).get("enable", False))
+    cu_on = truthy((cfg.get("codon_usage") or {}).get("enable", False))
+    ms_on = truthy((cfg.get("multi_species") or {}).get("enable", False))
+    win_on = kaks_on and int((cfg.get("kaks") or {}).get("window_width", 0) or 0) > 0
+    ct_on = truthy((cfg.get("chr_map") or {}).get("tracks", True))
+
+    sizes = species_sizes(cfg)
+    tgt = sizes[0]
+    mp = cfg.get("model_family_pep")
+    n_model = count_fasta(mp) if mp and os.path.exists(mp) else 0
+    members_fp = os.path.join(cfg.get("outdir", "results"), "02.family_id", "final_family_members.list")
+    if family_size:
+        members, how = family_size, "--family_size"
+    elif os.path.exists(members_fp):
+        members, how = count_list(members_fp), members_fp
+    else:
+        members, how = max(n_model, 1), "model protein count (guess; pass --family_size)"
+
+    proteins = tgt["genes"]
+    n_sp = len(sizes)
+    all_prot = [s["genes"] for s in sizes]
+    sp_pairs_sq = sum(all_prot[i] * all_prot[j] for i in range(n_sp) for j in range(i, n_sp))
+    # 物种对两个方向各跑一次 DIAMOND；已缓存的物种对不计入时会更少
+    pw_sq = 2 * sum(all_prot[i] * all_prot[j] for i in range(n_sp) for j in range(i if pw_self else i + 1, n_sp))
+    ms_on = ms_on and n_sp > 1
+    # 目标物种的基因字典总会建；其他物种只在 multi_species / 物种对共线性读它们时才建
+    dict_sp = sizes if ms_on or (pw_on and pw_sq > 0) else sizes[:1]
+    units = {
+        "genome_mb": None, "transcripts": None,            # per species
+        "target_mb": tgt["genome_mb"] if tgt["genome_mb"] == tgt["genome_mb"] else 0.0,
+        "dict_transcripts": sum(s["transcripts"] for s in dict_sp),
+        "proteins": proteins,
+        "prot_x_model": proteins * max(n_model, 1) * 300,  # ~300 aa per model protein
+        "ms_prot_x_model": sum(all_prot) * max(n_model, 1) * 300,
+        "members": members,
+        "tree_taxa": members + n_model,
+        "family_pairs": members * (members - 1) // 2,
+        "proteome_sq": proteins * proteins,
+        "syn_pairs": int(proteins * 0.3),                   # 植物自身共线性锚点约占基因的 ~30%
+        "species_pairs_sq": sp_pairs_sq,
+        "pairwise_sq": pw_sq,
+    }
+    thr = {"one": 1, "threads": threads, "kaks": 6}
+
+    enabled = {k: True for k in model}
+    enabled.update({
+        "kaks_family": kaks_on, "syk_self_blast": syk_on, "syk_mcscanx": syk_on, "syk_kaks": syk_on,
+        "ks_peaks": syk_on, "genespace": gs_on and n_sp > 1, "synteny_pairs": pw_on and pw_sq > 0,
+        "motif_rescan": mr_on, "codon_usage": cu_on, "multi_species": ms_on, "kaks_window": win_on,
+        "chr_tracks": ct_on,
+    })
+
+    rows = {}
+    for st, (ukey, sec, power, mem0, mem1, tkey, _deps) in model.items():
+        if not enabled[st]:
+            continue
+        t = min(thr[tkey], cores)
+        if units[ukey] is None:
+            # 每个物种一个 job：并行跑，墙钟时间取最大的那个
+            per = [sec * (s[ukey] if s[ukey] == s[ukey] else 0) ** power for s in sizes]
+            mem = max(mem0 + mem1 * (s[ukey] if s[ukey] == s[ukey] else 0) for s in sizes)
+            cpu = sum(per)
+            wall = max(per) if n_sp <= cores else cpu / cores
+            jobs, u = n_sp, sum(s[ukey] for s in sizes if s[ukey] == s[ukey])
+        else:
+            u = units[ukey]
+            cpu = sec * u ** power
+            wall = cpu / t
+            mem = mem0 + mem1 * u
+            jobs = 1
+        rows[st] = {"jobs": jobs, "units": u, "unit": ukey, "cpu_h": cpu / 3600, "wall_h": wall / 3600,
+                    "mem_gb": mem / 1024, "threads": t}
+
+    # 关键路径：模块 DAG 上墙钟时间最长的链
+    finish, prev = {}, {}
+    for st in model:
+        if st not in rows:
+            continue
+        deps = [d for d in model[st][6] if d in rows]
+        best = max(deps, key=lambda d: finish[d]) if deps else None
+        finish[st] = rows[st]["wall_h"] + (finish[best] if best else 0.0)
+        prev[st] = best
+    end = max(finish, key=finish.get)
+    path = []
+    while end:
+        path.append(end)
+        end = prev[end]
+
+    warns = []
+    if units["family_pairs"] > LIMITS["family_pairs"] and kaks_on:
+        warns.append(f"{members} members -> {units['family_pairs']:,} Ka/Ks pairs (grows with members^2); "
+                     f"consider restricting pairs (dup_types.tsv / per-subfamily runs)")
+    if members > LIMITS["members"]:
+        warns.append(f"MEME on {members} sequences scales ~ n^2")
+    if units["tree_taxa"] > LIMITS["tree_taxa"]:
+        warns.append(f"tree with {units['tree_taxa']} taxa: IQ-TREE ModelFinder + {cfg.get('phylo', {}).get('bootstrap', 1000)} UFBoot is long")
+    if n_sp > LIMITS["species"] and gs_on:
+        warns.append(f"GENESPACE over {n_sp} genomes runs {n_sp * (n_sp + 1) // 2} all-vs-all protein comparisons"
+                     + ("" if pw_on else "; synteny.pairwise caches them per species pair"))
+    if syk_on and proteins > 60000:
+        warns.append(f"syntenic_kaks self-DIAMOND over {proteins:,} proteins (proteome^2)")
+    return {"sizes": sizes, "members": members, "members_from": how, "n_model": n_model,
+            "stages": rows, "critical_path": path[::-1], "critical_h": finish[path[0]] if path else 0,
+            "cores": cores, "warnings": warns}
+
+
+def print_plan(p, out=sys.stdout):
+    w = out.write
+    w("species\tgenome_Mb\tgenes\ttranscripts\n")
+    for s in p["sizes"]:
+        w(f"{s['name']}\t{s['genome_mb']:.1f}\t{s['genes']}\t{s['transcripts']}\n")
+    w(f"\nfamily size: {p['members']} ({p['members_from']}); model proteins: {p['n_model']}\n\n")
+    w("stage\tjobs\tunits\tthreads\tcpu_h\twall_h\tpeak_mem_GB\n")
+    tot = 0.0
+    for st, r in p["stages"].items():
+        tot += r["cpu_h"]
+        u = f"{r['units']:.2f}" if isinstance(r["units"], float) and r["units"] < 10 else f"{r['units']:,.0f}"
+        w(f"{st}\t{r['jobs']}\t{u} {r['unit']}\t{r['threads']}\t{r['cpu_h']:.2f}\t"
+          f"{r['wall_h']:.2f}\t{r['mem_gb']:.1f}\n")
+    w(f"\ntotal CPU-hours: {tot:.1f} on {p['cores']} cores\n")
+    w(f"critical path ({p['critical_h']:.1f} h): " + " -> ".join(p["critical_path"]) + "\n")
+    for msg in p["warnings"]:
+        w(f"[WARN] {msg}\n")
+
+
+def main(argv=None, prog=None):
+    ap = argparse.ArgumentParser(
+        prog=prog, description="estimate jobs, CPU-hours, wall time and peak memory of a configured run")
+    ap.add_argument("-c", "--configfile", required=True)
+    ap.add_argument("--family_size", type=int, default=0, help="expected family members in the target")
+    ap.add_argument("--cores", type=int, default=0, help="cores available (default: config threads)")
+    ap.add_argument("--calibration", default="", help="JSON with per-stage sec/power/mem0/mem1")
+    ap.add_argument("--json", default="", help="also write the plan as JSON")
+    args = ap.parse_args(argv)
+
+    cfg = load_config(args.configfile)
+    cal = {}
+    if args.calibration:
+        with open(args.calibration) as f:
+            cal = json.load(f)
+    p = plan(cfg, args.family_size, cal, args.cores)
+    print_plan(p)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(p, f, indent=1)
+
+
+if __name__ == "__main__":
+    profiling.run(main)
@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+"""
+Preflight checks run before the DAG (`plantfamilyallin check`).
+
+  config    known keys / types / allowed values (typos are reported with the
+            closest known key), required input files present
+  tools     every tool the Snakefile resolves through tool("name", default),
+            overridden by config["tools"], looked up once on PATH; tools of
+            disabled modules are only warnings
+  inputs    GFF and FASTA are stream-sampled (--max_lines per GFF):
+              - GFF seqids exist in the genome (.fai when present, else headers)
+              - CDS Parent ids point at mRNA/transcript ids
+              - transcript ids carry no whitespace or '|' (Target|/Model| prefixes,
+                species|id in multi_species) and group into genes by the
+                longest-isoform rule
+              - model_family_pep is protein, has unique ids, no reserved prefixes
+            Pfam: file present and hmmpress index (.h3f/.h3i/.h3m/.h3p) present
+            or the directory writable so the pipeline can press it
+
+Every finding is printed as [OK] / [WARN] / [ERROR]; exit status 1 on errors.
+"""
+import argparse
+import difflib
+import os
+import re
+import shutil
+import sys
+
+from compress_io import sniff, xopen
+import profiling
+
+STRATEGIES = ("intersection", "union", "blast_and_domain")
+RESERVED_PREFIXES = ("Target|", "Model|")
+
+# key -> (type, required); nested dicts are sections checked by SECTIONS
+TOP = {
+    "project": (str, False),
+    "family_name": (str, True),
+    "target": (dict, True),
+    "model_family_pep": (str, True),
+    "pfam_hmm": (str, True),
+    "pfam_domains_of_interest": (list, True),
+    "family_hmm": (str, False),
+    "final_strategy": (str, False),
+    "blast": (dict, False),
+    "hmm": (dict, False),
+    "quick_screen": (dict, False),
+    "chr_map": (dict, False),
+    "meme": (dict, False),
+    "motif_rescan": (dict, False),
+    "promoter_len": (int, False),
+    "cis": (dict, False),
+    "multi_species": (dict, False),
+    "synteny_species": (list, False),
+    "synteny": (dict, False),
+    "phylo": (dict, False),
+    "kaks": (dict, False),
+    "syntenic_kaks": (dict, False),
+    "codon_usage": (dict, False),
+    "wolfpsort": (dict, False),
+    "threads": (int, False),
+    "outdir": (str, False),
+    "cache_dir": (str, False),
+    "compress_intermediates": (bool, False),
+    "annotation_memo": (bool, False),
+    "profile": (dict, False),
+    "tools": (dict, False),
+    "runner": (dict, False),
+    "runner_env_prefix": (str, False),
+}
+# section -> {key: kind}; kind: "num" / "int" / "bool" / "str" / "path" / "list" / tuple(choices)
+SECTIONS = {
+    "target": {"name": "str", "genome_fa": "path", "gff3": "path"},
+    "blast": {"evalue": "num", "max_target_seqs": "int"},
+    "hmm": {"evalue": "num"},
+    "quick_screen": {"confirm": ("none", "diamond", "hmmer"), "top": "int", "min_shared": "int"},
+    "chr_map": {"tracks": "bool", "bin_size": "int"},
+    "meme": {"nmotifs": "int", "minw": "int", "maxw": "int", "mod": ("zoops", "oops", "anr")},
+    "motif_rescan": {"enable": "bool", "pvalue": "num", "min_motifs": "int", "require": "str", "meme_file": "str"},
+    "cis": {"enable_fimo": "bool", "motif_meme_file": "str", "fimo_pvalue": "num"},
+    "multi_species": {"enable": "bool"},
+    "synteny": {"enable_genespace": "bool", "block_flank": "int", "pairwise": "bool", "pairwise_self": "bool",
+                "diamond_evalue": "num", "diamond_max_target_seqs": "int"},
+    "phylo": {"enable_trim": "bool", "trimal_mode": ("automated1", "gappyout", "strict", "strictplus"),
+              "trimmer": ("native", "trimal"), "align_mode": ("add", "full"), "iqtree_model": "str",
+              "bootstrap": "int", "alrt": "int"},
+    "kaks": {"enable": "bool", "kaks_bin_dir": "str", "pal2nal": "str", "mafft": "str", "method": "str",
+             "timeout": "num", "retries": "int", "memo": "bool", "dup_proximal": "int",
+             "window_width": "int", "window_step": "int", "queue": "bool", "queue_dir": "str",
+             "queue_workers": "int", "queue_chunk": "int", "queue_lease_ttl": "num",
+             "min_ks": "num", "max_ks": "num", "max_kaks": "num"},
+    "syntenic_kaks": {"enable": "bool", "min_ks": "num", "max_ks": "num", "max_kaks": "num",
+                      "diamond_evalue": "num", "diamond_max_target_seqs": "int",
+                      "peak_max_k": "int", "peak_bootstrap": "int"},
+    "codon_usage": {"enable": "bool", "ref_genes": "str"},
+    "wolfpsort": {"enable": "bool", "cmd": "str", "organism": "str"},
+    "runner": {"env_prefix": "str"},
+    "profile": {"rules": "list"},
+}
+TOOL_RE = re.compile(r'^(\w+)\s*=\s*tool\(\s*"([^"]+)"\s*,\s*"([^"]+)"\s*\)', re.M)
+
+
+class Report:
+    def __init__(self):
+        self.n_err = 0
+        self.n_warn = 0
+
+    def ok(self, msg):
+        print(f"[OK]    {msg}")
+
+    def warn(self, msg):
+        self.n_warn += 1
+        print(f"[WARN]  {msg}")
+
+    def error(self, msg):
+        self.n_err += 1
+        print(f"[ERROR] {msg}")
+
+
+def truthy(v):
+    return str(v).strip().lower() in ("1", "true", "yes", "y")
+
+
+def check_kind(kind, v):
+    if isinstance(kind, tuple):
+        return str(v) in kind
+    if kind in ("str", "path"):
+        return isinstance(v, str)
+    if kind == "list":
+        return isinstance(v, list)
+    if kind == "bool":
+        return isinstance(v, bool) or str(v).strip().lower() in ("1", "0", "true", "false", "yes", "no", "y", "n")
+    try:
+        # PyYAML 把 1e-5 读成字符串，这里按数值解析
+        x = float(v)
+    except (TypeError, ValueError):
+        return False
+    return kind == "num" or x == int(x)
+
+
+def unknown_key(rep, where, key, known):
+    near = difflib.get_close_matches(key, list(known), n=1)
+    rep.warn(f"config: unknown key {where}{key}" + (f" (did you mean '{near[0]}'?)" if near else ""))
+
+
+def check_config(cfg, rep):
+    for key, (typ, required) in TOP.items():
+        if key not in cfg or cfg[key] in (None, ""):
+            if required:
+                rep.error(f"config: missing required key '{key}'")
+            continue
+        v = cfg[key]
+        if typ is int:
+            if not check_kind("int", v):
+                rep.error(f"config: {key} must be an integer (got {v!r})")
+        elif typ is bool:
+            if not check_kind("bool", v):
+                rep.error(f"config: {key} must be true/false (got {v!r})")
+        elif not isinstance(v, typ):
+            rep.error(f"config: {key} must be a {typ.__name__} (got {type(v).__name__})")
+    for key in cfg:
+        if key not in TOP:
+            unknown_key(rep, "", key, TOP)
+
+    for sec, spec in SECTIONS.items():
+        d = cfg.get(sec)
+        if not isinstance(d, dict):
+            continue
+        for k, v in d.items():
+            if k not in spec:
+                unknown_key(rep, f"{sec}.", k, spec)
+            elif v not in (None, "") and not check_kind(spec[k], v):
+                want = "one of " + "/".join(spec[k]) if isinstance(spec[k], tuple) else spec[k]
+                rep.error(f"config: {sec}.{k} should be {want} (got {v!r})")
+        if sec == "target":
+            for k in spec:
+                if k not in d:
+                    rep.error(f"config: missing target.{k}")
+
+    strat = str(cfg.get("final_strategy", "intersection"))
+    base, _, extra = strat.partition("+")
+    if base not in STRATEGIES or extra not in ("", "motif"):
+        rep.error(f"config: final_strategy '{strat}' not in {'/'.join(STRATEGIES)} (optionally +motif)")
+    elif extra and not (cfg.get("motif_rescan") or {}).get("meme_file"):
+        rep.error("config: final_strategy '+motif' needs motif_rescan.meme_file")
+
+    for pf in cfg.get("pfam_domains_of_interest") or []:
+        if not re.fullmatch(r"PF\d{5}(\.\d+)?", str(pf)):
+            rep.warn(f"config: pfam_domains_of_interest entry '{pf}' is not a PFxxxxx accession")
+
+    t = cfg.get("target") if isinstance(cfg.get("target"), dict) else {}
+    names = [t.get("name", "")]
+    for i, sp in enumerate(cfg.get("synteny_species") or []):
+        if not isinstance(sp, dict) or not {"name", "genome_fa", "gff3"} <= set(sp):
+            rep.error(f"config: synteny_species[{i}] needs name, genome_fa and gff3")
+            continue
+        names.append(sp["name"])
+    for n in names:
+        if n and not re.fullmatch(r"[A-Za-z0-9_.-]+", str(n)):
+            rep.error(f"config: species name '{n}' must match [A-Za-z0-9_.-]+ (used in paths and 'species|id')")
+    dup = {n for n in names if names.count(n) > 1}
+    if dup:
+        rep.error(f"config: duplicated species names: {', '.join(sorted(dup))}")
+    if rep.n_err == 0:
+        rep.ok("config: schema")
+
+
+def input_files(cfg):
+    """(label, path, required)"""
+    out = []
+    t = cfg.get("target") if isinstance(cfg.get("target"), dict) else {}
+    out += [("target.genome_fa", t.get("genome_fa"), True), ("target.gff3", t.get("gff3"), True)]
+    out += [("model_family_pep", cfg.get("model_family_pep"), True), ("pfam_hmm", cfg.get("pfam_hmm"), True)]
+    if cfg.get("family_hmm"):
+        out.append(("family_hmm", cfg["family_hmm"], True))
+    for sp in cfg.get("synteny_species") or []:
+        if isinstance(sp, dict):
+            out += [(f"{sp.get('name')}.genome_fa", sp.get("genome_fa"), True),
+                    (f"{sp.get('name')}.gff3", sp.get("gff3"), True)]
+    mr = cfg.get("motif_rescan") or {}
+    if mr.get("meme_file"):
+        out.append(("motif_rescan.meme_file", mr["meme_file"], True))
+    cis = cfg.get("cis") or {}
+    if truthy(cis.get("enable_fimo", False)):
+        out.append(("cis.motif_meme_file", cis.get("motif_meme_file"), True))
+    cu = cfg.get("codon_usage") or {}
+    if cu.get("ref_genes"):
+        out.append(("codon_usage.ref_genes", cu["ref_genes"], True))
+    return out
+
+
+def check_files(cfg, rep):
+    ok = True
+    for label, fp, required in input_files(cfg):
+        if not fp:
+            continue
+        if not os.path.isfile(fp):
+            (rep.error if required else rep.warn)(f"input: {label} not found: {fp}")
+            ok = False
+        elif os.path.getsize(fp) == 0:
+            rep.error(f"input: {label} is empty: {fp}")
+            ok = False
+    if ok:
+        rep.ok("input: all configured files present")
+
+
+def tool_requirements(cfg):
+    """tool name -> required? (False = only needed by a disabled module)"""
+    kaks = truthy((cfg.get("kaks") or {}).get("enable", True))
+    syk = truthy((cfg.get("syntenic_kaks") or {}).get("enable", True)) and kaks
+    gs = truthy((cfg.get("synteny") or {}).get("enable_genespace", True))
+    return {
+        "orthofinder": gs,
+        "MCScanX": gs or syk,
+        "trimal": (cfg.get("phylo") or {}).get("trimmer", "native") == "trimal",
+        "fimo": truthy((cfg.get("cis") or {}).get("enable_fimo", False)),
+    }
+
+
+def resolve(cmd, path):
+    if os.sep in cmd:
+        return cmd if os.path.isfile(cmd) and os.access(cmd, os.X_OK) else None
+    return shutil.which(cmd, path=path)
+
+
+def check_tools(cfg, snakefile, rep, path):
+    tools = {}
+    if snakefile and os.path.exists(snakefile):
+        with open(snakefile, encoding="utf-8") as f:
+            text = f.read()
+        # 只检查规则里真正用到的：变量在定义之外至少再出现一次
+        tools = {name: default for var, name, default in TOOL_RE.findall(text)
+                 if len(re.findall(rf"\b{var}\b", text)) > 1}
+    over = cfg.get("tools") or {}
+    tools.update({k: str(v) for k, v in over.items()})
+    need = tool_requirements(cfg)
+    missing = []
+    for name in sorted(tools):
+        cmd = over.get(name, tools[name])
+        if resolve(str(cmd), path):
+            continue
+        if need.get(name, True):
+            rep.error(f"tool: {name} -> '{cmd}' not found" + (" (config tools)" if name in over else " on PATH"))
+        else:
+            rep.warn(f"tool: {name} -> '{cmd}' not found (module disabled)")
+        missing.append(name)
+
+    kcfg = cfg.get("kaks") or {}
+    if truthy(kcfg.get("enable", True)):
+        root = os.path.join(os.path.dirname(os.path.abspath(snakefile or ".")), "resources", "KaKs_Calculator-3.0")
+        bindir = kcfg.get("kaks_bin_dir") or os.path.join(root, "bin")
+        for exe in ("KaKs", "AXTConvertor"):
+            fp = os.path.join(bindir, exe)
+            if not (os.path.isfile(fp) and os.access(fp, os.X_OK)):
+                rep.error(f"tool: {fp} not executable (kaks.kaks_bin_dir)")
+                missing.append(exe)
+        pal2nal = kcfg.get("pal2nal") or os.path.join(root, "pal2nal.pl")
+        if not os.path.isfile(pal2nal):
+            rep.error(f"tool: pal2nal not found: {pal2nal}")
+            missing.append("pal2nal")
+        if not shutil.which("perl", path=path):
+            rep.error("tool: perl not found on PATH (pal2nal.pl)")
+            missing.append("perl")
+    wcfg = cfg.get("wolfpsort") or {}
+    if truthy(wcfg.get("enable", False)) and not resolve(str(wcfg.get("cmd", "wolfpsort")), path):
+        rep.error(f"tool: wolfpsort cmd '{wcfg.get('cmd', 'wolfpsort')}' not found")
+        missing.append("wolfpsort")
+    if not missing:
+        rep.ok(f"tool: {len(tools)} tools resolved")
+
+
+def fasta_ids(fp):
+    """sequence ids: from .fai when present, else by streaming the headers."""
+    fai = fp + ".fai"
+    ids = []
+    if os.path.exists(fai) and os.path.getmtime(fai) >= os.path.getmtime(fp):
+        with open(fai) as f:
+            return [line.split("\t", 1)[0] for line in f if line.strip()], "fai"
+    if sniff(fp) == "plain":
+        # 非压缩文件按大块扫描 '>'，比逐行快得多
+        tail = b""
+        with open(fp, "rb") as f:
+            while True:
+                buf = f.read(1 << 24)
+                if not buf:
+                    break
+                buf = tail + buf
+                cut = buf.rfind(b"\n")
+                body, tail = (buf[:cut + 1], buf[cut + 1:]) if cut >= 0 else (b"", buf)
+                start = 0
+                while True:
+                    i = body.find(b">", start)
+                    if i < 0:
+                        break
+                    if i == 0 or body[i - 1:i] == b"\n":
+                        j = body.find(b"\n", i)
+                        ids.append(body[i + 1:j].split(None, 1)[0].decode(errors="replace") if j > i + 1 else "")
+                    start = i + 1
+        if tail.startswith(b">"):
+            ids.append(tail[1:].split(None, 1)[0].decode(errors="replace"))
+        return ids, "headers"
+    with xopen(fp, errors="ignore") as f:
+        for line in f:
+            if line.startswith(">"):
+                ids.append(line[1:].split(None, 1)[0] if line[1:].strip() else "")
+    return ids, "headers"
+
+
+def sample_gff(fp, max_lines):
+    seqids, mrna, parents = set(), {}, set()
+    n = 0
+    with xopen(fp, errors="ignore") as f:
+        for line in f:
+            if line.startswith("#"):
+                if line.startswith("##FASTA"):
+                    break
+                continue
+            a = line.rstrip("\n").split("\t")
+            if len(a) < 9:
+                continue
+            n += 1
+            seqids.add(a[0])
+            attrs = dict(kv.split("=", 1) for kv in a[8].split(";") if "=" in kv)
+            if a[2] in ("mRNA", "transcript") and "ID" in attrs:
+                mrna[attrs["ID"]] = attrs.get("Parent", attrs["ID"]).split(",")[0]
+            elif a[2] == "CDS" and "Parent" in attrs:
+                parents.update(attrs["Parent"].split(","))
+            if max_lines and n >= max_lines:
+                break
+    return seqids, mrna, parents, n
+
+
+def get_prefix(rid):
+    # 与 gff_longest_isoform.get_prefix 一致（此处不引入 Bio 依赖）
+    return rid.rsplit(".", 1)[0] if "." in rid else rid
+
+
+def check_species(label, genome, gff, rep, max_lines):
+    if not (genome and gff and os.path.isfile(genome) and os.path.isfile(gff)):
+        return
+    seqids, mrna, parents, n = sample_gff(gff, max_lines)
+    chroms, how = fasta_ids(genome)
+    missing = seqids - set(chroms)
+    if missing:
+        ex = ", ".join(sorted(missing)[:5])
+        rep.error(f"{label}: {len(missing)}/{len(seqids)} GFF seqids not in genome ({how}), e.g. {ex}")
+    else:
+        rep.ok(f"{label}: {len(seqids)} GFF seqids found in genome ({how}, {n} GFF lines sampled)")
+    if not parents:
+        rep.error(f"{label}: no CDS features with Parent= in the sampled GFF")
+        return
+    orphan = parents - mrna.keys()
+    if mrna and len(orphan) > 0.05 * len(parents):
+        rep.warn(f"{label}: {len(orphan)}/{len(parents)} CDS parents are not mRNA/transcript ids "
+                 f"(e.g. {next(iter(orphan))}); sequence ids follow the CDS Parent")
+    bad = [t for t in parents if re.search(r"[\s|]", t)]
+    if bad:
+        rep.error(f"{label}: {len(bad)} transcript ids contain whitespace or '|' (e.g. '{bad[0]}')")
+    groups = {get_prefix(t) for t in parents}
+    genes = {mrna[t] for t in parents if t in mrna}
+    if genes and len(groups) > 1.05 * len(genes):
+        rep.warn(f"{label}: {len(genes)} genes but {len(groups)} id prefixes before the last '.'; "
+                 f"isoforms will not be collapsed to the longest one (e.g. {sorted(parents)[0]})")
+    elif not bad:
+        rep.ok(f"{label}: {len(parents)} transcripts -> {len(groups)} genes (longest isoform grouping)")
+
+
+def check_model(fp, rep):
+    if not (fp and os.path.isfile(fp)):
+        return
+    ids, seq_chars = [], []
+    with xopen(fp, errors="ignore") as f:
+        for line in f:
+            if line.startswith(">"):
+                ids.append(line[1:].split(None, 1)[0] if line[1:].strip() else "")
+            elif len(seq_chars) < 20000:
+                seq_chars.extend(line.strip().upper())
+    if not ids:
+        rep.error(f"model_family_pep: no sequences in {fp}")
+        return
+    dup = len(ids) - len(set(ids))
+    if dup:
+        rep.error(f"model_family_pep: {dup} duplicated ids")
+    res = [i for i in ids if i.startswith(RESERVED_PREFIXES)]
+    if res:
+        rep.error(f"model_family_pep: ids already carry a Target|/Model| prefix (e.g. {res[0]})")
+    if seq_chars:
+        nt = sum(c in "ACGTUN" for c in seq_chars) / len(seq_chars)
+        if nt > 0.9:
+            rep.error(f"model_family_pep: looks like nucleotide sequence ({nt:.0%} ACGTUN)")
+    if not (dup or res):
+        rep.ok(f"model_family_pep: {len(ids)} proteins")
+
+
+def check_pfam(cfg, rep):
+    fp = cfg.get("pfam_hmm")
+    if not (fp and os.path.isfile(fp)):
+        return
+    with xopen(fp, errors="ignore") as f:
+        head = f.readline()
+    if not head.startswith("HMMER3"):
+        rep.error(f"pfam_hmm: {fp} is not a HMMER3 profile file")
+        return
+    idx = [fp + e for e in (".h3f", ".h3i", ".h3m", ".h3p")]
+    if all(os.path.exists(x) for x in idx):
+        rep.ok("pfam_hmm: hmmpress index present")
+    elif os.access(os.path.dirname(os.path.abspath(fp)), os.W_OK):
+        rep.warn("pfam_hmm: no hmmpress index; the pipeline will press it (needs time and disk)")
+    else:
+        rep.error("pfam_hmm: no hmmpress index and the directory is not writable")
+
+
+def run(cfg, snakefile="", max_lines=200000, path=None):
+    rep = Report()
+    check_config(cfg, rep)
+    check_files(cfg, rep)
+    check_tools(cfg, snakefile, rep, path)
+    t = cfg.get("target") if isinstance(cfg.get("target"), dict) else {}
+    check_species(t.get("name", "target"), t.get("genome_fa"), t.get("gff3"), rep, max_lines)
+    for sp in cfg.get("synteny_species") or []:
+        if isinstance(sp, dict):
+            check_species(sp.get("name"), sp.get("genome_fa"), sp.get("gff3"), rep, max_lines)
+    check_model(cfg.get("model_family_pep"), rep)
+    check_pfam(cfg, rep)
+    print(f"[check] {rep.n_err} error(s), {rep.n_warn} warning(s)")
+    return rep.n_err
+
+
+def load_config(fp):
+    import yaml
+    with open(fp, encoding="utf-8") as f:
+        cfg = yaml.safe_load(f)
+    if not isinstance(cfg, dict):
+        raise SystemExit(f"[ERROR] {fp}: not a YAML mapping")
+    return cfg
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-c", "--configfile", required=True)
+    ap.add_argument("--snakefile", default="", help="Snakefile whose tool() defaults are checked")
+    ap.add_argument("--max_lines", type=int, default=200000, help="GFF feature lines sampled per species (0 = all)")
+    args = ap.parse_args()
+    sys.exit(1 if run(load_config(args.configfile), args.snakefile, args.max_lines) else 0)
+
+
+if __name__ == "__main__":
+    profiling.run(main)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Merge the *.profile.json files of a run (profiling.py) into one report.
+
+  --out        per run: script output wall_s cpu_s max_rss_mb tracemalloc_peak_mb status
+               slowest_phase, sorted by wall time
+  --phases     per run and phase: seconds records records_per_s
+  --functions  cProfile dumps of all runs added together (pstats.Stats.add),
+               top functions by cumulative time
+  --json       everything above as one JSON document
+"""
+import argparse
+import glob
+import io
+import json
+import os
+import pstats
+import sys
+import profiling
+
+
+def find(root):
+    return sorted(glob.glob(os.path.join(root, "**", "*.profile.json"), recursive=True))
+
+
+def load(fps):
+    runs = []
+    for fp in fps:
+        try:
+            with open(fp) as f:
+                r = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[WARN] skip {fp}: {e}", file=sys.stderr)
+            continue
+        r["_path"] = fp
+        runs.append(r)
+    return runs
+
+
+def merged_functions(runs, n):
+    st = None
+    for r in runs:
+        fp = os.path.join(os.path.dirname(r["_path"]), r.get("cprofile", {}).get("pstats", ""))
+        if not os.path.isfile(fp):
+            continue
+        if st is None:
+            st = pstats.Stats(fp, stream=io.StringIO())
+        else:
+            st.add(fp)
+    if st is None:
+        return []
+    rows = []
+    for (fn, line, func), (cc, nc, tt, ct, _callers) in st.stats.items():
+        rows.append({"function": f"{os.path.basename(fn)}:{line}({func})", "ncalls": nc,
+                     "tottime": round(tt, 6), "cumtime": round(ct, 6)})
+    rows.sort(key=lambda r: -r["cumtime"])
+    return rows[:n]
+
+
+def fmt(v):
+    return "NA" if v is None else str(v)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--root", default="results", help="directory searched recursively for *.profile.json")
+    ap.add_argument("--out", default="", help="per-run table (default: stdout)")
+    ap.add_argument("--phases", default="")
+    ap.add_argument("--functions", default="")
+    ap.add_argument("--json", default="")
+    ap.add_argument("--top", type=int, default=40)
+    args = ap.parse_args()
+
+    runs = load(find(args.root))
+    if not runs:
+        raise SystemExit(f"[ERROR] no *.profile.json under {args.root}")
+    runs.sort(key=lambda r: -(r.get("wall_s") or 0))
+
+    w = open(args.out, "w") if args.out else sys.stdout
+    w.write("script\toutput\twall_s\tcpu_s\tmax_rss_mb\ttracemalloc_peak_mb\tstatus\tslowest_phase\n")
+    for r in runs:
+        ph = max(r.get("phases") or [{}], key=lambda p: p.get("seconds", 0))
+        slow = f"{ph['name']}:{ph['seconds']:.2f}s" if ph else "NA"
+        out = r["_path"][:-len(".profile.json")]
+        w.write(f"{r.get('script')}\t{out}\t{fmt(r.get('wall_s'))}\t{fmt(r.get('cpu_s'))}\t"
+                f"{fmt(r.get('max_rss_mb'))}\t{fmt(r.get('tracemalloc', {}).get('peak_mb'))}\t"
+                f"{fmt(r.get('status'))}\t{slow}\n")
+    if args.out:
+        w.close()
+
+    if args.phases:
+        with open(args.phases, "w") as f:
+            f.write("script\toutput\tphase\tseconds\trecords\trecords_per_s\n")
+            for r in runs:
+                for p in r.get("phases") or []:
+                    f.write(f"{r.get('script')}\t{r['_path'][:-len('.profile.json')]}\t{p['name']}\t"
+                            f"{p['seconds']}\t{fmt(p.get('records'))}\t{fmt(p.get('records_per_s'))}\n")
+
+    funcs = merged_functions(runs, args.top) if (args.functions or args.json) else []
+    if args.functions:
+        with open(args.functions, "w") as f:
+            f.write("function\tncalls\ttottime\tcumtime\n")
+            for r in funcs:
+                f.write(f"{r['function']}\t{r['ncalls']}\t{r['tottime']}\t{r['cumtime']}\n")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"runs": runs, "total_wall_s": round(sum(r.get("wall_s") or 0 for r in runs), 3),
+                       "total_cpu_s": round(sum(r.get("cpu_s") or 0 for r in runs), 3),
+                       "functions": funcs}, f, indent=1)
+
+    print(f"[INFO] {len(runs)} profiled runs, {sum(r.get('wall_s') or 0 for r in runs):.1f}s wall in total",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    profiling.run(main)
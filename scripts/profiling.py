@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Opt-in profiling shared by every script: `--profile [PATH.json]` on any command line.
+
+    if __name__ == "__main__":
+        profiling.run(main)
+
+run() takes --profile / --profile_top out of sys.argv before argparse sees them
+and, when profiling is on, runs main() under cProfile and tracemalloc. On exit
+(also on an error) it writes
+
+  PATH            JSON: wall / CPU time, max RSS, exit status, per-phase timers,
+                  tracemalloc peak and the top-N allocation sites, top-N functions
+                  by cumulative time
+  PATH.pstats     the raw cProfile dump (python -m pstats, snakeviz, ...)
+
+PATH defaults to <first output argument>.profile.json, i.e. next to the rule
+output. Inside the workflow profiling is switched on per rule from config.txt
+(profile: rules): the Snakefile exports PLANTFAMILYALLIN_PROFILE, a ';'-separated
+list of the selected rules' output globs, and a script profiles itself when one
+of its output arguments matches ("all" profiles everything).
+
+Phases are cheap and always available; they only show up in the JSON:
+
+    with profiling.phase("parse") as ph:
+        recs = read_fasta(fp)
+        ph.records = len(recs)
+
+Only the main process is traced; work done in ProcessPoolExecutor children shows
+up as wall time, not in the function table. profile_summary.py merges the JSON
+files of a run.
+"""
+import cProfile
+import fnmatch
+import io
+import json
+import os
+import pstats
+import socket
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+ENV = "PLANTFAMILYALLIN_PROFILE"
+OUT_FLAGS = ("--out", "--output", "--outdir", "-o")
+
+_PHASES = []
+
+
+class _Phase:
+    __slots__ = ("name", "seconds", "records")
+
+    def __init__(self, name):
+        self.name, self.seconds, self.records = name, 0.0, None
+
+
+@contextmanager
+def phase(name, records=None):
+    ph = _Phase(name)
+    ph.records = records
+    t0 = time.perf_counter()
+    try:
+        yield ph
+    finally:
+        ph.seconds = time.perf_counter() - t0
+        _PHASES.append(ph)
+
+
+def _take_args(argv):
+    """remove --profile [PATH] / --profile_top N from argv in place."""
+    path, top, on = "", 25, False
+    i = 1
+    while i < len(argv):
+        a = argv[i]
+        if a == "--profile" or a.startswith("--profile="):
+            on = True
+            if "=" in a:
+                path = a.split("=", 1)[1]
+                del argv[i]
+            elif i + 1 < len(argv) and argv[i + 1].endswith(".json"):
+                path = argv[i + 1]
+                del argv[i:i + 2]
+            else:
+                del argv[i]
+            continue
+        if a == "--profile_top" and i + 1 < len(argv):
+            top = int(argv[i + 1])
+            del argv[i:i + 2]
+            continue
+        i += 1
+    return on, path, top
+
+
+def _outputs(argv):
+    outs = []
+    for i, a in enumerate(argv[:-1]):
+        if a in OUT_FLAGS or a.startswith("--out_"):
+            v = argv[i + 1]
+            if v and not v.startswith("-"):
+                outs.append(v)
+    return outs
+
+
+def _path_from_env(argv):
+    spec = os.environ.get(ENV, "")
+    if not spec:
+        return ""
+    outs = _outputs(argv)
+    if not outs:
+        return ""
+    if spec.strip() == "all":
+        return outs[0]
+    pats = [os.path.normpath(p) for p in spec.split(";") if p]
+    for o in outs:
+        o = os.path.normpath(o)
+        if any(fnmatch.fnmatch(o, p) or fnmatch.fnmatch(os.path.abspath(o), p) for p in pats):
+            return o
+    return ""
+
+
+def _top_functions(prof, n):
+    st = pstats.Stats(prof, stream=io.StringIO())
+    rows = []
+    for (fn, line, func), (cc, nc, tt, ct, _callers) in st.stats.items():
+        rows.append({"function": f"{os.path.basename(fn)}:{line}({func})", "ncalls": nc,
+                     "tottime": round(tt, 6), "cumtime": round(ct, 6)})
+    rows.sort(key=lambda r: -r["cumtime"])
+    return rows[:n]
+
+
+def _top_alloc(snap, n):
+    out = []
+    for s in snap.statistics("lineno")[:n]:
+        fr = s.traceback[0]
+        out.append({"site": f"{os.path.basename(fr.filename)}:{fr.lineno}",
+                    "size_mb": round(s.size / 2 ** 20, 3), "count": s.count})
+    return out
+
+
+def _max_rss_mb():
+    try:
+        import resource
+        r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(r / 1024 / (1024 if sys.platform == "darwin" else 1), 1)
+    except (ImportError, OSError):
+        return None
+
+
+def run(main):
+    on, path, top = _take_args(sys.argv)
+    if not on:
+        path = _path_from_env(sys.argv)
+        if path:
+            path += ".profile.json"
+    elif not path:
+        outs = _outputs(sys.argv)
+        path = (outs[0] if outs else os.path.splitext(os.path.basename(sys.argv[0]))[0]) + ".profile.json"
+    if not path:
+        return main()
+
+    tracemalloc.start(1)
+    prof = cProfile.Profile()
+    t0, c0 = time.perf_counter(), time.process_time()
+    status = 0
+    prof.enable()
+    try:
+        return main()
+    except SystemExit as e:
+        status = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        raise
+    except BaseException:
+        status = "exception"
+        raise
+    finally:
+        prof.disable()
+        wall, cpu = time.perf_counter() - t0, time.process_time() - c0
+        _cur, peak = tracemalloc.get_traced_memory()
+        snap = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        _write(path, prof, top, snap, peak, wall, cpu, status)
+
+
+def _write(path, prof, top, snap, peak, wall, cpu, status):
+    phases = []
+    for ph in _PHASES:
+        d = {"name": ph.name, "seconds": round(ph.seconds, 6)}
+        if ph.records is not None:
+            d["records"] = ph.records
+            d["records_per_s"] = round(ph.records / ph.seconds, 1) if ph.seconds > 0 else None
+        phases.append(d)
+    d = os.path.dirname(os.path.abspath(path))
+    os.makedirs(d, exist_ok=True)
+    prof.dump_stats(path + ".pstats")
+    rep = {
+        "script": os.path.basename(sys.argv[0]),
+        "argv": sys.argv[1:],
+        "host": socket.gethostname(),
+        "pid": os.getpid(),
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(time.time() - wall)),
+        "status": status,
+        "wall_s": round(wall, 4),
+        "cpu_s": round(cpu, 4),
+        "max_rss_mb": _max_rss_mb(),
+        "phases": phases,
+        "tracemalloc": {"peak_mb": round(peak / 2 ** 20, 3), "top": _top_alloc(snap, top)},
+        "cprofile": {"pstats": os.path.basename(path) + ".pstats", "top": _top_functions(prof, top)},
+    }
+    with open(path, "w") as w:
+        json.dump(rep, w, indent=1)
+    print(f"[INFO] profile: {path}", file=sys.stderr)
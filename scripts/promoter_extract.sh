@@ -4,7 +4,7 @@ set -euo pipefail
 # args:
 # 1 gene.bed (chr start end id score strand) 0-based
 # 2 chr.length (chr len)
-# 3 genome.fa
+# 3 genome.fa 或 genome.2bit（scripts/genome_2bit.py build 生成）
 # 4 promoter_len
 # 5 out.bed
 # 6 out.fa
@@ -16,9 +16,6 @@ L="$4"
 OUTBED="$5"
 OUTFA="$6"
 
-# need bedtools
-command -v bedtools >/dev/null 2>&1 || { echo "ERROR: bedtools not found"; exit 1; }
-
 awk -v L="$L" 'BEGIN{FS=OFS="\t"}
   NR==FNR{len[$1]=$2; next}
   {
@@ -40,5 +37,13 @@ awk -v L="$L" 'BEGIN{FS=OFS="\t"}
     }
   }' "$CHRLEN" "$GENE_BED" > "$OUTBED"
 
-# -name 会用第4列作为 fasta header；-s 根据链取反向互补
-bedtools getfasta -fi "$GENOME" -bed "$OUTBED" -s -name > "$OUTFA"
+if [[ "$GENOME" == *.2bit ]]; then
+  # 2bit: 直接 memmap 随机读取，header 为第4列，负链取反向互补
+  "${PYTHON:-python3}" "$(dirname "$0")/genome_2bit.py" getfasta \
+    --twobit "$GENOME" --bed "$OUTBED" --out "$OUTFA"
+else
+  # need bedtools
+  command -v bedtools >/dev/null 2>&1 || { echo "ERROR: bedtools not found"; exit 1; }
+  # -name 会用第4列作为 fasta header；-s 根据链取反向互补
+  bedtools getfasta -fi "$GENOME" -bed "$OUTBED" -s -name > "$OUTFA"
+fi
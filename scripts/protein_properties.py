@@ -1,8 +1,12 @@
 #!/usr/bin/env python3
 import argparse
 import re
+import sys
 from Bio import SeqIO
 from Bio.SeqUtils.ProtParam import ProteinAnalysis
+from compress_io import xopen
+from seq_memo import SeqMemo, params_key, seq_hash
+import profiling
 
 AA20 = "ACDEFGHIKLMNPQRSTVWY"
 AA_SET = set(AA20)
@@ -50,7 +54,7 @@ def load_wolf_tsv(path: str):
     d = {}
     if not path:
         return d
-    with open(path) as f:
+    with xopen(path) as f:
         header = f.readline()
         for line in f:
             line = line.rstrip("\n")
@@ -66,11 +70,80 @@ def load_wolf_tsv(path: str):
             d[seq_id] = (loc, score, scores)
     return d
 
+def property_row(raw: str):
+    """
+    Property columns (length_aa .. pct_Y) as formatted strings; None if nothing left
+    after sanitizing. Depends only on the sequence, so rows can be memoized by hash.
+    """
+    seq, invalid_n, x_n, invalid_frac = sanitize_seq(raw)
+    if not seq:
+        return None
+
+    ana = ProteinAnalysis(seq)
+
+    length = len(seq)
+    mw = ana.molecular_weight()
+    pi = ana.isoelectric_point()
+    instab = ana.instability_index()
+
+    # Biopython may or may not have gravy in older versions; most have it.
+    try:
+        gravy = ana.gravy()
+    except Exception:
+        gravy = float("nan")
+
+    arom = ana.aromaticity()
+
+    # charge at pH 7
+    try:
+        charge7 = ana.charge_at_pH(7.0)
+    except Exception:
+        charge7 = float("nan")
+
+    # extinction coefficient
+    # returns (reduced, cystines)
+    try:
+        ext_red, ext_cys = ana.molar_extinction_coefficient()
+    except Exception:
+        ext_red, ext_cys = (float("nan"), float("nan"))
+
+    # A280 for 1 mg/mL (1 g/L), pathlength 1 cm:
+    # A = ext_coeff * (1 g/L)/MW = ext_coeff / MW
+    a280_red = ext_red / mw if mw and ext_red == ext_red else float("nan")
+    a280_cys = ext_cys / mw if mw and ext_cys == ext_cys else float("nan")
+
+    ai = aliphatic_index(seq)
+
+    # AA composition (percent)
+    aa_pct = ana.get_amino_acids_percent()  # dict {AA: fraction}
+    pct_list = [100.0 * aa_pct.get(aa, 0.0) for aa in AA20]
+
+    row = [
+        str(length),
+        f"{mw:.3f}",
+        f"{pi:.3f}",
+        f"{instab:.3f}",
+        f"{ai:.3f}",
+        f"{gravy:.3f}" if gravy == gravy else "NA",
+        f"{arom:.5f}",
+        f"{charge7:.3f}" if charge7 == charge7 else "NA",
+        str(ext_red),
+        str(ext_cys),
+        f"{a280_red:.6f}" if a280_red == a280_red else "NA",
+        f"{a280_cys:.6f}" if a280_cys == a280_cys else "NA",
+        str(x_n),
+        str(invalid_n),
+        f"{invalid_frac:.5f}",
+    ]
+    row += [f"{v:.3f}" for v in pct_list]
+    return row
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--pep", required=True)
     ap.add_argument("--out", required=True)
     ap.add_argument("--wolf_tsv", default="", help="Optional WoLF PSORT TSV to merge")
+    ap.add_argument("--memo_db", default="", help="per-sequence memo (seq_memo.py); only new peptides are computed")
     args = ap.parse_args()
 
     wolf = load_wolf_tsv(args.wolf_tsv)
@@ -100,80 +173,47 @@ def main():
     # wolfpsort columns
     cols += ["wolf_loc", "wolf_score", "wolf_scores"]
 
-    with open(args.out, "w") as o:
+    with profiling.phase("parse") as ph:
+        records = [(r.id, str(r.seq)) for r in SeqIO.parse(xopen(args.pep), "fasta")]
+        ph.records = len(records)
+
+    with profiling.phase("compute", len(records)):
+        props = {}
+        if args.memo_db:
+            memo = SeqMemo(args.memo_db)
+            mparams = params_key(",".join(cols))
+            hashes = {sid: seq_hash(raw) for sid, raw in records}
+            cached = memo.get_many("protein_properties", mparams, hashes.values())
+            new = {}
+            for sid, raw in records:
+                h = hashes[sid]
+                if h in cached:
+                    props[sid] = cached[h][0].split(",") if cached[h] else None
+                else:
+                    props[sid] = property_row(raw)
+                    new[h] = [",".join(props[sid])] if props[sid] else []
+            memo.put_many("protein_properties", mparams, new)
+            memo.close()
+            print(f"[INFO] protein_properties: {len(records) - len(new)} cached, {len(new)} computed",
+                  file=sys.stderr)
+        else:
+            props = {sid: property_row(raw) for sid, raw in records}
+
+    with profiling.phase("write", len(records)), open(args.out, "w") as o:
         o.write(",".join(cols) + "\n")
-
-        for r in SeqIO.parse(args.pep, "fasta"):
-            raw = str(r.seq)
-            seq, invalid_n, x_n, invalid_frac = sanitize_seq(raw)
-            if not seq:
+        for sid, _raw in records:
+            row = props[sid]
+            if row is None:
                 continue
 
-            ana = ProteinAnalysis(seq)
-
-            length = len(seq)
-            mw = ana.molecular_weight()
-            pi = ana.isoelectric_point()
-            instab = ana.instability_index()
-
-            # Biopython may or may not have gravy in older versions; most have it.
-            try:
-                gravy = ana.gravy()
-            except Exception:
-                gravy = float("nan")
-
-            arom = ana.aromaticity()
-
-            # charge at pH 7
-            try:
-                charge7 = ana.charge_at_pH(7.0)
-            except Exception:
-                charge7 = float("nan")
-
-            # extinction coefficient
-            # returns (reduced, cystines)
-            try:
-                ext_red, ext_cys = ana.molar_extinction_coefficient()
-            except Exception:
-                ext_red, ext_cys = (float("nan"), float("nan"))
-
-            # A280 for 1 mg/mL (1 g/L), pathlength 1 cm:
-            # A = ext_coeff * (1 g/L)/MW = ext_coeff / MW
-            a280_red = ext_red / mw if mw and ext_red == ext_red else float("nan")
-            a280_cys = ext_cys / mw if mw and ext_cys == ext_cys else float("nan")
-
-            ai = aliphatic_index(seq)
-
-            # AA composition (percent)
-            aa_pct = ana.get_amino_acids_percent()  # dict {AA: fraction}
-            pct_list = [100.0 * aa_pct.get(aa, 0.0) for aa in AA20]
-
             wolf_loc, wolf_score, wolf_scores = ("NA", "NA", "NA")
-            if r.id in wolf:
-                wolf_loc, wolf_score, wolf_scores = wolf[r.id]
-
-            row = [
-                r.id,
-                str(length),
-                f"{mw:.3f}",
-                f"{pi:.3f}",
-                f"{instab:.3f}",
-                f"{ai:.3f}",
-                f"{gravy:.3f}" if gravy == gravy else "NA",
-                f"{arom:.5f}",
-                f"{charge7:.3f}" if charge7 == charge7 else "NA",
-                str(ext_red),
-                str(ext_cys),
-                f"{a280_red:.6f}" if a280_red == a280_red else "NA",
-                f"{a280_cys:.6f}" if a280_cys == a280_cys else "NA",
-                str(x_n),
-                str(invalid_n),
-                f"{invalid_frac:.5f}",
-            ]
-            row += [f"{v:.3f}" for v in pct_list]
+            if sid in wolf:
+                wolf_loc, wolf_score, wolf_scores = wolf[sid]
+
+            row = [sid] + row
             row += [wolf_loc, wolf_score, wolf_scores]
 
             o.write(",".join(row) + "\n")
 
 if __name__ == "__main__":
-    main()
+    profiling.run(main)
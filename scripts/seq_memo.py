@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Per-protein result memo (SQLite) for incremental reannotation.
+
+Rows are keyed by (tool, params, sha1 of the peptide), where params covers the
+tool settings and a fingerprint of the database (Pfam-A.hmm, family HMM, ...).
+Only new or changed sequences are sent to the tool; cached rows are merged back
+in the original FASTA order. A sequence without hits is stored too (zero rows),
+so it is not searched again.
+
+Subcommands (shell side, around hmmscan/hmmsearch):
+  split   --pep in.fa -> --out_fa new.fa with the sequences not in the memo
+  merge   tool output for new.fa + memo -> full output for in.fa; stores new rows
+
+Library use (protein_properties.py, wolfpsort_predict.py):
+  memo = SeqMemo(db); memo.get_many(tool, params, hashes); memo.put_many(tool, params, rows)
+"""
+import argparse
+import hashlib
+import os
+import sqlite3
+import sys
+
+from compress_io import xopen
+import profiling
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS memo (
+    tool     TEXT NOT NULL,
+    params   TEXT NOT NULL,
+    seq_hash TEXT NOT NULL,
+    rows     TEXT NOT NULL,
+    PRIMARY KEY (tool, params, seq_hash)
+) WITHOUT ROWID;
+"""
+
+# output formats understood by `merge`: (column holding the sequence id, max split)
+# domtblout has 22 fixed columns + free-text description
+FORMATS = {
+    "domtbl_query": (3, 22),    # hmmscan --domtblout: query = protein
+    "domtbl_target": (0, 22),   # hmmsearch --domtblout: target = protein
+}
+
+
+def seq_hash(seq):
+    return hashlib.sha1(seq.upper().encode()).hexdigest()
+
+
+def file_fingerprint(fp, chunk=1 << 20):
+    """Cheap database version id: size + first/last MiB (Pfam-A.hmm is >1 GB)."""
+    h = hashlib.sha1()
+    size = os.path.getsize(fp)
+    h.update(str(size).encode())
+    with open(fp, "rb") as f:
+        h.update(f.read(chunk))
+        if size > chunk:
+            f.seek(max(chunk, size - chunk))
+            h.update(f.read(chunk))
+    return h.hexdigest()
+
+
+def params_key(params, files=()):
+    parts = [params] + [file_fingerprint(fp) for fp in files if fp]
+    return hashlib.sha1("\0".join(parts).encode()).hexdigest()
+
+
+def read_fasta(fp):
+    """[(id, seq)] in file order."""
+    recs = []
+    name, buf = None, []
+    with xopen(fp) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith(">"):
+                if name is not None:
+                    recs.append((name, "".join(buf)))
+                name, buf = line[1:].split()[0], []
+            else:
+                buf.append(line)
+    if name is not None:
+        recs.append((name, "".join(buf)))
+    return recs
+
+
+class SeqMemo:
+    def __init__(self, db):
+        d = os.path.dirname(os.path.abspath(db))
+        os.makedirs(d, exist_ok=True)
+        self.con = sqlite3.connect(db, timeout=60)
+        self.con.execute("PRAGMA journal_mode=WAL")
+        self.con.executescript(SCHEMA)
+
+    def get_many(self, tool, params, hashes):
+        """hash -> list of stored rows (possibly empty) for the hashes that are cached."""
+        out = {}
+        hashes = list(set(hashes))
+        for i in range(0, len(hashes), 500):
+            chunk = hashes[i:i + 500]
+            q = ("SELECT seq_hash, rows FROM memo WHERE tool = ? AND params = ? AND seq_hash IN (%s)"
+                 % ",".join("?" * len(chunk)))
+            for h, rows in self.con.execute(q, [tool, params] + chunk):
+                out[h] = rows.split("\n") if rows else []
+        return out
+
+    def put_many(self, tool, params, items):
+        """items: hash -> list of rows"""
+        with self.con:
+            self.con.executemany(
+                "INSERT OR REPLACE INTO memo(tool, params, seq_hash, rows) VALUES (?,?,?,?)",
+                ((tool, params, h, "\n".join(rows)) for h, rows in items.items()),
+            )
+
+    def close(self):
+        self.con.close()
+
+
+def split_row(line, fmt):
+    """tool output line -> (seq_id, row with the id column removed)"""
+    col, maxsplit = FORMATS[fmt]
+    a = line.rstrip("\n").split(None, maxsplit)
+    sid = a.pop(col)
+    return sid, "\t".join(a)
+
+
+def join_row(sid, row, fmt):
+    col, _ = FORMATS[fmt]
+    a = row.split("\t")
+    a.insert(col, sid)
+    return " ".join(a)
+
+
+def cmd_split(args):
+    recs = read_fasta(args.pep)
+    memo = SeqMemo(args.db)
+    params = params_key(args.params, args.param_files)
+    cached = memo.get_many(args.tool, params, [seq_hash(s) for _, s in recs])
+    memo.close()
+    n_new = 0
+    seen = set()
+    with open(args.out_fa, "w") as w:
+        for sid, seq in recs:
+            h = seq_hash(seq)
+            if h in cached or h in seen:
+                continue
+            seen.add(h)
+            w.write(f">{sid}\n{seq}\n")
+            n_new += 1
+    print(f"[INFO] {args.tool}: {len(recs) - n_new} of {len(recs)} sequences cached, {n_new} to search",
+          file=sys.stderr)
+
+
+def cmd_merge(args):
+    recs = read_fasta(args.pep)
+    hash_of = {sid: seq_hash(seq) for sid, seq in recs}
+    params = params_key(args.params, args.param_files)
+
+    # rows produced for the searched subset
+    searched = {sid for sid, _ in read_fasta(args.new_fa)} if args.new_fa else set()
+    new_rows = {sid: [] for sid in searched}
+    with xopen(args.new) as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            sid, row = split_row(line, args.format)
+            new_rows.setdefault(sid, []).append(row)
+
+    memo = SeqMemo(args.db)
+    memo.put_many(args.tool, params, {hash_of[sid]: rows for sid, rows in new_rows.items() if sid in hash_of})
+    cached = memo.get_many(args.tool, params, hash_of.values())
+    memo.close()
+
+    n = 0
+    with xopen(args.out, "w") as w:
+        w.write(f"# {args.tool} rows merged from memo by seq_memo.py\n")
+        for sid, _seq in recs:
+            for row in cached.get(hash_of[sid], []):
+                w.write(join_row(sid, row, args.format) + "\n")
+                n += 1
+    missing = sum(1 for sid in hash_of if hash_of[sid] not in cached)
+    if missing:
+        print(f"[WARN] {missing} sequences have neither cached nor new results", file=sys.stderr)
+    print(f"[INFO] {args.tool}: wrote {n} rows for {len(recs)} sequences", file=sys.stderr)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    def common(p):
+        p.add_argument("--db", required=True)
+        p.add_argument("--tool", required=True)
+        p.add_argument("--params", default="", help="tool settings that change the result")
+        p.add_argument("--param_files", nargs="*", default=[], help="databases to fingerprint (HMM files, ...)")
+        p.add_argument("--pep", required=True, help="full peptide FASTA")
+
+    p1 = sub.add_parser("split")
+    common(p1)
+    p1.add_argument("--out_fa", required=True, help="sequences to search")
+
+    p2 = sub.add_parser("merge")
+    common(p2)
+    p2.add_argument("--new", required=True, help="tool output for --new_fa")
+    p2.add_argument("--new_fa", default="", help="the FASTA that was searched (records no-hit sequences)")
+    p2.add_argument("--format", required=True, choices=sorted(FORMATS))
+    p2.add_argument("--out", required=True)
+
+    args = ap.parse_args()
+    if args.cmd == "split":
+        cmd_split(args)
+    else:
+        cmd_merge(args)
+
+
+if __name__ == "__main__":
+    profiling.run(main)
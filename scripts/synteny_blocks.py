@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Indexed collinearity block store (SQLite) with a gene -> block lookup table.
+
+Tables:
+  genes(gene_id INTEGER PK, name TEXT UNIQUE, chrom, rank)      rank = gene order on chrom (shared order)
+  blocks(block_pk INTEGER PK, source, block_id, score, evalue, n, orientation,
+         chromA, chromB, ranksA BLOB, ranksB BLOB)              anchor rank arrays (int32)
+  anchors(block_pk, idx, geneA, geneB)                          PK (block_pk, idx)
+  gene_block(gene_id, block_pk, idx, side)                      PK (gene_id, ...), WITHOUT ROWID
+
+Sources:
+  MCScanX .collinearity (target self-comparison, or any MCScanX run)
+  GENESPACE syntenicHits tables (columns id1 id2 blkID [isAnchor ord1 ord2 chr1 chr2 ...])
+Gene order (ranks) comes from MCScanX .gff (chr id start end) or BED (chr start end id).
+A --gene_order entry SOURCE=FILE ranks the anchors of that source only (e.g. one
+species pair's .gff for <a>__<b>.collinearity); plain FILE entries are the
+fallback for every source and give genes.rank; a gene in several files takes
+its rank from the first one listed. A target gene in several sources
+thus gets, in each block, its rank in the gene set that source was aligned on.
+
+Subcommands:
+  build   parse sources once into the store (--fresh to rebuild)
+  family  blocks containing the given genes, their partners and +-flank anchors
+"""
+import argparse
+import math
+import os
+import re
+import sqlite3
+import sys
+from array import array
+from collections import ChainMap, defaultdict
+
+from compress_io import xopen
+from parse_mcscanx_collinearity_to_pairs import ALN_RE
+import profiling
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS genes (
+    gene_id INTEGER PRIMARY KEY,
+    name    TEXT NOT NULL UNIQUE,
+    chrom   TEXT,
+    rank    INTEGER
+);
+CREATE TABLE IF NOT EXISTS blocks (
+    block_pk    INTEGER PRIMARY KEY,
+    source      TEXT NOT NULL,
+    block_id    TEXT NOT NULL,
+    score       REAL,
+    evalue      REAL,
+    n           INTEGER,
+    orientation TEXT,
+    chromA      TEXT,
+    chromB      TEXT,
+    ranksA      BLOB,
+    ranksB      BLOB,
+    UNIQUE (source, block_id)
+);
+CREATE TABLE IF NOT EXISTS anchors (
+    block_pk INTEGER NOT NULL REFERENCES blocks(block_pk),
+    idx      INTEGER NOT NULL,
+    geneA    INTEGER NOT NULL REFERENCES genes(gene_id),
+    geneB    INTEGER NOT NULL REFERENCES genes(gene_id),
+    PRIMARY KEY (block_pk, idx)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS gene_block (
+    gene_id  INTEGER NOT NULL,
+    block_pk INTEGER NOT NULL,
+    idx      INTEGER NOT NULL,
+    side     TEXT NOT NULL,
+    PRIMARY KEY (gene_id, block_pk, idx, side)
+) WITHOUT ROWID;
+"""
+
+HDR_RE = re.compile(r"score=\s*([-\d.eE+]+).*?e_value=\s*([-\d.eE+]+).*?N=\s*(\d+)\s*(\S+)?\s*(plus|minus)?", re.I)
+
+
+def connect(db):
+    con = sqlite3.connect(db)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    con.executescript(SCHEMA)
+    return con
+
+
+def read_gene_order(fp):
+    """gene -> (chrom, rank) from MCScanX gff (chr id start end) or BED (chr start end id)"""
+    by_chrom = defaultdict(list)
+    with xopen(fp) as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            a = line.rstrip("\n").split("\t")
+            if len(a) < 4:
+                continue
+            if a[1].isdigit():
+                chrom, start, gid = a[0], int(a[1]), a[3]
+            else:
+                chrom, start, gid = a[0], int(a[2]), a[1]
+            by_chrom[chrom].append((start, gid))
+    order = {}
+    for chrom, genes in by_chrom.items():
+        genes.sort()
+        for r, (_s, gid) in enumerate(genes):
+            order[gid] = (chrom, r)
+    return order
+
+
+def iter_mcscanx_blocks(fp):
+    """(block_id, score, evalue, orientation, chromA, chromB, [(geneA, geneB)])"""
+    cur = None
+    with xopen(fp) as f:
+        for line in f:
+            st = line.strip()
+            if st.startswith("#"):
+                m = ALN_RE.match(st)
+                if m:
+                    if cur and cur[-1]:
+                        yield cur
+                    h = HDR_RE.search(st)
+                    score, ev, orient, chroms = None, None, "NA", ("NA", "NA")
+                    if h:
+                        score, ev = float(h.group(1)), float(h.group(2))
+                        if h.group(4) and "&" in h.group(4):
+                            chroms = tuple(h.group(4).split("&", 1))
+                        orient = (h.group(5) or "NA").lower()
+                    cur = [m.group(1), score, ev, orient, chroms[0], chroms[1], []]
+                continue
+            if not st or cur is None:
+                continue
+            parts = st.split()
+            if len(parts) >= 4 and re.fullmatch(r"\d+-", parts[0]) and re.fullmatch(r"\d+:", parts[1]):
+                cur[-1].append((parts[2], parts[3]))
+            elif len(parts) >= 3 and re.fullmatch(r"\d+-\d+:", parts[0]):
+                cur[-1].append((parts[1], parts[2]))
+    if cur and cur[-1]:
+        yield cur
+
+
+def iter_genespace_blocks(fp):
+    """GENESPACE syntenicHits: group anchor hits by blkID."""
+    blocks = defaultdict(list)
+    with xopen(fp) as f:
+        header = f.readline().rstrip("\n").split("\t")
+        col = {c: i for i, c in enumerate(header)}
+        if not {"id1", "id2", "blkID"} <= set(col):
+            raise SystemExit(f"[ERROR] {fp}: expected GENESPACE columns id1 id2 blkID")
+        ia, ib, ik = col["id1"], col["id2"], col["blkID"]
+        ian = col.get("isAnchor")
+        io1, io2 = col.get("ord1"), col.get("ord2")
+        for line in f:
+            a = line.rstrip("\n").split("\t")
+            if len(a) <= max(ia, ib, ik) or a[ik] in ("", "NA"):
+                continue
+            if ian is not None and a[ian].upper() not in ("TRUE", "T", "1"):
+                continue
+            key = (float(a[io1]) if io1 is not None else 0, a[ia])
+            blocks[a[ik]].append((key, a[ia], a[ib], float(a[io2]) if io2 is not None else 0))
+    for blk, hits in blocks.items():
+        hits.sort()
+        o2 = [h[3] for h in hits]
+        orient = "minus" if len(o2) > 1 and o2[-1] < o2[0] else "plus"
+        yield [blk, None, None, orient, "NA", "NA", [(h[1], h[2]) for h in hits]]
+
+
+def gene_ids(con, names, order):
+    con.executemany(
+        "INSERT INTO genes(name, chrom, rank) VALUES (?, ?, ?) ON CONFLICT(name) DO UPDATE SET "
+        "chrom = coalesce(excluded.chrom, chrom), rank = coalesce(excluded.rank, rank)",
+        ((n, *order.get(n, (None, None))) for n in names),
+    )
+    return dict(con.execute("SELECT name, gene_id FROM genes"))
+
+
+def ingest(con, source, blocks, order, gene_order=None):
+    """block ranks come from `order` (the source's own gene set); genes.rank prefers
+    `gene_order` (the shared, genome-wide order) when given."""
+    n_blk = n_anc = 0
+    blocks = list(blocks)
+    names = {g for b in blocks for pair in b[-1] for g in pair}
+    ids = gene_ids(con, names, order if gene_order is None else ChainMap(gene_order, order))
+    con.execute("DELETE FROM gene_block WHERE block_pk IN (SELECT block_pk FROM blocks WHERE source = ?)", (source,))
+    con.execute("DELETE FROM anchors WHERE block_pk IN (SELECT block_pk FROM blocks WHERE source = ?)", (source,))
+    con.execute("DELETE FROM blocks WHERE source = ?", (source,))
+    for blk, score, ev, orient, ca, cb, pairs in blocks:
+        ra = array("i", (order.get(a, (None, -1))[1] for a, _ in pairs))
+        rb = array("i", (order.get(b, (None, -1))[1] for _, b in pairs))
+        if ca == "NA" and pairs:
+            ca = order.get(pairs[0][0], ("NA",))[0]
+            cb = order.get(pairs[0][1], ("NA",))[0]
+        cur = con.execute(
+            "INSERT INTO blocks(source, block_id, score, evalue, n, orientation, chromA, chromB, ranksA, ranksB) "
+            "VALUES (?,?,?,?,?,?,?,?,?,?)",
+            (source, blk, score, ev, len(pairs), orient, ca, cb, ra.tobytes(), rb.tobytes()),
+        )
+        pk = cur.lastrowid
+        con.executemany("INSERT OR REPLACE INTO anchors(block_pk, idx, geneA, geneB) VALUES (?,?,?,?)",
+                        ((pk, i, ids[a], ids[b]) for i, (a, b) in enumerate(pairs)))
+        con.executemany("INSERT OR IGNORE INTO gene_block(gene_id, block_pk, idx, side) VALUES (?,?,?,?)",
+                        [(ids[a], pk, i, "A") for i, (a, _b) in enumerate(pairs)]
+                        + [(ids[b], pk, i, "B") for i, (_a, b) in enumerate(pairs)])
+        n_blk += 1
+        n_anc += len(pairs)
+    return n_blk, n_anc
+
+
+def source_name(fp):
+    base = os.path.basename(fp)
+    for suf in (".gz", ".txt", ".tsv", ".collinearity"):
+        if base.endswith(suf):
+            base = base[: -len(suf)]
+    return base
+
+
+def family_query(con, genes, flank):
+    """
+    One row per anchor within +-flank of each member's anchor:
+    gene source block_id orientation score evalue n side offset flank_gene flank_partner rank partner_rank
+    (offset 0 = the member itself and its syntenic partner)
+    """
+    rows = []
+    for g in genes:
+        hits = con.execute(
+            "SELECT gb.block_pk, gb.idx, gb.side, b.source, b.block_id, b.orientation, b.score, b.evalue, b.n, "
+            "b.ranksA, b.ranksB FROM genes g JOIN gene_block gb ON gb.gene_id = g.gene_id "
+            "JOIN blocks b ON b.block_pk = gb.block_pk WHERE g.name = ?", (g,)).fetchall()
+        for pk, idx, side, src, blk, orient, score, ev, n, bra, brb in hits:
+            ranks = {"A": array("i"), "B": array("i")}
+            ranks["A"].frombytes(bra)
+            ranks["B"].frombytes(brb)
+            own_r, oth_r = (ranks["A"], ranks["B"]) if side == "A" else (ranks["B"], ranks["A"])
+            window = con.execute(
+                "SELECT a.idx, ga.name, gb.name FROM anchors a "
+                "JOIN genes ga ON ga.gene_id = a.geneA JOIN genes gb ON gb.gene_id = a.geneB "
+                "WHERE a.block_pk = ? AND a.idx BETWEEN ? AND ? ORDER BY a.idx",
+                (pk, idx - flank, idx + flank)).fetchall()
+            for i, na, nb in window:
+                own, other = (na, nb) if side == "A" else (nb, na)
+                rows.append((g, src, blk, orient, score, ev, n, side, i - idx, own, other,
+                             own_r[i] if own_r[i] >= 0 else None, oth_r[i] if oth_r[i] >= 0 else None))
+    return rows
+
+
+def fmt(v):
+    if v is None:
+        return "NA"
+    if isinstance(v, float) and not math.isfinite(v):
+        return "NA"
+    return str(v)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p1 = sub.add_parser("build")
+    p1.add_argument("--db", required=True)
+    p1.add_argument("--collinearity", nargs="*", default=[], help="MCScanX .collinearity file(s)")
+    p1.add_argument("--genespace_hits", nargs="*", default=[], help="GENESPACE syntenicHits table(s)")
+    p1.add_argument("--gene_order", nargs="*", default=[],
+                    help="MCScanX .gff / BED files giving gene order; SOURCE=FILE binds one to a source")
+    p1.add_argument("--fresh", action="store_true")
+
+    p2 = sub.add_parser("family")
+    p2.add_argument("--db", required=True)
+    p2.add_argument("--genes", required=True, help="gene list (final_family_members.list)")
+    p2.add_argument("--flank", type=int, default=5, help="anchors on each side of the member's anchor")
+    p2.add_argument("--out", default="-")
+
+    args = ap.parse_args()
+
+    if args.cmd == "build":
+        if args.fresh and os.path.exists(args.db):
+            os.remove(args.db)
+        shared, bound = {}, defaultdict(dict)
+        for item in args.gene_order:
+            src, eq, fp = item.rpartition("=")
+            if os.path.exists(fp) and os.path.getsize(fp) > 0:
+                tgt = bound[src] if eq else shared
+                # 同一基因出现在多个文件里时以先给出的为准
+                for gid, v in read_gene_order(fp).items():
+                    tgt.setdefault(gid, v)
+
+        def order_of(fp):
+            src = source_name(fp)
+            return ChainMap(bound[src], shared) if src in bound else shared
+
+        con = connect(args.db)
+        with con:
+            for fp in args.collinearity:
+                if not (os.path.exists(fp) and os.path.getsize(fp) > 0):
+                    continue
+                nb, na = ingest(con, source_name(fp), iter_mcscanx_blocks(fp), order_of(fp), shared)
+                print(f"[INFO] {fp}: {nb} blocks, {na} anchors", file=sys.stderr)
+            for fp in args.genespace_hits:
+                nb, na = ingest(con, source_name(fp), iter_genespace_blocks(fp), order_of(fp), shared)
+                print(f"[INFO] {fp}: {nb} blocks, {na} anchors", file=sys.stderr)
+        total = con.execute("SELECT COUNT(*) FROM blocks").fetchone()[0]
+        con.close()
+        print(f"[INFO] store holds {total} blocks", file=sys.stderr)
+    else:
+        if not os.path.exists(args.db):
+            raise SystemExit(f"[ERROR] store not found: {args.db}")
+        with xopen(args.genes) as f:
+            genes = [x.split()[0] for x in f if x.strip() and not x.startswith("#")]
+        con = connect(args.db)
+        rows = family_query(con, genes, args.flank)
+        con.close()
+        w = sys.stdout if args.out == "-" else open(args.out, "w")
+        w.write("gene\tsource\tblock_id\torientation\tscore\tevalue\tn_anchors\tside\toffset\t"
+                "flank_gene\tflank_partner\trank\tpartner_rank\n")
+        for r in rows:
+            w.write("\t".join(fmt(v) for v in r) + "\n")
+        if w is not sys.stdout:
+            w.close()
+
+
+if __name__ == "__main__":
+    profiling.run(main)
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+In-process alignment trimmer (replacement for `trimal -automated1`).
+
+The MAFFT alignment is loaded into a NumPy (n_seq x n_col) uint8 matrix and all
+column statistics are computed in vectorized form:
+  gap_frac    fraction of gap characters in the column
+  identity    count of the most frequent residue / non-gap residues
+  similarity  mean pairwise residue similarity (BLOSUM62 row distance, as trimAl)
+              weighted by the non-gap fraction
+
+Modes:
+  gappyout    drop columns above the knee of the gap distribution
+  strict      gappyout + drop columns below the knee of the similarity
+              distribution, then remove isolated short blocks
+  automated1  choose gappyout/strict from alignment size and average identity
+  none        keep everything (only writes the column map)
+
+With --kept (the stdout of `trimal -colnumbering`) the columns trimAl kept are
+taken as given and only the column map is written, so both trimmers produce
+the same map: every original column with its statistics.
+"""
+import argparse
+import sys
+
+import numpy as np
+
+from compress_io import xopen
+import profiling
+
+AA20 = "ARNDCQEGHILKMFPSTWYV"
+GAP_CHARS = "-.?~"
+
+# BLOSUM62, rows/cols in AA20 order
+BLOSUM62 = np.array([
+    [ 4, -1, -2, -2,  0, -1, -1,  0, -2, -1, -1, -1, -1, -2, -1,  1,  0, -3, -2,  0],
+    [-1,  5,  0, -2, -3,  1,  0, -2,  0, -3, -2,  2, -1, -3, -2, -1, -1, -3, -2, -3],
+    [-2,  0,  6,  1, -3,  0,  0,  0,  1, -3, -3,  0, -2, -3, -2,  1,  0, -4, -2, -3],
+    [-2, -2,  1,  6, -3,  0,  2, -1, -1, -3, -4, -1, -3, -3, -1,  0, -1, -4, -3, -3],
+    [ 0, -3, -3, -3,  9, -3, -4, -3, -3, -1, -1, -3, -1, -2, -3, -1, -1, -2, -2, -1],
+    [-1,  1,  0,  0, -3,  5,  2, -2,  0, -3, -2,  1,  0, -3, -1,  0, -1, -2, -1, -2],
+    [-1,  0,  0,  2, -4,  2,  5, -2,  0, -3, -3,  1, -2, -3, -1,  0, -1, -3, -2, -2],
+    [ 0, -2,  0, -1, -3, -2, -2,  6, -2, -4, -4, -2, -3, -3, -2,  0, -2, -2, -3, -3],
+    [-2,  0,  1, -1, -3,  0,  0, -2,  8, -3, -3, -1, -2, -1, -2, -1, -2, -2,  2, -3],
+    [-1, -3, -3, -3, -1, -3, -3, -4, -3,  4,  2, -3,  1,  0, -3, -2, -1, -3, -1,  3],
+    [-1, -2, -3, -4, -1, -2, -3, -4, -3,  2,  4, -2,  2,  0, -3, -2, -1, -2, -1,  1],
+    [-1,  2,  0, -1, -3,  1,  1, -2, -1, -3, -2,  5, -1, -3, -1,  0, -1, -3, -2, -2],
+    [-1, -1, -2, -3, -1,  0, -2, -3, -2,  1,  2, -1,  5,  0, -2, -1, -1, -1, -1,  1],
+    [-2, -3, -3, -3, -2, -3, -3, -3, -1,  0,  0, -3,  0,  6, -4, -2, -2,  1,  3, -1],
+    [-1, -2, -2, -1, -3, -1, -1, -2, -2, -3, -3, -1, -2, -4,  7, -1, -1, -4, -3, -2],
+    [ 1, -1,  1,  0, -1,  0,  0,  0, -1, -2, -2,  0, -1, -2, -1,  4,  1, -3, -2, -2],
+    [ 0, -1,  0, -1, -1, -1, -1, -2, -2, -1, -1, -1, -1, -2, -1,  1,  5, -2, -2,  0],
+    [-3, -3, -4, -4, -2, -2, -3, -2, -2, -3, -2, -3, -1,  1, -4, -3, -2, 11,  2, -3],
+    [-2, -2, -2, -3, -2, -1, -2, -3,  2, -1, -1, -2, -1,  3, -3, -2, -2,  2,  7, -1],
+    [ 0, -3, -3, -3, -1, -2, -2, -3, -3,  3,  1, -2,  1, -1, -2, -2,  0, -3, -1,  4],
+], dtype=np.float64)
+
+# residue codes: 0..19 = AA20, 20 = other residue (X/B/Z/U/...), 21 = gap
+N_AA = len(AA20)
+CODE_OTHER = N_AA
+CODE_GAP = N_AA + 1
+
+# automated1-like decision (approximation of trimAl's heuristic):
+# small or well-conserved alignments only need gap trimming; large, divergent
+# ones additionally get the similarity filter.
+AUTO_MAX_SEQS_GAPPYOUT = 20
+AUTO_MIN_IDENTITY_GAPPYOUT = 0.55
+
+STRICT_MIN_BLOCK = 3
+
+
+def build_lut():
+    lut = np.full(256, CODE_OTHER, dtype=np.uint8)
+    for i, aa in enumerate(AA20):
+        lut[ord(aa)] = i
+        lut[ord(aa.lower())] = i
+    for c in GAP_CHARS:
+        lut[ord(c)] = CODE_GAP
+    return lut
+
+
+def residue_similarity():
+    """
+    Pairwise residue similarity in [0, 1]: 1 - normalized Euclidean distance
+    between BLOSUM62 rows (trimAl builds its distance matrix the same way).
+    """
+    diff = BLOSUM62[:, None, :] - BLOSUM62[None, :, :]
+    dist = np.sqrt((diff ** 2).sum(axis=2))
+    return 1.0 - dist / dist.max()
+
+
+def read_alignment(fp):
+    names = []
+    seqs = []
+    buf = []
+    with xopen(fp) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith(">"):
+                if names:
+                    seqs.append("".join(buf))
+                names.append(line[1:].split()[0])
+                buf = []
+            else:
+                buf.append(line.replace(" ", ""))
+        if names:
+            seqs.append("".join(buf))
+
+    if not names:
+        raise SystemExit(f"[ERROR] empty alignment: {fp}")
+
+    ncol = len(seqs[0])
+    for n, s in zip(names, seqs):
+        if len(s) != ncol:
+            raise SystemExit(f"[ERROR] not an alignment, length differs: {n} ({len(s)} != {ncol})")
+
+    raw = np.frombuffer("".join(seqs).encode("ascii"), dtype=np.uint8)
+    mat = raw.reshape(len(names), ncol)
+    return names, mat
+
+
+def column_counts(codes):
+    """(CODE_GAP+1, n_col) residue counts; loops over the alphabet, never over columns."""
+    counts = np.empty((CODE_GAP + 1, codes.shape[1]), dtype=np.int64)
+    for k in range(CODE_GAP + 1):
+        counts[k] = np.count_nonzero(codes == k, axis=0)
+    return counts
+
+
+def column_stats(codes, sim_mat):
+    nseq = codes.shape[0]
+    counts = column_counts(codes)
+    aa = counts[:N_AA].T.astype(np.float64)       # (n_col, 20)
+    gaps = counts[CODE_GAP]
+    residues = nseq - gaps
+
+    gap_frac = gaps / nseq
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        identity = np.where(residues > 0, aa.max(axis=1) / residues, 0.0)
+
+        # sum over unordered residue pairs i<j of sim(ri, rj)
+        #   = 0.5 * (c^T S c - sum_k c_k * S_kk)
+        n_std = aa.sum(axis=1)
+        pair_sim = 0.5 * (np.einsum("ij,jk,ik->i", aa, sim_mat, aa) - aa @ np.diag(sim_mat))
+        n_pairs = n_std * (n_std - 1) / 2.0
+        mean_sim = np.where(n_pairs > 0, pair_sim / n_pairs, 0.0)
+
+        # pooled pairwise identity: identical residue pairs / aligned residue pairs
+        same_pairs = (aa * (aa - 1) / 2.0).sum()
+        avg_identity = float(same_pairs / n_pairs.sum()) if n_pairs.sum() > 0 else 0.0
+
+    similarity = mean_sim * (1.0 - gap_frac)
+    return gap_frac, identity, similarity, avg_identity
+
+
+def knee_cutoff(values):
+    """
+    Knee of the cumulative distribution of `values` (ascending = better kept),
+    i.e. the value after which each further step keeps few extra columns.
+    Returns the largest value to keep.
+    """
+    u, cnt = np.unique(values, return_counts=True)
+    if u.size <= 2:
+        return u[-1]
+    cum = np.cumsum(cnt) / cnt.sum()
+    x = (u - u[0]) / (u[-1] - u[0])
+    y = (cum - cum[0]) / (cum[-1] - cum[0])
+    return u[int(np.argmax(y - x))]
+
+
+def drop_short_blocks(keep, min_len):
+    if min_len <= 1 or not keep.any():
+        return keep
+    k = np.concatenate(([False], keep, [False])).astype(np.int8)
+    d = np.diff(k)
+    starts = np.flatnonzero(d == 1)
+    ends = np.flatnonzero(d == -1)
+    short = (ends - starts) < min_len
+    out = keep.copy()
+    if short.any():
+        # mark columns of short runs via a +1/-1 difference array
+        mark = np.zeros(keep.size + 1, dtype=np.int32)
+        np.add.at(mark, starts[short], 1)
+        np.add.at(mark, ends[short], -1)
+        out[np.cumsum(mark[:-1]) > 0] = False
+    return out
+
+
+def select_columns(mode, gap_frac, similarity, avg_identity, nseq):
+    ncol = gap_frac.size
+    if mode == "none":
+        return np.ones(ncol, dtype=bool), mode
+
+    if mode == "automated1":
+        if nseq <= AUTO_MAX_SEQS_GAPPYOUT or avg_identity >= AUTO_MIN_IDENTITY_GAPPYOUT:
+            mode = "gappyout"
+        else:
+            mode = "strict"
+
+    gap_ok = gap_frac <= knee_cutoff(gap_frac)
+    if mode == "gappyout":
+        return gap_ok, mode
+
+    if mode == "strict":
+        # similarity knee over (1 - similarity) so that "ascending = better"
+        sim_ok = (1.0 - similarity) <= knee_cutoff(1.0 - similarity)
+        keep = drop_short_blocks(gap_ok & sim_ok, STRICT_MIN_BLOCK)
+        if not keep.any():
+            keep = gap_ok
+        return keep, mode
+
+    raise SystemExit(f"[ERROR] unknown mode: {mode}")
+
+
+def write_fasta(names, mat, out):
+    with open(out, "w") as w:
+        for name, row in zip(names, mat):
+            w.write(f">{name}\n")
+            w.write(row.tobytes().decode("ascii") + "\n")
+
+
+def read_trimal_kept(fp, n_col):
+    """keep mask from the '#ColumnsMap 0, 1, 5, ...' line of trimal -colnumbering (0-based)."""
+    keep = np.zeros(n_col, dtype=bool)
+    found = False
+    with open(fp) as f:
+        for line in f:
+            if line.startswith("#ColumnsMap"):
+                found = True
+                cols = [int(c) for c in line[len("#ColumnsMap"):].replace(",", " ").split()]
+                keep[cols] = True
+    if not found:
+        raise SystemExit(f"[ERROR] {fp}: no #ColumnsMap line (trimal -colnumbering output)")
+    return keep
+
+
+def write_colmap(out, keep, gap_frac, identity, similarity):
+    new_idx = np.cumsum(keep)
+    with open(out, "w") as w:
+        w.write("orig_col\tnew_col\tkept\tgap_frac\tidentity\tsimilarity\n")
+        for i in range(keep.size):
+            new_col = str(int(new_idx[i])) if keep[i] else "NA"
+            w.write(f"{i + 1}\t{new_col}\t{int(keep[i])}\t"
+                    f"{gap_frac[i]:.4f}\t{identity[i]:.4f}\t{similarity[i]:.4f}\n")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--in", dest="inp", required=True, help="aligned FASTA (MAFFT output)")
+    ap.add_argument("--out", default="", help="trimmed aligned FASTA (required unless --kept)")
+    ap.add_argument("--out_map", required=True, help="column map TSV (orig_col -> new_col + stats)")
+    ap.add_argument("--mode", default="automated1",
+                    choices=["automated1", "gappyout", "strict", "none"])
+    ap.add_argument("--kept", default="", help="trimal -colnumbering output: only write the map for its columns")
+    args = ap.parse_args()
+    if not args.out and not args.kept:
+        raise SystemExit("[ERROR] need --out (or --kept for a trimAl column map)")
+
+    names, raw = read_alignment(args.inp)
+    codes = build_lut()[raw]
+
+    gap_frac, identity, similarity, avg_identity = column_stats(codes, residue_similarity())
+    if args.kept:
+        keep = read_trimal_kept(args.kept, raw.shape[1])
+        write_colmap(args.out_map, keep, gap_frac, identity, similarity)
+        print(f"[INFO] trimal columns kept {int(keep.sum())}/{keep.size}", file=sys.stderr)
+        return
+    keep, used_mode = select_columns(args.mode, gap_frac, similarity, avg_identity, len(names))
+
+    if not keep.any():
+        print("[WARN] no column passed trimming; keeping full alignment", file=sys.stderr)
+        keep = np.ones_like(keep)
+
+    write_fasta(names, raw[:, keep], args.out)
+    write_colmap(args.out_map, keep, gap_frac, identity, similarity)
+
+    print(f"[INFO] mode={used_mode} seqs={len(names)} avg_identity={avg_identity:.3f} "
+          f"columns kept {int(keep.sum())}/{keep.size}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    profiling.run(main)
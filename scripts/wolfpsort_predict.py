@@ -1,10 +1,16 @@
 #!/usr/bin/env python3
 import argparse
+import os
 import subprocess
 import shutil
 import re
+import sys
+import tempfile
 from typing import List, Tuple
 
+from seq_memo import SeqMemo, params_key, read_fasta, seq_hash
+import profiling
+
 BAD_PATTERNS = (
     "Usage:",
     "Command Line Parsing Error",
@@ -21,6 +27,7 @@ def parse_args():
     ap.add_argument("--out", required=True)
     ap.add_argument("--cmd", default="wolfpsort", help="wolfpsort command in PATH")
     ap.add_argument("--organism", default="plant", help="plant|animal|fungi")
+    ap.add_argument("--memo_db", default="", help="per-sequence memo (seq_memo.py); only new peptides go to wolfpsort")
     return ap.parse_args()
 
 def looks_like_real_output(stdout: str) -> bool:
@@ -78,23 +85,66 @@ def parse_line(rest: str) -> List[Tuple[str, float]]:
             continue
     return pairs
 
+def parse_output(out_text: str):
+    """wolfpsort stdout -> [(seq_id, rest)]"""
+    rows = []
+    for line in out_text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+
+        # seq_id + rest
+        parts = line.split(None, 1)
+        if len(parts) < 2:
+            continue
+        rows.append((parts[0], parts[1].strip()))
+    return rows
+
+def predict_with_memo(args) -> List[Tuple[str, str]]:
+    """Run wolfpsort only on peptides missing from the memo; rows come back in FASTA order."""
+    recs = read_fasta(args.pep)
+    hashes = {sid: seq_hash(seq) for sid, seq in recs}
+    tool = "wolfpsort"
+    mparams = params_key(f"{os.path.basename(args.cmd)} {args.organism}")
+
+    memo = SeqMemo(args.memo_db)
+    cached = memo.get_many(tool, mparams, hashes.values())
+    new = [(sid, seq) for sid, seq in recs if hashes[sid] not in cached]
+    print(f"[INFO] wolfpsort: {len(recs) - len(new)} cached, {len(new)} to predict", file=sys.stderr)
+
+    if new:
+        with tempfile.NamedTemporaryFile("w", suffix=".fa", delete=False) as tmp:
+            for sid, seq in new:
+                tmp.write(f">{sid}\n{seq}\n")
+        try:
+            rows = parse_output(run_wolfpsort(args.cmd, args.organism, tmp.name))
+        finally:
+            os.remove(tmp.name)
+        got = {}
+        for sid, rest in rows:
+            got.setdefault(sid, []).append(rest)
+        # 只缓存真正拿到预测（loc score）的序列；没有输出的（含中断的运行）下次重算
+        items = {hashes[sid]: got[sid] for sid, _seq in new
+                 if sid in got and any(parse_line(r) for r in got[sid])}
+        missing = len(new) - len(items)
+        if missing:
+            print(f"[WARN] wolfpsort: no prediction for {missing} sequences; not memoized", file=sys.stderr)
+        memo.put_many(tool, mparams, items)
+        cached.update({hashes[sid]: got[sid] for sid, _seq in new if sid in got})
+    memo.close()
+
+    return [(sid, rest) for sid, _seq in recs for rest in cached.get(hashes[sid], [])]
+
 def main():
     args = parse_args()
-    out_text = run_wolfpsort(args.cmd, args.organism, args.pep)
+    if args.memo_db:
+        rows = predict_with_memo(args)
+    else:
+        rows = parse_output(run_wolfpsort(args.cmd, args.organism, args.pep))
 
     with open(args.out, "w") as o:
         o.write("seq_id\twolf_loc\twolf_score\twolf_scores\n")
-        for line in out_text.splitlines():
-            line = line.strip()
-            if not line or line.startswith("#"):
-                continue
-
-            # seq_id + rest
-            parts = line.split(None, 1)
-            if len(parts) < 2:
-                continue
-            sid, rest = parts[0], parts[1].strip()
-
+        for sid, rest in rows:
             pairs = parse_line(rest)
             if not pairs:
                 # 保留原始 rest 以便排查
@@ -106,4 +156,4 @@ def main():
             o.write(f"{sid}\t{best_loc}\t{best_sc:g}\t{score_str}\n")
 
 if __name__ == "__main__":
-    main()
+    profiling.run(main)